@@ -0,0 +1,338 @@
+"""Batch templates filling many rows in one document for FormFiller application."""
+
+import logging
+import re
+from dataclasses import dataclass, field, replace
+from functools import partial
+from typing import Dict, List, Optional, Set
+
+import fitz
+
+from combined_writer import OBJECT_REFERENCE
+from config import DEFAULT_BATCH_SIZE
+from fast_fill import FastTemplate
+from fill_plan import FillPlan, PlannedField
+from template_cache import CachedTemplate
+from utils.fill_form import document_bytes
+
+logger = logging.getLogger(__name__)
+
+# Field name and annotation name entries of a widget's source, as printed
+# by MuPDF: a literal string with escaped parentheses, or a hex string
+FIELD_NAME = re.compile(r"/T(\((?:\\.|[^\\()])*\)|<[0-9A-Fa-f]*>)")
+ANNOT_NAME = re.compile(r"/NM(\((?:\\.|[^\\()])*\)|<[0-9A-Fa-f]*>)")
+PAGE_PARENT = re.compile(r"/Parent \d+ 0 R")
+
+
+@dataclass
+class BatchCopy:
+    """One copy of the template's pages in a batch document."""
+
+    # First page of the copy in the batch document
+    first_page: int
+    # Fill plan with the copy's widget xrefs
+    fill_plan: FillPlan
+    # Fast engine fields of the copy, if the template uses the fast engine
+    fast_template: Optional[FastTemplate] = None
+
+
+@dataclass
+class BatchTemplate:
+    """
+    A template whose pages are repeated once per row of a batch.
+
+    Each copy has its own widgets, renamed "<field name> [<copy>]" after the
+    first copy, and its own appearance streams for mapped widgets. Page
+    contents, fonts and other resources are shared by every copy, so they
+    are only copied once per batch into the combined PDF.
+    """
+
+    template_path: str
+    data: bytes
+    # Pages of the template, filled per row
+    page_count: int
+    copies: List[BatchCopy] = field(default_factory=list)
+
+    @property
+    def size(self) -> int:
+        """Number of rows a batch document holds."""
+        return len(self.copies)
+
+    def open(self) -> fitz.Document:
+        """Open a fresh copy of the batch document."""
+        return fitz.open(stream=self.data, filetype="pdf")
+
+
+@dataclass
+class _TemplatePage:
+    """Object sources of one template page and its annotations."""
+
+    xref: int
+    source: str
+    annots: List[int]
+    annot_sources: List[str]
+
+
+def prepare_batch_template(
+    template: CachedTemplate,
+    fill_plan: FillPlan,
+    fast_template: Optional[FastTemplate] = None,
+    size: int = DEFAULT_BATCH_SIZE,
+) -> Optional[BatchTemplate]:
+    """
+    Build a document holding a template's pages once per row of a batch.
+
+    The copies are made at the object level: each copy's pages reuse the
+    template's content streams and resources, while widgets and the
+    appearance streams of mapped widgets are duplicated, so that filling
+    one copy leaves the others untouched.
+
+    Args:
+        template: Cached template to repeat
+        fill_plan: Compiled fill plan of the template
+        fast_template: Template prepared for the fast engine, if used; the
+            batch is built from it so that copies keep its appearances
+        size: Number of copies
+
+    Returns:
+        BatchTemplate, or None if the template's widgets belong to field
+        hierarchies, which cannot be renamed per copy
+    """
+    doc = fast_template.open() if fast_template is not None else template.open()
+    try:
+        page_count = len(doc)
+        pages = [_read_page(doc, page_num) for page_num in range(page_count)]
+        if any(
+            doc.xref_get_key(xref, "Parent")[0] != "null"
+            for page in pages
+            for xref in page.annots
+        ):
+            logger.info(
+                f"Widgets of {template.path} belong to field hierarchies; "
+                "its rows are filled one document at a time"
+            )
+            return None
+
+        # Filling rewrites the appearance streams of mapped widgets, so each
+        # copy gets its own; the fast engine writes to streams it generated
+        own_streams: Dict[int, Set[int]] = {}
+        for planned in fill_plan.fields:
+            ap_source = doc.xref_get_key(planned.xref, "AP")[1]
+            own_streams[planned.xref] = set(_references(ap_source))
+        if fast_template is not None:
+            for fast_field in fast_template.fields:
+                own_streams[fast_field.xref].update(
+                    xref
+                    for xref in _references("".join(fast_field.object_parts))
+                    if doc.xref_is_stream(xref)
+                )
+
+        copies = [BatchCopy(0, fill_plan, fast_template)]
+        new_fields: List[int] = []
+        for number in range(1, size):
+            xref_map: Dict[int, int] = {}
+            for page in pages:
+                _copy_page(doc, page, own_streams, xref_map, number)
+                new_fields.extend(xref_map[xref] for xref in page.annots)
+            copies.append(
+                _make_copy(fill_plan, fast_template, xref_map, number, page_count)
+            )
+        _add_fields(doc, new_fields)
+        data = document_bytes(doc)
+    finally:
+        doc.close()
+
+    logger.info(f"Prepared {template.path} for batches of {size} rows")
+    return BatchTemplate(
+        template_path=template.path, data=data, page_count=page_count, copies=copies
+    )
+
+
+def _references(source: str) -> List[int]:
+    """Get the xrefs an object source refers to, in order."""
+    return [int(match.group(1)) for match in OBJECT_REFERENCE.finditer(source)]
+
+
+def _read_page(doc: fitz.Document, page_num: int) -> _TemplatePage:
+    """
+    Read the sources of a template page and its annotations.
+
+    Baking adds to a page's contents and resources, so copies cannot share
+    the arrays and dictionaries holding them; indirect ones are inlined
+    into the page's source.
+    """
+    page_xref = doc.page_xref(page_num)
+    source = doc.xref_object(page_xref, compressed=True)
+    annots_source = ""
+    for key in ("Contents", "Resources", "Annots"):
+        value_type, value = doc.xref_get_key(page_xref, key)
+        if value_type == "xref" and not doc.xref_is_stream(int(value.split()[0])):
+            inlined = doc.xref_object(int(value.split()[0]), compressed=True)
+            source = source.replace(f"/{key} {value}", f"/{key}{inlined}", 1)
+            value = inlined
+        if key == "Annots":
+            annots_source = value
+
+    annots = _references(annots_source)
+    return _TemplatePage(
+        xref=page_xref,
+        source=source,
+        annots=annots,
+        annot_sources=[doc.xref_object(xref, compressed=True) for xref in annots],
+    )
+
+
+def _rename(xref_map: Dict[int, int], number: int, source: str) -> str:
+    """
+    Point an object source at a copy's objects and rename its field.
+
+    Args:
+        xref_map: Copied xrefs by template xref
+        number: Number of the copy, appended to field names
+        source: Object source from the template
+
+    Returns:
+        Object source for the copy
+    """
+    source = OBJECT_REFERENCE.sub(
+        lambda match: f"{xref_map.get(int(match.group(1)), match.group(1))} 0 R",
+        source,
+    )
+    # Annotation names must be unique on a page, and nothing refers to them
+    source = ANNOT_NAME.sub("", source)
+    return FIELD_NAME.sub(
+        lambda match: "/T" + _append_to_string(match.group(1), f" [{number}]"),
+        source,
+        count=1,
+    )
+
+
+def _append_to_string(printed: str, suffix: str) -> str:
+    """Append ASCII text to a PDF string as printed by MuPDF."""
+    if printed.startswith("("):
+        return f"{printed[:-1]}{suffix})"
+    encoding = "utf-16-be" if printed[1:5].upper() == "FEFF" else "latin-1"
+    return f"{printed[:-1]}{suffix.encode(encoding).hex()}>"
+
+
+def _copy_page(
+    doc: fitz.Document,
+    page: _TemplatePage,
+    own_streams: Dict[int, Set[int]],
+    xref_map: Dict[int, int],
+    number: int,
+) -> None:
+    """
+    Append a copy of a template page.
+
+    Args:
+        doc: Batch document
+        page: Template page to copy
+        own_streams: Streams each copy of a widget needs its own copy of,
+            by widget xref
+        xref_map: Copied xrefs by template xref; the page, its widgets and
+            their streams are added
+        number: Number of the copy, appended to field names
+    """
+    new_page_xref = doc.new_page(-1).xref
+    parent = doc.xref_get_key(new_page_xref, "Parent")[1]
+    xref_map[page.xref] = new_page_xref
+
+    for annot_xref in page.annots:
+        xref_map[annot_xref] = doc.get_new_xref()
+        for stream_xref in own_streams.get(annot_xref, ()):
+            xref_map[stream_xref] = _copy_stream(doc, stream_xref)
+
+    # One update per object; setting keys one by one is far slower
+    rename = partial(_rename, xref_map, number)
+    for annot_xref, source in zip(page.annots, page.annot_sources):
+        doc.update_object(xref_map[annot_xref], rename(source))
+    page_source = PAGE_PARENT.sub(f"/Parent {parent}", rename(page.source), count=1)
+    doc.update_object(new_page_xref, page_source)
+
+
+def _copy_stream(doc: fitz.Document, xref: int) -> int:
+    """Copy a stream object, keeping its compression; return the new xref."""
+    source = doc.xref_object(xref, compressed=True)
+    new_xref = doc.get_new_xref()
+    doc.update_object(new_xref, source)
+    doc.update_stream(
+        new_xref, doc.xref_stream(xref), compress="/FlateDecode" in source
+    )
+    return new_xref
+
+
+def _add_fields(doc: fitz.Document, field_xrefs: List[int]) -> None:
+    """Add copied widgets to the document's AcroForm fields."""
+    if not field_xrefs:
+        return
+    catalog = doc.pdf_catalog()
+    fields_type, fields = doc.xref_get_key(catalog, "AcroForm/Fields")
+    fields_xref = 0
+    if fields_type == "xref":
+        fields_xref = int(fields.split()[0])
+        fields = doc.xref_object(fields_xref, compressed=True)
+    elif fields_type != "array":
+        fields = "[]"
+    references = " ".join(f"{xref} 0 R" for xref in field_xrefs)
+    fields = f"{fields.strip()[:-1]} {references}]"
+    if fields_xref:
+        doc.update_object(fields_xref, fields)
+    else:
+        doc.xref_set_key(catalog, "AcroForm/Fields", fields)
+
+
+def _make_copy(
+    fill_plan: FillPlan,
+    fast_template: Optional[FastTemplate],
+    xref_map: Dict[int, int],
+    number: int,
+    page_count: int,
+) -> BatchCopy:
+    """
+    Point a fill plan and fast engine fields at one copy of the pages.
+
+    Args:
+        fill_plan: Fill plan of the template
+        fast_template: Fast engine fields of the template, if used
+        xref_map: Copied xrefs by template xref
+        number: Number of the copy
+        page_count: Pages of the template
+
+    Returns:
+        BatchCopy filling the copy
+    """
+    first_page = number * page_count
+
+    def move(planned: PlannedField) -> PlannedField:
+        return replace(
+            planned, page=planned.page + first_page, xref=xref_map[planned.xref]
+        )
+
+    copy_plan = FillPlan(
+        template_path=fill_plan.template_path,
+        fields=[move(planned) for planned in fill_plan.fields],
+        unmatched_fields=fill_plan.unmatched_fields,
+    )
+    if fast_template is None:
+        return BatchCopy(first_page, copy_plan)
+
+    rename = partial(_rename, xref_map, number)
+    fast_fields = [
+        replace(
+            fast_field,
+            page=fast_field.page + first_page,
+            xref=xref_map[fast_field.xref],
+            object_parts=tuple(rename(part) for part in fast_field.object_parts),
+            ap_xref=xref_map.get(fast_field.ap_xref, 0),
+        )
+        for fast_field in fast_template.fields
+    ]
+    # Only fills the batch document; it is never opened on its own
+    copy_template = FastTemplate(
+        template_path=fast_template.template_path,
+        data=b"",
+        fields=fast_fields,
+        widget_fields=[move(planned) for planned in fast_template.widget_fields],
+    )
+    return BatchCopy(first_page, copy_plan, copy_template)
@@ -0,0 +1,273 @@
+"""
+Benchmark suite for the FormFiller fill pipeline.
+
+Generates synthetic CSVs from the column layout of the built-in mapping
+YAMLs, runs FormFiller.process_forms against the built-in templates and
+reports throughput, per-stage timings and peak RSS as JSON.
+
+Each case runs in a fresh interpreter so peak RSS is not shared between
+cases. Examples:
+    python -m bench.run_bench
+    python -m bench.run_bench --rows 1000 10000 100000 --templates misc nec
+    python -m bench.run_bench --rows 10000 --workers 1 8 --output bench.json
+    python -m bench.run_bench --rows 10000 --engines widget fast
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def get_peak_rss_mb() -> Optional[float]:
+    """
+    Get the peak resident set size of this process and its children.
+
+    Returns:
+        Peak RSS in megabytes, or None where the resource module is unavailable
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    )
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+def run_case(
+    template_name: str, rows: int, workers: int, engine: str, work_dir: str
+) -> dict:
+    """
+    Run one benchmark case in the current process.
+
+    Args:
+        template_name: Built-in template key, e.g. "misc" or "nec"
+        rows: Number of synthetic rows to fill
+        workers: Number of fill worker processes
+        engine: Fill engine, "widget" or "fast"
+        work_dir: Directory for the synthetic CSV and outputs
+
+    Returns:
+        Dictionary with throughput, stage timings and peak RSS
+    """
+    sys.path.insert(0, str(REPO_ROOT))
+    from bench.synthetic import write_synthetic_csv
+    from config import FormFillerConfig
+    from data_processor import DataProcessor
+    from form_filler import FormFiller
+
+    config = FormFillerConfig(base_path=str(REPO_ROOT))
+    config.outputs_folder = Path(work_dir) / "outputs"
+    template_config = config.get_template_config(template_name)
+
+    processor = DataProcessor()
+    mappings = processor.load_field_mappings(template_config.mapping_path)
+    csv_path = write_synthetic_csv(
+        os.path.join(work_dir, f"{template_name}_{rows}.csv"), mappings, rows
+    )
+
+    # Standalone passes isolate CSV parsing and row mapping costs
+    start = time.perf_counter()
+    for _ in processor.iter_csv_rows(csv_path):
+        pass
+    csv_load = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for row_index, row in enumerate(processor.iter_csv_rows(csv_path)):
+        processor.process_row(row, row_index)
+    mapping = max(0.0, time.perf_counter() - start - csv_load)
+
+    start = time.perf_counter()
+    results = FormFiller(config=config).process_forms(
+        input_csv_path=csv_path,
+        template_config=template_config,
+        workers=workers,
+        fill_engine=engine,
+    )
+    wall = time.perf_counter() - start
+
+    combined_path = results.get("combined_pdf_path")
+    return {
+        "template": template_name,
+        "rows": rows,
+        "workers": workers,
+        "fill_engine": engine,
+        "wall_seconds": round(wall, 3),
+        "rows_per_sec": round(results["successful_fills"] / wall, 1) if wall else None,
+        "stages": {
+            "csv_load": round(csv_load, 3),
+            "mapping": round(mapping, 3),
+            "setup": round(results["timings"]["setup"], 3),
+            "fill": round(results["timings"]["fill"], 3),
+            "combined_save": round(results["timings"]["combined_save"], 3),
+        },
+        "hot_path": results["stats"],
+        "peak_rss_mb": get_peak_rss_mb(),
+        "successful_fills": results["successful_fills"],
+        "failed_fills": results["failed_fills"],
+        "combined_pdf_bytes": (
+            os.path.getsize(combined_path) if combined_path else None
+        ),
+    }
+
+
+def run_case_subprocess(
+    template_name: str, rows: int, workers: int, engine: str
+) -> dict:
+    """
+    Run one benchmark case in a fresh interpreter.
+
+    Args:
+        template_name: Built-in template key
+        rows: Number of synthetic rows to fill
+        workers: Number of fill worker processes
+        engine: Fill engine, "widget" or "fast"
+
+    Returns:
+        Case results as produced by run_case()
+    """
+    with tempfile.TemporaryDirectory(prefix="formfiller_bench_") as work_dir:
+        result_path = os.path.join(work_dir, "result.json")
+        subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "bench.run_bench",
+                "--case",
+                template_name,
+                str(rows),
+                str(workers),
+                engine,
+                work_dir,
+                result_path,
+            ],
+            cwd=REPO_ROOT,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        with open(result_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+
+def get_environment() -> dict:
+    """Describe the machine and library versions the benchmark ran on."""
+    try:
+        import fitz
+
+        pymupdf_version = fitz.VersionBind
+    except ImportError:
+        pymupdf_version = None
+
+    return {
+        "python": platform.python_version(),
+        "pymupdf": pymupdf_version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def create_parser() -> argparse.ArgumentParser:
+    """Create the benchmark argument parser."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the FormFiller fill pipeline on synthetic data."
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=[1000],
+        help="Synthetic row counts to benchmark, e.g. 1000 10000 100000. "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--templates",
+        nargs="+",
+        default=["misc", "nec"],
+        help="Built-in templates to benchmark. (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=[1],
+        help="Worker process counts to benchmark. (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        help="Also write the JSON report to this file.",
+    )
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=["widget", "fast"],
+        default=["widget"],
+        help="Fill engines to benchmark. (default: %(default)s)",
+    )
+    parser.add_argument("--case", nargs=6, help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Run the benchmark suite.
+
+    Args:
+        argv: Optional list of arguments to parse (for testing)
+
+    Returns:
+        Exit code
+    """
+    args = create_parser().parse_args(argv)
+
+    if args.case:
+        template_name, rows, workers, engine, work_dir, result_path = args.case
+        logging.basicConfig(level=logging.WARNING)
+        result = run_case(template_name, int(rows), int(workers), engine, work_dir)
+        with open(result_path, "w", encoding="utf-8") as file:
+            json.dump(result, file)
+        return 0
+
+    cases = []
+    for template_name in args.templates:
+        for rows in args.rows:
+            for workers in args.workers:
+                for engine in args.engines:
+                    print(
+                        f"Running {template_name}: {rows} rows, {workers} workers, "
+                        f"{engine} engine",
+                        file=sys.stderr,
+                    )
+                    cases.append(
+                        run_case_subprocess(template_name, rows, workers, engine)
+                    )
+
+    report = {"environment": get_environment(), "cases": cases}
+    output = json.dumps(report, indent=2)
+    print(output)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Synthetic CSV generation for FormFiller benchmarks."""
+
+import csv
+import random
+from typing import Any, Dict, List
+
+from projection import ProjectionPlan
+
+STREETS = ["Main St", "Oak Ave", "Park Blvd", "Will's Mill Rd", "Block Rd"]
+CITIES = ["Columbia, MO  19191", "Alpha, OH  34908", "New County, NY 45454"]
+COMPANIES = ["ACME, LLC", "Disney Waterworks LLC", "WLP Bluestar construct NP"]
+
+
+def get_column_count(field_mappings: Dict[str, Any]) -> int:
+    """
+    Get the number of CSV columns implied by a field mapping.
+
+    Args:
+        field_mappings: Field mappings as loaded from a mapping YAML
+
+    Returns:
+        One more than the highest mapped column index
+    """
+    return ProjectionPlan(field_mappings).min_row_length
+
+
+def make_row(rng: random.Random, row_index: int, column_count: int) -> List[str]:
+    """
+    Build one synthetic CSV row.
+
+    Columns cycle through names, multi-line addresses, TINs and amounts so
+    that every kind of value the templates receive is represented.
+
+    Args:
+        rng: Random number generator
+        row_index: Index of the row, embedded in name columns
+        column_count: Number of columns to generate
+
+    Returns:
+        List of string values
+    """
+    row = []
+    for col in range(column_count):
+        kind = col % 5
+        if kind == 0:
+            row.append(f"{rng.choice(COMPANIES)} #{row_index}")
+        elif kind == 1:
+            row.append(
+                f"{rng.randint(1, 9999)} {rng.choice(STREETS)}\n"
+                f"{rng.choice(CITIES)}\nUSA"
+            )
+        elif kind == 2:
+            row.append(f"{rng.randint(10, 99)}-{rng.randint(1000000, 9999999)}")
+        elif kind == 3:
+            row.append(f"{rng.randint(0, 99999):,}.{rng.randint(0, 99):02d}")
+        else:
+            row.append(str(rng.randint(10000, 99999)))
+    return row
+
+
+def write_synthetic_csv(
+    output_path: str, field_mappings: Dict[str, Any], rows: int, seed: int = 0
+) -> str:
+    """
+    Write a synthetic CSV matching the column layout of a mapping.
+
+    Args:
+        output_path: Path of the CSV file to write
+        field_mappings: Field mappings as loaded from a mapping YAML
+        rows: Number of data rows
+        seed: Seed for reproducible values
+
+    Returns:
+        The output path
+    """
+    rng = random.Random(seed)
+    column_count = get_column_count(field_mappings)
+    with open(output_path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file, quoting=csv.QUOTE_MINIMAL)
+        for row_index in range(rows):
+            writer.writerow(make_row(rng, row_index, column_count))
+    return output_path
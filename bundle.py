@@ -0,0 +1,173 @@
+"""Precompiled template bundles for FormFiller application."""
+
+import hashlib
+import logging
+import os
+import pickle
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+from exceptions import TemplateError
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_MAGIC = b"FFBUNDLE"
+BUNDLE_VERSION = 1
+
+# Widget fields stored per entry, in WidgetInfo order
+WidgetRecord = Tuple[int, int, str, int, tuple]
+
+
+@dataclass
+class TemplateBundle:
+    """
+    A template's field mappings, widget table and PDF bytes, compiled once.
+
+    Loading a bundle replaces parsing the mapping YAML and scanning the
+    template's widgets with a single read and unpickle. Only built-in
+    types are stored, so loading does not require PyMuPDF.
+    """
+
+    template_name: str
+    template_path: str
+    template_mtime: float
+    mapping_path: str
+    field_mappings: Dict[str, Any]
+    template_data: bytes
+    template_digest: str
+    page_count: int
+    widgets: List[WidgetRecord]
+
+    def to_cached_template(self) -> "CachedTemplate":
+        """
+        Build the template cache entry stored in this bundle.
+
+        Returns:
+            CachedTemplate equivalent to parsing the template from disk
+        """
+        from template_cache import CachedTemplate, WidgetInfo
+
+        return CachedTemplate(
+            path=os.path.abspath(self.template_path),
+            mtime=self.template_mtime,
+            data=self.template_data,
+            page_count=self.page_count,
+            widgets=[WidgetInfo(*record) for record in self.widgets],
+            _digest=self.template_digest,
+        )
+
+
+def is_bundle_current(bundle_path: str, template_path: str, mapping_path: str) -> bool:
+    """
+    Check whether a bundle exists and is newer than its sources.
+
+    Args:
+        bundle_path: Path to the bundle file
+        template_path: Path to the template PDF
+        mapping_path: Path to the mapping YAML
+
+    Returns:
+        True if the bundle can be used instead of its sources
+    """
+    try:
+        bundle_mtime = os.path.getmtime(bundle_path)
+        source_mtime = max(
+            os.path.getmtime(template_path), os.path.getmtime(mapping_path)
+        )
+    except OSError:
+        return False
+    return bundle_mtime > source_mtime
+
+
+def compile_bundle(template_config: "TemplateConfig", bundle_path: str) -> str:
+    """
+    Compile a template's mapping and widget table into a bundle file.
+
+    Args:
+        template_config: Template configuration with source paths
+        bundle_path: Path of the bundle file to write
+
+    Returns:
+        The bundle path
+
+    Raises:
+        TemplateError: If the template or mapping cannot be compiled
+    """
+    from data_processor import DataProcessor
+    from template_cache import CachedTemplate
+
+    try:
+        field_mappings = DataProcessor().load_field_mappings(
+            template_config.mapping_path
+        )
+        template_path = os.path.abspath(template_config.template_path)
+        template = CachedTemplate.load(template_path, os.path.getmtime(template_path))
+    except Exception as e:
+        raise TemplateError(f"Cannot compile template '{template_config.name}': {e}")
+
+    bundle = TemplateBundle(
+        template_name=template_config.name,
+        template_path=template_path,
+        template_mtime=template.mtime,
+        mapping_path=os.path.abspath(template_config.mapping_path),
+        field_mappings=field_mappings,
+        template_data=template.data,
+        template_digest=template.digest,
+        page_count=template.page_count,
+        widgets=[
+            (w.page, w.xref, w.field_name, w.field_type, w.rect)
+            for w in template.widgets
+        ],
+    )
+    payload = pickle.dumps(
+        (BUNDLE_VERSION, bundle.__dict__), protocol=pickle.HIGHEST_PROTOCOL
+    )
+
+    os.makedirs(os.path.dirname(bundle_path) or ".", exist_ok=True)
+    temp_path = f"{bundle_path}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(BUNDLE_MAGIC)
+        file.write(hashlib.sha256(payload).digest())
+        file.write(payload)
+    os.replace(temp_path, bundle_path)
+
+    logger.info(
+        f"Compiled {template_config.name} to {bundle_path}: "
+        f"{len(field_mappings)} mappings, {len(bundle.widgets)} widgets"
+    )
+    return bundle_path
+
+
+def load_bundle(bundle_path: str) -> TemplateBundle:
+    """
+    Load a compiled bundle, verifying its hash.
+
+    Args:
+        bundle_path: Path to the bundle file
+
+    Returns:
+        The loaded TemplateBundle
+
+    Raises:
+        TemplateError: If the bundle is corrupt or from another bundle version
+    """
+    with open(bundle_path, "rb") as file:
+        data = file.read()
+
+    header_size = len(BUNDLE_MAGIC) + hashlib.sha256().digest_size
+    payload = data[header_size:]
+    if (
+        not data.startswith(BUNDLE_MAGIC)
+        or hashlib.sha256(payload).digest() != data[len(BUNDLE_MAGIC) : header_size]
+    ):
+        raise TemplateError(f"Template bundle is corrupt: {bundle_path}")
+
+    version, fields = pickle.loads(payload)
+    if version != BUNDLE_VERSION:
+        raise TemplateError(
+            f"Template bundle {bundle_path} has version {version}, "
+            f"expected {BUNDLE_VERSION}; run 'main.py compile' again"
+        )
+
+    logger.debug(f"Loaded template bundle {bundle_path}")
+    return TemplateBundle(**fields)
@@ -1,12 +1,28 @@
 """Command-line interface for FormFiller application."""
 
 import argparse
+import codecs
+import os
 import sys
 from pathlib import Path
 from typing import List, Optional
 
-from config import FormFillerConfig
-from exceptions import FormFillerError
+from config import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_FORM_CACHE_SIZE,
+    DEFAULT_PROOF_DPI,
+    DEFAULT_SHEET_COLUMNS,
+    DEFAULT_SHEET_ROWS,
+    FILL_ENGINES,
+    SERVICE_HOST,
+    SERVICE_PORT,
+    FormFillerConfig,
+)
+from csv_reader import CsvFormat
+from exceptions import ConfigurationError, FormFillerError
+from output_sink import DEFAULT_OUTPUT_SINK, OUTPUT_SINKS, OutputNamer
+from output_writer import DEFAULT_IO_THREADS
+from routing import TemplateRouter
 
 
 class CLI:
@@ -16,6 +32,12 @@ class CLI:
         """Initialize CLI handler."""
         self.config = FormFillerConfig()
         self.parser = self._create_parser()
+        # Subcommands, selected by the first argument; anything else fills forms
+        self.command_parsers = {
+            "serve": self._create_serve_parser(),
+            "compile": self._create_compile_parser(),
+            "proof": self._create_proof_parser(),
+        }
 
     def _create_parser(self) -> argparse.ArgumentParser:
         """Create and configure argument parser."""
@@ -72,8 +94,368 @@ class CLI:
             help="Perform a dry run without generating actual PDF files.",
         )
 
+        parser.add_argument(
+            "--workers",
+            "-w",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of worker processes used to fill forms in parallel; "
+            "small inputs start one per chunk of rows, and fill in a single "
+            "process if they fit in one chunk. (default: the number of CPU cores)",
+        )
+
+        parser.add_argument(
+            "--io-threads",
+            type=int,
+            default=DEFAULT_IO_THREADS,
+            help="Number of threads writing individual PDFs to the "
+            "--output-sink while the next rows are filled, in this process or "
+            "in each worker. Individual PDFs are written with --resume, --force "
+            "or an archive or indexed sink; archive and indexed sinks are always "
+            "written by one thread of this process. 0 saves each PDF before filling the next "
+            "row. (default: %(default)s)",
+        )
+
+        parser.add_argument(
+            "--output-sink",
+            choices=OUTPUT_SINKS,
+            default=DEFAULT_OUTPUT_SINK,
+            help="Where individual PDFs are written: one file each in "
+            "outputs/individual/, a ZIP or TAR archive, or one indexed file "
+            "(outputs/individual.pdfs with an offset index in "
+            "individual.index.csv). Archives and indexed files are written "
+            "alongside the combined PDF and cannot be used with --resume. "
+            "(default: %(default)s)",
+        )
+
+        parser.add_argument(
+            "--output-name",
+            type=str,
+            metavar="TEMPLATE",
+            help="Name individual PDFs from CSV columns, e.g. '{9}_{row}' for "
+            "the value of column 9 and the row index. Names taken by an "
+            "earlier row get the row index appended. (default: the row index)",
+        )
+
+        parser.add_argument(
+            "--combined-shard-size",
+            type=int,
+            default=0,
+            help="Write the combined PDF in part files of this many pages to bound "
+            "memory use on large runs. 0 builds it in memory. (default: %(default)s)",
+        )
+
+        parser.add_argument(
+            "--keep-shards",
+            action="store_true",
+            help="Keep the combined PDF part files instead of merging them into one "
+            "file. Only applies with --combined-shard-size or more than one worker, "
+            "where each worker writes a part for a contiguous range of rows.",
+        )
+
+        parser.add_argument(
+            "--keep-fields",
+            action="store_true",
+            help="Keep live, editable form fields in the combined PDF instead of "
+            "flattening them into the page content.",
+        )
+
+        parser.add_argument(
+            "--csv-encoding",
+            type=str,
+            help="Encoding of the input CSV, e.g. utf-8 or cp1252. (default: "
+            "detected from the file)",
+        )
+
+        parser.add_argument(
+            "--csv-delimiter",
+            type=str,
+            help="Field delimiter of the input CSV, e.g. ';'; use '\\t' for tabs. "
+            "(default: sniffed from the start of the file)",
+        )
+
+        parser.add_argument(
+            "--pandas-chunk-size",
+            type=int,
+            default=0,
+            help="Map CSV rows to form fields in pandas DataFrame chunks of this many "
+            "rows. 0 maps rows one at a time. (default: %(default)s)",
+        )
+
+        parser.add_argument(
+            "--stats",
+            action="store_true",
+            help="Print per-stage timings and counters after processing.",
+        )
+
+        parser.add_argument(
+            "--metrics-file",
+            type=str,
+            help="Write per-stage timings and counters to this JSON file.",
+        )
+
+        parser.add_argument(
+            "--fill-engine",
+            choices=FILL_ENGINES,
+            help="Engine used to fill forms: 'widget' fills each field through "
+            "PyMuPDF's widget API, 'fast' writes field values and prebuilt "
+            "appearances directly into the PDF objects. (default: each "
+            "template's configured engine)",
+        )
+
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Fill this many rows into one document holding the template's "
+            "pages once per row, and add it to the combined PDF in one go. Only "
+            "applies when no individual PDFs are kept and without --keep-fields. "
+            "0 or 1 fills each row in its own document. (default: %(default)s)",
+        )
+
+        parser.add_argument(
+            "--form-cache-size",
+            type=int,
+            default=DEFAULT_FORM_CACHE_SIZE,
+            help="Number of recently filled forms kept per template, so that a "
+            "row with the same mapped data as one of them reuses its pages "
+            "instead of being filled again. 0 disables the cache. "
+            "(default: %(default)s)",
+        )
+
+        parser.add_argument(
+            "--route-column",
+            type=int,
+            help="Choose the template of each row from the value in this CSV column "
+            "(0-based), using the --route rules. Rows are filled in one pass with "
+            "one combined PDF per template.",
+        )
+
+        parser.add_argument(
+            "--route",
+            action="append",
+            default=[],
+            metavar="VALUE=TEMPLATE",
+            help="Fill rows whose --route-column value is VALUE (ignoring case) with "
+            "TEMPLATE, a built-in template name or custom template path. Repeat for "
+            "each value. Rows with other values use --template.",
+        )
+
+        parser.add_argument(
+            "--profile-startup",
+            action="store_true",
+            help="Report how long startup phases, including imports, take before "
+            "filling starts. Use python -X importtime for a per-module breakdown.",
+        )
+
+        rerun_group = parser.add_mutually_exclusive_group()
+        rerun_group.add_argument(
+            "--resume",
+            action="store_true",
+            help="Skip rows whose data and template are unchanged since they were "
+            "last filled, using the manifest in the output directory. Individual "
+            "PDFs are kept alongside the combined PDF so they can be reused.",
+        )
+        rerun_group.add_argument(
+            "--force",
+            action="store_true",
+            help="Clear the output manifest and fill every row again.",
+        )
+
+        return parser
+
+    def _create_serve_parser(self) -> argparse.ArgumentParser:
+        """Create the argument parser for the serve command."""
+        parser = argparse.ArgumentParser(
+            prog="main.py serve",
+            description="Run FormFiller as a long-running job service. Jobs are "
+            "JSON objects sent one per line over a Unix socket or localhost TCP; "
+            "progress and results are streamed back as JSON lines.",
+        )
+
+        listen_group = parser.add_mutually_exclusive_group()
+        listen_group.add_argument(
+            "--socket",
+            type=str,
+            help="Listen on this Unix socket path instead of TCP.",
+        )
+        listen_group.add_argument(
+            "--port",
+            type=int,
+            default=SERVICE_PORT,
+            help="TCP port to listen on. (default: %(default)s)",
+        )
+
+        parser.add_argument(
+            "--host",
+            type=str,
+            default=SERVICE_HOST,
+            help="TCP host to listen on. (default: %(default)s)",
+        )
+
+        parser.add_argument(
+            "--output-dir",
+            "-o",
+            type=str,
+            help="Default output directory for jobs that do not set 'output_dir'. "
+            "(default: outputs/)",
+        )
+
+        parser.add_argument(
+            "--verbose",
+            "-v",
+            action="store_true",
+            help="Enable verbose logging output.",
+        )
+
         return parser
 
+    def _create_compile_parser(self) -> argparse.ArgumentParser:
+        """Create the argument parser for the compile command."""
+        parser = argparse.ArgumentParser(
+            prog="main.py compile",
+            description="Compile templates and their field mappings into bundles "
+            "in the 'compiled' folder. A bundle newer than its template and "
+            "mapping is used automatically instead of them, skipping YAML "
+            "parsing and widget discovery.",
+        )
+
+        parser.add_argument(
+            "templates",
+            nargs="*",
+            default=list(self.config.list_available_templates()),
+            help="Built-in template names or custom template paths to compile. "
+            "(default: all built-in templates)",
+        )
+
+        parser.add_argument(
+            "--verbose",
+            "-v",
+            action="store_true",
+            help="Enable verbose logging output.",
+        )
+
+        return parser
+
+    def _create_proof_parser(self) -> argparse.ArgumentParser:
+        """Create the argument parser for the proof command."""
+        parser = argparse.ArgumentParser(
+            prog="main.py proof",
+            description="Render filled forms to PNG files for review, in "
+            "parallel. Each PDF in a directory (such as outputs/individual) is "
+            "one form; a PDF given by path (such as a combined PDF) is split "
+            "into forms of the --template's page count.",
+        )
+
+        parser.add_argument(
+            "sources",
+            nargs="+",
+            help="Filled PDFs and directories of filled PDFs to render.",
+        )
+
+        parser.add_argument(
+            "--template",
+            "-t",
+            type=str,
+            help="Template the forms were filled from: sets the pages per form "
+            "of PDFs given by path, and the field positions used by "
+            "--field-names on flattened forms. (default: one page per form)",
+        )
+
+        parser.add_argument(
+            "--sample",
+            type=int,
+            default=0,
+            help="Render only this many forms, evenly spread over the sources. "
+            "0 renders every form. (default: %(default)s)",
+        )
+
+        parser.add_argument(
+            "--contact-sheet",
+            action="store_true",
+            help="Lay the first page of each form out on contact sheets instead "
+            "of writing a PNG per page. Requires Pillow.",
+        )
+
+        parser.add_argument(
+            "--columns",
+            type=int,
+            default=DEFAULT_SHEET_COLUMNS,
+            help="Forms per row of a contact sheet. (default: %(default)s)",
+        )
+
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=DEFAULT_SHEET_ROWS,
+            help="Rows of forms per contact sheet. (default: %(default)s)",
+        )
+
+        parser.add_argument(
+            "--dpi",
+            type=int,
+            default=DEFAULT_PROOF_DPI,
+            help="Resolution of the renders. (default: %(default)s)",
+        )
+
+        parser.add_argument(
+            "--field-names",
+            action="store_true",
+            help="Draw each field's name above it.",
+        )
+
+        parser.add_argument(
+            "--workers",
+            "-w",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of worker processes rendering forms; small runs start "
+            "one per contact sheet or 16 forms. (default: the number of CPU cores)",
+        )
+
+        parser.add_argument(
+            "--output-dir",
+            "-o",
+            type=str,
+            help="Directory the PNG files are written to. (default: outputs/proofs/)",
+        )
+
+        parser.add_argument(
+            "--verbose",
+            "-v",
+            action="store_true",
+            help="Enable verbose logging output.",
+        )
+
+        return parser
+
+    @staticmethod
+    def _get_csv_format(args: argparse.Namespace) -> CsvFormat:
+        """
+        Build the input CSV format from the encoding and delimiter options.
+
+        Args:
+            args: Parsed arguments
+
+        Returns:
+            CsvFormat; options that were not given are sniffed from the file
+
+        Raises:
+            FormFillerError: If the encoding or delimiter is invalid
+        """
+        if args.csv_encoding is not None:
+            try:
+                codecs.lookup(args.csv_encoding)
+            except LookupError:
+                raise FormFillerError(f"Unknown CSV encoding: {args.csv_encoding}")
+
+        delimiter = args.csv_delimiter
+        if delimiter == "\\t":
+            delimiter = "\t"
+        if delimiter is not None and len(delimiter) != 1:
+            raise FormFillerError("--csv-delimiter must be a single character")
+        return CsvFormat(encoding=args.csv_encoding, delimiter=delimiter)
+
     def _get_usage_examples(self) -> str:
         """Get formatted usage examples."""
         return """
@@ -81,7 +463,22 @@ Examples:
   python main.py misc_example_input.csv
   python main.py nec_example_input.csv --template nec
   python main.py mydata.csv --template /path/to/custom_template.pdf --skip-header
+  python main.py bank_export.csv --csv-encoding cp1252 --csv-delimiter ';'
   python main.py data.csv --output-dir /custom/output --verbose
+  python main.py misc_example_input.csv --workers 8
+  python main.py big_input.csv --combined-shard-size 5000
+  python main.py big_input.csv --workers 8 --combined-shard-size 5000 --keep-shards
+  python main.py big_input.csv --resume
+  python main.py big_input.csv --resume --io-threads 8
+  python main.py big_input.csv --output-sink zip --output-name '{9}_{row}'
+  python main.py big_input.csv --stats --metrics-file metrics.json
+  python main.py big_input.csv --fill-engine fast --batch-size 64
+  python main.py small_batch.csv --profile-startup
+  python main.py mixed.csv --route-column 0 --route MISC=misc --route NEC=nec
+  python main.py serve --socket /tmp/formfiller.sock
+  python main.py compile misc nec
+  python main.py proof outputs/individual --sample 50 --field-names --template misc
+  python main.py proof outputs/big/misc_big.pdf --template misc --contact-sheet
         """
 
     def parse_args(self, args: Optional[List[str]] = None) -> argparse.Namespace:
@@ -92,9 +489,19 @@ Examples:
             args: Optional list of arguments to parse (for testing)
 
         Returns:
-            Parsed arguments namespace
+            Parsed arguments namespace; its "command" attribute is "fill" or
+            the name of the subcommand
         """
-        return self.parser.parse_args(args)
+        if args is None:
+            args = sys.argv[1:]
+        if args and args[0] in self.command_parsers:
+            parsed = self.command_parsers[args[0]].parse_args(args[1:])
+            parsed.command = args[0]
+            return parsed
+
+        parsed = self.parser.parse_args(args)
+        parsed.command = "fill"
+        return parsed
 
     def validate_args(self, args: argparse.Namespace) -> None:
         """
@@ -106,6 +513,17 @@ Examples:
         Raises:
             FormFillerError: If arguments are invalid
         """
+        if args.command == "serve":
+            self._validate_serve_args(args)
+            return
+
+        if args.command == "compile":
+            return
+
+        if args.command == "proof":
+            self._validate_proof_args(args)
+            return
+
         try:
             # Validate input file exists
             args.input_file_path = self.config.validate_input_file(args.input_file)
@@ -126,6 +544,52 @@ Examples:
                     f"Missing required files: {', '.join(missing_files)}"
                 )
 
+            if args.workers < 1:
+                raise FormFillerError("--workers must be at least 1")
+
+            if args.io_threads < 0:
+                raise FormFillerError("--io-threads cannot be negative")
+
+            if args.batch_size < 0:
+                raise FormFillerError("--batch-size cannot be negative")
+
+            if args.form_cache_size < 0:
+                raise FormFillerError("--form-cache-size cannot be negative")
+
+            if args.combined_shard_size < 0:
+                raise FormFillerError("--combined-shard-size cannot be negative")
+
+            if args.resume and args.output_sink != DEFAULT_OUTPUT_SINK:
+                raise FormFillerError(
+                    f"--resume needs --output-sink {DEFAULT_OUTPUT_SINK}"
+                )
+
+            if args.output_name is not None:
+                try:
+                    OutputNamer(args.output_name)
+                except ConfigurationError as e:
+                    raise FormFillerError(f"Invalid --output-name: {e}")
+
+            if args.pandas_chunk_size < 0:
+                raise FormFillerError("--pandas-chunk-size cannot be negative")
+
+            args.csv_format = self._get_csv_format(args)
+
+            # Validate routing and the templates it routes to
+            args.router = None
+            if args.route_column is not None or args.route:
+                if args.route_column is None or not args.route:
+                    raise FormFillerError(
+                        "--route-column and --route must be used together"
+                    )
+                args.router = TemplateRouter.from_specs(args.route_column, args.route)
+                for template_name in args.router.templates:
+                    if not self.config.get_template_config(template_name).validate():
+                        raise FormFillerError(
+                            f"Missing template or mapping for route target "
+                            f"'{template_name}'"
+                        )
+
             # Set output directory if provided
             if args.output_dir:
                 self.config.outputs_folder = Path(args.output_dir)
@@ -135,6 +599,64 @@ Examples:
                 raise
             raise FormFillerError(f"Argument validation failed: {e}")
 
+    def _validate_serve_args(self, args: argparse.Namespace) -> None:
+        """
+        Validate arguments of the serve command.
+
+        Args:
+            args: Parsed arguments to validate
+
+        Raises:
+            FormFillerError: If arguments are invalid
+        """
+        import socket
+
+        if args.socket and not hasattr(socket, "AF_UNIX"):
+            raise FormFillerError("Unix sockets are not supported on this platform")
+
+        if not 0 < args.port < 65536:
+            raise FormFillerError("--port must be between 1 and 65535")
+
+        if args.output_dir:
+            self.config.outputs_folder = Path(args.output_dir)
+
+    def _validate_proof_args(self, args: argparse.Namespace) -> None:
+        """
+        Validate arguments of the proof command.
+
+        Args:
+            args: Parsed arguments to validate
+
+        Raises:
+            FormFillerError: If arguments are invalid
+        """
+        for source in args.sources:
+            if not Path(source).exists():
+                raise FormFillerError(f"Proof source not found: {source}")
+
+        args.template_config = None
+        if args.template:
+            args.template_config = self.config.get_template_config(args.template)
+            if not Path(args.template_config.template_path).exists():
+                raise FormFillerError(
+                    f"Template not found: {args.template_config.template_path}"
+                )
+
+        if args.workers < 1:
+            raise FormFillerError("--workers must be at least 1")
+
+        if args.sample < 0:
+            raise FormFillerError("--sample cannot be negative")
+
+        if args.dpi < 1:
+            raise FormFillerError("--dpi must be at least 1")
+
+        if args.columns < 1 or args.rows < 1:
+            raise FormFillerError("--columns and --rows must be at least 1")
+
+        if not args.output_dir:
+            args.output_dir = str(self.config.outputs_folder / "proofs")
+
     def print_help(self) -> None:
         """Print help message."""
         self.parser.print_help()
@@ -0,0 +1,343 @@
+"""Streaming writer for the combined output PDF."""
+
+import hashlib
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Set
+
+import fitz
+
+logger = logging.getLogger(__name__)
+
+# Options for saving combined PDFs. Identical objects are already shared by
+# SharedResourceDocument; garbage levels 3 and 4 would search for them again
+# in time quadratic in the number of objects, so only unused objects are
+# dropped and the table compacted.
+SAVE_OPTIONS = {"garbage": 2, "deflate": True, "use_objstms": 1}
+
+# Page keys whose objects are shared between pages
+SHARED_PAGE_KEYS = ("Resources", "Contents")
+
+OBJECT_REFERENCE = re.compile(r"(\d+) 0 R\b")
+
+
+class SharedResourceDocument:
+    """
+    In-memory PDF whose pages share identical resources.
+
+    Every filled form is inserted from its own copy of the template, so each
+    page arrives with its own copy of the template's fonts, content streams
+    and other resources. After a page is inserted, each object it uses
+    through its resources and contents is looked up by a digest of its
+    content (with references already shared); objects seen before are
+    replaced by the first copy. Only the per-row field appearances stay
+    unique, and the dropped copies are removed when the document is saved.
+    """
+
+    def __init__(self):
+        """Initialize an empty document."""
+        self.doc = fitz.open()
+        self.shared_objects = 0
+        # Shared xref for every object visited, first xref per dictionary and
+        # per content digest, first objects not digested yet, and objects
+        # without a stream or references
+        self._shared_xrefs: Dict[int, int] = {}
+        self._first_by_source: Dict[bytes, int] = {}
+        self._digests: Dict[bytes, int] = {}
+        self._undigested: Set[int] = set()
+        self._plain_xrefs: Set[int] = set()
+
+    def __len__(self) -> int:
+        """Number of pages in the document."""
+        return len(self.doc)
+
+    def insert_pdf(
+        self, src_doc: fitz.Document, from_page: int = -1, to_page: int = -1
+    ) -> None:
+        """
+        Append pages of a document, sharing their resources.
+
+        Args:
+            src_doc: Document whose pages are appended
+            from_page: First page to append; -1 for the first page
+            to_page: Last page to append; -1 for the last page
+        """
+        first_page = len(self.doc)
+        self.doc.insert_pdf(src_doc, from_page=from_page, to_page=to_page)
+        for page_num in range(first_page, len(self.doc)):
+            page_xref = self.doc.page_xref(page_num)
+            for key in SHARED_PAGE_KEYS:
+                value_type, value = self.doc.xref_get_key(page_xref, key)
+                if value_type not in ("xref", "dict", "array"):
+                    continue
+                shared_value = self._share_references(value, set())
+                if shared_value != value:
+                    self.doc.xref_set_key(page_xref, key, shared_value)
+
+    def _share_references(self, source: str, visiting: Set[int]) -> str:
+        """Replace every object reference in a PDF source by its shared copy."""
+        return OBJECT_REFERENCE.sub(
+            lambda match: f"{self._share(int(match.group(1)), visiting)} 0 R",
+            source,
+        )
+
+    def _share(self, xref: int, visiting: Set[int]) -> int:
+        """
+        Get the shared copy of an object, sharing the objects it uses first.
+
+        Args:
+            xref: Object to share
+            visiting: Objects being shared further up, to stop at cycles
+
+        Returns:
+            Xref of the first object with the same content
+        """
+        shared = self._shared_xrefs.get(xref)
+        if shared is not None:
+            return shared
+        if xref in visiting:
+            return xref
+
+        visiting.add(xref)
+        source = self.doc.xref_object(xref, compressed=True)
+        shared_source = self._share_references(source, visiting)
+        visiting.discard(xref)
+
+        # Objects can only be equal if their dictionaries are, so streams are
+        # read and digested only once a second object with the same
+        # dictionary turns up
+        source_key = hashlib.sha1(shared_source.encode()).digest()
+        first = self._first_by_source.setdefault(source_key, xref)
+        if "/Length" not in source and not OBJECT_REFERENCE.search(source):
+            self._plain_xrefs.add(xref)
+            shared = first
+        elif first == xref:
+            self._undigested.add(xref)
+            shared = xref
+        else:
+            if first in self._undigested:
+                self._undigested.discard(first)
+                self._register_digest(first, shared_source)
+            shared = self._register_digest(xref, shared_source)
+
+        if shared != xref:
+            self.shared_objects += 1
+        elif shared_source != source:
+            # Small plain objects such as base-14 font dictionaries are
+            # shared where they are used directly, but a new object keeps
+            # its own copy rather than being rewritten for them
+            stored_source = OBJECT_REFERENCE.sub(self._stored_reference, source)
+            if stored_source != source:
+                self.doc.update_object(xref, stored_source)
+        self._shared_xrefs[xref] = shared
+        return shared
+
+    def _stored_reference(self, match: "re.Match") -> str:
+        """Get the reference a new object keeps to an object it uses."""
+        xref = int(match.group(1))
+        if xref in self._plain_xrefs:
+            return match.group(0)
+        return f"{self._shared_xrefs.get(xref, xref)} 0 R"
+
+    def _register_digest(self, xref: int, source: str) -> int:
+        """
+        Look up an object by a digest of its content.
+
+        Args:
+            xref: Object whose references are already shared
+            source: The object's PDF source
+
+        Returns:
+            Xref of the first object with the same digest
+        """
+        digest = hashlib.sha1(source.encode())
+        stream = self.doc.xref_stream_raw(xref)
+        if stream is not None:
+            digest.update(stream)
+        return self._digests.setdefault(digest.digest(), xref)
+
+    def tobytes(self) -> bytes:
+        """Get the document as PDF bytes, without the dropped copies."""
+        return self.doc.tobytes(**SAVE_OPTIONS)
+
+    def save(self, path: str) -> None:
+        """
+        Save the document, without the dropped copies.
+
+        Args:
+            path: Output file path
+        """
+        self.doc.save(path, **SAVE_OPTIONS)
+
+    def close(self) -> None:
+        """Close the document."""
+        self.doc.close()
+
+
+class CombinedPdfWriter:
+    """
+    Collects filled pages into the combined PDF with bounded memory.
+
+    With a shard size of 0 every page is kept in one in-memory document and
+    saved on close. With a positive shard size, the in-memory document is
+    flushed to a part file (e.g. misc_big.part0001.pdf) every shard_size
+    pages, so memory use does not grow with the number of rows. On close,
+    the parts are either merged into the final file using incremental saves
+    or kept as separate files. Pages of one document or part share the
+    template's fonts, content streams and other static resources.
+
+    Parts can also be written by other processes: a worker saves its pages
+    to a path from new_part_path, and add_part appends the file as the
+    next part, so parts end up in the order they are added.
+    """
+
+    def __init__(
+        self, output_path: str, shard_size: int = 0, merge_shards: bool = True
+    ):
+        """
+        Initialize the combined PDF writer.
+
+        Args:
+            output_path: Path of the final combined PDF
+            shard_size: Pages per part file; 0 keeps everything in memory
+            merge_shards: If True, merge part files into output_path on close
+        """
+        self.output_path = output_path
+        self.shard_size = shard_size
+        self.merge_shards = merge_shards
+        self.page_count = 0
+        self.part_paths: List[str] = []
+        self._doc = SharedResourceDocument()
+        self._new_part_count = 0
+        self._remove_stale_parts()
+
+    def insert_pdf(
+        self, src_doc: fitz.Document, from_page: int = -1, to_page: int = -1
+    ) -> None:
+        """
+        Append pages of a document, flushing a part file when full.
+
+        Args:
+            src_doc: Document whose pages are appended
+            from_page: First page to append; -1 for the first page
+            to_page: Last page to append; -1 for the last page
+        """
+        page_count = len(self._doc)
+        self._doc.insert_pdf(src_doc, from_page=from_page, to_page=to_page)
+        self.page_count += len(self._doc) - page_count
+        if self.shard_size and len(self._doc) >= self.shard_size:
+            self._flush()
+
+    def new_part_path(self) -> str:
+        """
+        Get a path where another process can write a part file.
+
+        Returns:
+            A path next to the output file, unique within this writer
+        """
+        self._new_part_count += 1
+        output = Path(self.output_path)
+        return str(
+            output.with_name(
+                f"{output.stem}.partial{self._new_part_count:06d}{output.suffix}"
+            )
+        )
+
+    def add_part(self, part_path: str, page_count: int) -> None:
+        """
+        Append a part file written by another process.
+
+        Pages inserted so far are flushed to a part file first, so pages
+        keep the order in which they were added.
+
+        Args:
+            part_path: Part file, usually from new_part_path; it is renamed
+                to the next numbered part
+            page_count: Number of pages in the part file
+        """
+        if len(self._doc):
+            self._flush()
+        numbered_path = self._part_path(len(self.part_paths) + 1)
+        os.replace(part_path, numbered_path)
+        self.part_paths.append(numbered_path)
+        self.page_count += page_count
+
+    def close(self) -> List[str]:
+        """
+        Write any remaining pages and finish the combined output.
+
+        Returns:
+            Paths of the files written: the combined PDF, or the part files
+            when shards are kept
+        """
+        if not self.shard_size and not self.part_paths:
+            if len(self._doc):
+                self._doc.save(self.output_path)
+            self._doc.close()
+            return [self.output_path] if self.page_count else []
+
+        if len(self._doc):
+            self._flush()
+        self._doc.close()
+
+        if not self.merge_shards or not self.part_paths:
+            return list(self.part_paths)
+
+        self._merge_parts()
+        return [self.output_path]
+
+    def _part_path(self, part_number: int) -> str:
+        """Get the path of a numbered part file next to the output file."""
+        output = Path(self.output_path)
+        return str(
+            output.with_name(f"{output.stem}.part{part_number:04d}{output.suffix}")
+        )
+
+    def _remove_stale_parts(self) -> None:
+        """Delete part files left behind by a previous run."""
+        output = Path(self.output_path)
+        for stale in output.parent.glob(f"{output.stem}.part*{output.suffix}"):
+            stale.unlink()
+
+    def _flush(self) -> None:
+        """Save the in-memory pages to the next part file and start a new one."""
+        part_path = self._part_path(len(self.part_paths) + 1)
+        logger.debug(f"Writing {len(self._doc)} pages to {part_path}")
+        self._doc.save(part_path)
+        self._doc.close()
+        self.part_paths.append(part_path)
+        self._doc = SharedResourceDocument()
+
+    def _merge_parts(self) -> None:
+        """Concatenate the part files into the output file in order."""
+        logger.info(f"Merging {len(self.part_paths)} parts into {self.output_path}")
+        if not self.shard_size and len(self.part_paths) > 1:
+            # Memory use is not bounded, so merge with a single save
+            doc = fitz.open()
+            for part_path in self.part_paths:
+                with fitz.open(part_path) as part:
+                    doc.insert_pdf(part)
+            doc.save(self.output_path, **SAVE_OPTIONS)
+            doc.close()
+            for part_path in self.part_paths:
+                os.remove(part_path)
+            self.part_paths = []
+            return
+
+        os.replace(self.part_paths[0], self.output_path)
+
+        for part_path in self.part_paths[1:]:
+            doc = fitz.open(self.output_path)
+            part = fitz.open(part_path)
+            doc.insert_pdf(part)
+            part.close()
+            # Append only the new objects instead of rewriting the whole file
+            doc.save(
+                self.output_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP
+            )
+            doc.close()
+            os.remove(part_path)
+
+        self.part_paths = []
@@ -5,6 +5,38 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, Optional
 
+from bundle import is_bundle_current
+from output_sink import (
+    DEFAULT_OUTPUT_SINK,
+    INDIVIDUAL_OUTPUT_NAME,
+    OutputSink,
+    open_output_sink,
+)
+
+# Default address of the job service (main.py serve)
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+
+# Engines a template can be filled with: "widget" fills each field through
+# PyMuPDF's widget API, "fast" writes values and prebuilt appearance
+# streams directly into the template's objects (see fast_fill.py)
+FILL_ENGINES = ("widget", "fast")
+
+# Rows filled into one document holding the template's pages once per row,
+# then added to the combined PDF in one go (see batch_fill.py)
+DEFAULT_BATCH_SIZE = 32
+
+# Entries of the per-template render caches (see render_cache.py): laid out
+# text values of the fast engine, and filled forms reused by identical rows
+DEFAULT_APPEARANCE_CACHE_SIZE = 4096
+DEFAULT_FORM_CACHE_SIZE = 128
+
+# Proofs of filled forms (main.py proof, see proof.py): render resolution,
+# and forms per row and column of a contact sheet
+DEFAULT_PROOF_DPI = 50
+DEFAULT_SHEET_COLUMNS = 5
+DEFAULT_SHEET_ROWS = 4
+
 
 @dataclass
 class TemplateConfig:
@@ -14,6 +46,10 @@ class TemplateConfig:
     template_path: str
     mapping_path: str
     output_prefix: str
+    # Compiled bundle used instead of the template and mapping, if current
+    bundle_path: Optional[str] = None
+    # Engine used to fill the template, one of FILL_ENGINES
+    fill_engine: str = "widget"
 
     def validate(self) -> bool:
         """Validate that all required files exist."""
@@ -45,24 +81,56 @@ class FormFillerConfig:
         self.inputs_folder = self.base_path / "inputs"
         self.outputs_folder = self.base_path / "outputs"
         self.templates_folder = self.base_path / "templates"
+        self.compiled_folder = self.base_path / "compiled"
+        # Where individual PDFs are written, one of OUTPUT_SINKS
+        self.output_sink = DEFAULT_OUTPUT_SINK
+        # Name template of individual PDFs built from CSV columns, e.g.
+        # "{9}_{row}"; None names them after the row index
+        self.output_name_template: Optional[str] = None
 
     def get_template_config(self, template_name: str) -> TemplateConfig:
-        """Get template configuration by name or path."""
+        """
+        Get template configuration by name or path.
+
+        If a compiled bundle for the template exists and is newer than both
+        the template and the mapping, its path is set on the configuration
+        so that it is used instead of them.
+        """
         if template_name in self.BUILT_IN_TEMPLATES:
             config = self.BUILT_IN_TEMPLATES[template_name]
             # Make paths absolute based on base_path
             config.template_path = str(self.base_path / config.template_path)
             config.mapping_path = str(self.base_path / config.mapping_path)
-            return config
         else:
-            # Treat as custom template path
-            return TemplateConfig(
-                name="custom",
+            # Treat as custom template path, named after its file
+            name = self.get_custom_template_name(template_name)
+            config = TemplateConfig(
+                name=name,
                 template_path=template_name,
                 mapping_path=str(self.base_path / "field_number_mapping_custom.yml"),
-                output_prefix="custom_big",
+                output_prefix=f"{name}_big",
             )
 
+        bundle_path = self.get_bundle_path(template_name)
+        if is_bundle_current(bundle_path, config.template_path, config.mapping_path):
+            config.bundle_path = bundle_path
+        else:
+            config.bundle_path = None
+        return config
+
+    def get_bundle_path(self, template_name: str) -> str:
+        """Get path of the compiled bundle for a template name or path."""
+        if template_name in self.BUILT_IN_TEMPLATES:
+            bundle_name = template_name
+        else:
+            bundle_name = self.get_custom_template_name(template_name)
+        return str(self.compiled_folder / f"{bundle_name}.ffbundle")
+
+    @staticmethod
+    def get_custom_template_name(template_path: str) -> str:
+        """Get the name of a custom template from its file name."""
+        return f"custom_{Path(template_path).stem}"
+
     def validate_input_file(self, filename: str) -> str:
         """Validate and return full path to input CSV file."""
         input_path = self.inputs_folder / filename
@@ -90,9 +158,23 @@ class FormFillerConfig:
 
     def get_output_path(self, filename: str) -> str:
         """Get full output path, creating directory if needed."""
-        output_path = self.outputs_folder / "individual" /  filename
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        return str(output_path)
+        return os.path.join(self.get_individual_output_dir(), filename)
+
+    def get_individual_output_dir(self, create: bool = True) -> str:
+        """Get the folder of individual output files, creating it if requested."""
+        output_dir = self.outputs_folder / INDIVIDUAL_OUTPUT_NAME
+        if create:
+            output_dir.mkdir(parents=True, exist_ok=True)
+        return str(output_dir)
+
+    def open_output_sink(self) -> OutputSink:
+        """
+        Open the configured sink for a run's individual PDFs.
+
+        Raises:
+            ConfigurationError: If the configured sink is unknown
+        """
+        return open_output_sink(self.output_sink, str(self.outputs_folder))
 
     def get_big_output_path(self, output_prefix: str) -> str:
         """Get path for combined output file."""
@@ -100,6 +182,16 @@ class FormFillerConfig:
         big_output_path.parent.mkdir(parents=True, exist_ok=True)
         return str(big_output_path)
 
+    def get_rejects_path(self, output_prefix: str) -> str:
+        """Get path for the CSV of rows rejected by validation."""
+        return str(self.outputs_folder / "rejects" / f"{output_prefix}_rejects.csv")
+
+    def get_manifest_path(self) -> str:
+        """Get path for the per-row output manifest."""
+        manifest_path = self.outputs_folder / "manifest.sqlite"
+        manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        return str(manifest_path)
+
     @classmethod
     def list_available_templates(cls) -> Dict[str, str]:
         """List all available built-in templates."""
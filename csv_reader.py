@@ -0,0 +1,294 @@
+"""Memory-mapped, chunked CSV reading for FormFiller application."""
+
+import codecs
+import csv
+import io
+import mmap
+import os
+from dataclasses import dataclass, replace
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# Bytes per parsed chunk; chunks end at the first row boundary after this
+DEFAULT_CHUNK_BYTES = 1 << 20
+
+# Bytes read from the start of a file to guess its encoding and dialect; a
+# guessed encoding is then checked against the rest of the file
+SNIFF_BYTES = 64 * 1024
+
+# Delimiters the dialect sniffer chooses from
+SNIFF_DELIMITERS = ",;\t|"
+
+# Encodings tried, in order, when a file has no byte order mark
+FALLBACK_ENCODINGS = ("utf-8", "cp1252", "latin-1")
+
+BYTE_ORDER_MARKS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+@dataclass(frozen=True)
+class CsvFormat:
+    """
+    Encoding and dialect of a CSV file.
+
+    An encoding or delimiter of None is sniffed from the start of the file
+    by resolve().
+    """
+
+    encoding: Optional[str] = None
+    delimiter: Optional[str] = None
+    quotechar: str = '"'
+
+    @property
+    def is_ascii_compatible(self) -> bool:
+        """Whether quotes and line breaks are single ASCII bytes."""
+        probe = f"\n{self.quotechar}"
+        try:
+            return probe.encode("ascii").decode(self.encoding or "utf-8") == probe
+        except UnicodeDecodeError:
+            return False
+
+    def resolve(self, csv_path: str) -> "CsvFormat":
+        """
+        Fill in the encoding and delimiter that were not given.
+
+        Args:
+            csv_path: Path to the CSV file
+
+        Returns:
+            CsvFormat with every field set
+        """
+        if self.encoding is not None and self.delimiter is not None:
+            return self
+
+        with open(csv_path, "rb") as file:
+            sample = file.read(SNIFF_BYTES)
+        # A sample shorter than SNIFF_BYTES is the whole file
+        encoding = self.encoding or detect_encoding(
+            sample, csv_path if len(sample) == SNIFF_BYTES else None
+        )
+        delimiter = self.delimiter or detect_delimiter(decode_sample(sample, encoding))
+        return replace(self, encoding=encoding, delimiter=delimiter)
+
+    def reader(self, lines: Iterable[str]) -> Iterator[List[str]]:
+        """
+        Create a csv reader for this format.
+
+        Args:
+            lines: Iterable of text lines, e.g. a file opened with newline=""
+
+        Returns:
+            csv reader yielding each row as a list of strings
+        """
+        return csv.reader(
+            lines,
+            delimiter=self.delimiter or ",",
+            quotechar=self.quotechar,
+            quoting=csv.QUOTE_MINIMAL,
+        )
+
+
+def detect_encoding(sample: bytes, csv_path: Optional[str] = None) -> str:
+    """
+    Guess the encoding of a file from its first bytes.
+
+    A byte order mark decides the encoding. Otherwise the first encoding
+    of FALLBACK_ENCODINGS that decodes the sample, and the whole file if
+    its path is given, is used, so bank exports in cp1252 are read
+    correctly even when their first accented character comes late;
+    latin-1 decodes any bytes.
+
+    Args:
+        sample: Bytes from the start of the file
+        csv_path: Path to the file, if it is longer than the sample
+
+    Returns:
+        Python codec name
+    """
+    for bom, encoding in BYTE_ORDER_MARKS:
+        if sample.startswith(bom):
+            return encoding
+
+    for encoding in FALLBACK_ENCODINGS:
+        try:
+            # The sample may end partway through a multi-byte character
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+        except UnicodeDecodeError:
+            continue
+        if csv_path is None or decodes_file(csv_path, encoding):
+            return encoding
+    return "latin-1"
+
+
+def decodes_file(
+    csv_path: str, encoding: str, chunk_bytes: int = DEFAULT_CHUNK_BYTES
+) -> bool:
+    """
+    Check that a whole file decodes in an encoding.
+
+    The file is memory-mapped and decoded a chunk at a time, so the check
+    holds no more than one chunk of text in memory.
+
+    Args:
+        csv_path: Path to the file
+        encoding: Encoding to check
+        chunk_bytes: Bytes decoded at once
+
+    Returns:
+        Whether every byte of the file decodes
+    """
+    if os.path.getsize(csv_path) == 0:
+        return True
+
+    decoder = codecs.getincrementaldecoder(encoding)()
+    with open(csv_path, "rb") as file, mmap.mmap(
+        file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+        try:
+            for start in range(0, len(data), chunk_bytes):
+                decoder.decode(data[start : start + chunk_bytes])
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return False
+    return True
+
+
+def decode_sample(sample: bytes, encoding: str) -> str:
+    """
+    Decode the complete lines of a sample.
+
+    Args:
+        sample: Bytes from the start of the file
+        encoding: Encoding of the file
+
+    Returns:
+        Text of the sample up to its last line break
+    """
+    text = codecs.getincrementaldecoder(encoding)(errors="replace").decode(sample)
+    last_line_end = max(text.rfind("\n"), text.rfind("\r"))
+    return text[: last_line_end + 1] if last_line_end >= 0 else text
+
+
+def detect_delimiter(text: str) -> str:
+    """
+    Guess the delimiter of CSV text.
+
+    Args:
+        text: Complete lines from the start of the file
+
+    Returns:
+        One of SNIFF_DELIMITERS; a comma if the text gives no clear answer
+    """
+    try:
+        dialect = csv.Sniffer().sniff(text, delimiters=SNIFF_DELIMITERS)
+    except csv.Error:
+        return ","
+    return dialect.delimiter
+
+
+def iter_chunk_ranges(
+    data: mmap.mmap, chunk_bytes: int = DEFAULT_CHUNK_BYTES, quotechar: str = '"'
+) -> Iterator[Tuple[int, int]]:
+    """
+    Split CSV bytes into chunks that end at row boundaries.
+
+    A chunk ends at the first line break after chunk_bytes at which an even
+    number of quote characters has been seen in it, so a line break inside
+    a quoted field never ends a chunk. Each chunk can then be parsed on its
+    own. Quote characters are assumed to only open and close quoted fields
+    (or be doubled inside them), as in files written by spreadsheets and
+    the csv module; the encoding must be ASCII compatible.
+
+    Args:
+        data: Memory-mapped file contents
+        chunk_bytes: Minimum size of each chunk but the last
+        quotechar: Quote character of the file
+
+    Yields:
+        (start, end) byte offsets of each chunk, covering the whole file
+    """
+    quote = quotechar.encode("ascii")
+    size = len(data)
+    start = 0
+    while start < size:
+        line_end = data.find(b"\n", start + chunk_bytes)
+        if line_end < 0:
+            yield start, size
+            return
+
+        quotes = data[start:line_end].count(quote)
+        while quotes % 2:
+            next_line_end = data.find(b"\n", line_end + 1)
+            if next_line_end < 0:
+                line_end = size - 1
+                break
+            quotes += data[line_end:next_line_end].count(quote)
+            line_end = next_line_end
+
+        yield start, line_end + 1
+        start = line_end + 1
+
+
+def parse_chunk(data: bytes, csv_format: CsvFormat, first: bool) -> Iterator[List[str]]:
+    """
+    Parse the bytes of one chunk.
+
+    Args:
+        data: Chunk bytes, ending at a row boundary
+        csv_format: Resolved format of the file
+        first: Whether the chunk starts the file, where a byte order mark
+            may be
+
+    Returns:
+        Iterator over the rows of the chunk, each a list of string values
+    """
+    encoding = csv_format.encoding
+    if not first and encoding == "utf-8-sig":
+        encoding = "utf-8"
+    return csv_format.reader(io.StringIO(data.decode(encoding), newline=""))
+
+
+def iter_csv_rows(
+    csv_path: str,
+    csv_format: Optional[CsvFormat] = None,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+) -> Iterator[List[str]]:
+    """
+    Stream the rows of a CSV file, reading it a chunk at a time.
+
+    The file is memory-mapped and split at row boundaries, and each chunk
+    is decoded and parsed in one go. Files in encodings that are not ASCII
+    compatible, such as UTF-16, are read as a text stream instead.
+
+    Args:
+        csv_path: Path to the CSV file
+        csv_format: Encoding and dialect; missing values are sniffed
+        chunk_bytes: Approximate number of bytes parsed at once
+
+    Yields:
+        Each row as a list of string values
+
+    Raises:
+        FileNotFoundError: If CSV file doesn't exist
+        csv.Error: If CSV parsing fails
+        UnicodeDecodeError: If the file does not match its encoding
+    """
+    csv_format = (csv_format or CsvFormat()).resolve(csv_path)
+
+    if not csv_format.is_ascii_compatible:
+        with open(csv_path, "r", encoding=csv_format.encoding, newline="") as file:
+            yield from csv_format.reader(file)
+        return
+
+    if os.path.getsize(csv_path) == 0:
+        return
+
+    with open(csv_path, "rb") as file, mmap.mmap(
+        file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+        for start, end in iter_chunk_ranges(data, chunk_bytes, csv_format.quotechar):
+            yield from parse_chunk(data[start:end], csv_format, first=start == 0)
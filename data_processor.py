@@ -2,10 +2,24 @@
 
 import csv
 import logging
-from typing import Any, Dict, List
+import os
+import time
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import yaml
 
+from csv_reader import CsvFormat, iter_csv_rows
+from output_sink import OUTPUT_NAME_FIELD, OutputNamer
+from projection import (
+    ProjectionPlan,
+    get_column_spec,
+    is_unused_mapping,
+    load_pandas,
+)
+from stats import ProcessingStats
+from validation import RowValidator, parse_validation_rules
+
 logger = logging.getLogger(__name__)
 
 
@@ -16,11 +30,26 @@ class DataProcessor:
         """Initialize the data processor."""
         self._field_mappings: Dict[str, Any] = {}
         self._csv_data: List[List[str]] = []
+        self._projection: Optional[ProjectionPlan] = None
+        # Validation rules declared in the mappings, if any
+        self.validator: Optional[RowValidator] = None
+        # (path, mtime) of the mapping file last loaded, to skip reparsing it
+        self._mapping_source: Optional[Tuple[str, float]] = None
+        # Optional hot-path instrumentation, set by FormFiller for a run
+        self.stats: Optional[ProcessingStats] = None
+        # Encoding and dialect of input CSV files; None values are sniffed
+        self.csv_format = CsvFormat()
+        # Names individual outputs from CSV columns; mapped rows then carry
+        # their name under OUTPUT_NAME_FIELD
+        self.output_namer: Optional[OutputNamer] = None
 
     def load_field_mappings(self, mapping_path: str) -> Dict[str, Any]:
         """
         Load field mappings from YAML file.
 
+        Loading the same unchanged file again returns the mappings already
+        loaded without reparsing it.
+
         Args:
             mapping_path: Path to the YAML mapping file
 
@@ -30,13 +59,20 @@ class DataProcessor:
         Raises:
             FileNotFoundError: If mapping file doesn't exist
             yaml.YAMLError: If YAML parsing fails
+            ConfigurationError: If a field declares invalid validation rules
         """
         try:
+            source = (os.path.abspath(mapping_path), os.path.getmtime(mapping_path))
+            if source == self._mapping_source:
+                logger.debug(f"Field mappings from {mapping_path} already loaded")
+                return self._field_mappings
+
             with open(mapping_path, "r", encoding="utf-8") as file:
                 mappings = yaml.safe_load(file)
                 if not isinstance(mappings, dict):
                     raise ValueError(f"Invalid mapping format in {mapping_path}")
-                self._field_mappings = mappings
+                self.set_field_mappings(mappings)
+                self._mapping_source = source
                 logger.info(
                     f"Loaded {len(mappings)} field mappings from {mapping_path}"
                 )
@@ -51,6 +87,25 @@ class DataProcessor:
             logger.error(f"Unexpected error loading mappings from {mapping_path}: {e}")
             raise
 
+    def set_field_mappings(self, mappings: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Use field mappings that were already loaded, e.g. from a template bundle.
+
+        Args:
+            mappings: Dictionary of field mappings
+
+        Returns:
+            The same mappings
+
+        Raises:
+            ConfigurationError: If a field declares invalid validation rules
+        """
+        self._field_mappings = mappings
+        self._projection = ProjectionPlan(mappings)
+        self.validator = parse_validation_rules(mappings)
+        self._mapping_source = None
+        return mappings
+
     def load_csv_data(self, csv_path: str) -> List[List[str]]:
         """
         Load CSV data from file.
@@ -66,14 +121,10 @@ class DataProcessor:
             csv.Error: If CSV parsing fails
         """
         try:
-            with open(csv_path, "r", encoding="utf-8") as file:
-                reader = csv.reader(
-                    file, quotechar='"', delimiter=",", quoting=csv.QUOTE_MINIMAL
-                )
-                data = list(reader)
-                self._csv_data = data
-                logger.info(f"Loaded {len(data)} rows from {csv_path}")
-                return data
+            data = list(iter_csv_rows(csv_path, self.csv_format))
+            self._csv_data = data
+            logger.info(f"Loaded {len(data)} rows from {csv_path}")
+            return data
         except FileNotFoundError:
             logger.error(f"CSV file not found: {csv_path}")
             raise
@@ -84,6 +135,50 @@ class DataProcessor:
             logger.error(f"Unexpected error loading CSV from {csv_path}: {e}")
             raise
 
+    def iter_csv_rows(self, csv_path: str) -> Iterator[List[str]]:
+        """
+        Stream rows from a CSV file one at a time.
+
+        The file is read in memory-mapped chunks split at row boundaries
+        (see csv_reader.py), using csv_format with its missing encoding and
+        delimiter sniffed from the start of the file.
+
+        Args:
+            csv_path: Path to the CSV file
+
+        Yields:
+            Each row as a list of string values
+
+        Raises:
+            FileNotFoundError: If CSV file doesn't exist
+            csv.Error: If CSV parsing fails
+        """
+        try:
+            csv_format = self.csv_format.resolve(csv_path)
+            if csv_format != self.csv_format:
+                logger.info(
+                    f"Reading {csv_path} as {csv_format.encoding} with delimiter "
+                    f"{csv_format.delimiter!r}"
+                )
+            reader = iter_csv_rows(csv_path, csv_format)
+            if self.stats is None:
+                yield from reader
+                return
+
+            while True:
+                start = time.perf_counter()
+                row = next(reader, None)
+                self.stats.record("csv_parse", time.perf_counter() - start)
+                if row is None:
+                    return
+                yield row
+        except FileNotFoundError:
+            logger.error(f"CSV file not found: {csv_path}")
+            raise
+        except csv.Error as e:
+            logger.error(f"Error parsing CSV file {csv_path}: {e}")
+            raise
+
     def process_row(self, row: List[str], row_index: int) -> Dict[str, str]:
         """
         Process a single CSV row using field mappings.
@@ -104,14 +199,34 @@ class DataProcessor:
                 "Field mappings not loaded. Call load_field_mappings() first."
             )
 
+        # Fast path: rows wide enough for every mapped column need no checks
+        field_data = self._projection.project(row)
+        if field_data is not None:
+            return field_data
+
+        return self._process_row_checked(row, row_index)
+
+    def _process_row_checked(self, row: List[str], row_index: int) -> Dict[str, str]:
+        """
+        Process a row field by field, tolerating missing columns.
+
+        Args:
+            row: List of string values from CSV row
+            row_index: Index of the current row (for error reporting)
+
+        Returns:
+            Dictionary mapping PDF field names to values
+        """
         field_data = {}
 
-        for field_name, csv_index in self._field_mappings.items():
+        for field_name, mapping_value in self._field_mappings.items():
             try:
                 # Skip fields marked as unused
-                if csv_index == "-1" or csv_index == -1:
+                if is_unused_mapping(mapping_value):
                     continue
 
+                csv_index = get_column_spec(mapping_value)
+
                 if isinstance(csv_index, list):
                     # Multiple columns mapped to single field
                     values = []
@@ -164,24 +279,171 @@ class DataProcessor:
                 "Field mappings not loaded. Call load_field_mappings() first."
             )
 
-        processed_data = []
-        start_index = 1 if skip_header else 0
+        processed_data = list(self._map_rows(self._csv_data, skip_header))
+        logger.info(f"Processed {len(processed_data)} rows successfully")
+        return processed_data
+
+    def iter_processed_rows(
+        self,
+        csv_path: Optional[str],
+        skip_header: bool = False,
+        batch_size: int = 0,
+        rows: Optional[Iterable[List[str]]] = None,
+    ) -> Iterator[Dict[str, str]]:
+        """
+        Read, map and yield CSV rows one at a time.
+
+        Unlike load_csv_data() followed by process_all_data(), the file is
+        never held in memory as a whole, so memory use stays flat regardless
+        of input size and consumers can start on the first row immediately.
+
+        Args:
+            csv_path: Path to the CSV file
+            skip_header: Whether to skip the first row
+            batch_size: If positive and pandas is installed, project rows in
+                DataFrame chunks of this size instead of one at a time
+            rows: Raw rows to map instead of reading csv_path, e.g. rows
+                received inline by the job service
+
+        Yields:
+            Dictionaries mapping PDF field names to values
+
+        Raises:
+            ValueError: If field mappings not loaded
+        """
+        if not self._field_mappings:
+            raise ValueError(
+                "Field mappings not loaded. Call load_field_mappings() first."
+            )
+
+        source = csv_path or "inline rows"
+        if rows is None:
+            rows = self.iter_csv_rows(csv_path)
+        if batch_size > 0 and load_pandas() is None:
+            logger.warning("pandas is not installed; projecting rows one at a time")
+            batch_size = 0
+
+        if batch_size > 0:
+            mapped_rows = self._map_rows_batched(rows, skip_header, batch_size)
+        else:
+            mapped_rows = self._map_rows(rows, skip_header)
+
+        processed_count = 0
+        for field_data in mapped_rows:
+            processed_count += 1
+            yield field_data
+
+        logger.info(f"Processed {processed_count} rows successfully from {source}")
+
+    def _map_rows(
+        self, rows: Iterable[List[str]], skip_header: bool
+    ) -> Iterator[Dict[str, str]]:
+        """
+        Map raw CSV rows to field data, skipping the header and empty rows.
+
+        Args:
+            rows: Raw CSV rows
+            skip_header: Whether to skip the first row
+
+        Yields:
+            Dictionaries mapping PDF field names to values
+        """
+        for i, row in enumerate(rows):
+            if i == 0 and skip_header:
+                continue
 
-        for i, row in enumerate(self._csv_data[start_index:], start=start_index):
             # Skip empty rows
             if not row or all(not cell.strip() for cell in row):
                 logger.debug(f"Skipping empty row {i}")
                 continue
 
             try:
-                field_data = self.process_row(row, i)
-                processed_data.append(field_data)
+                if self.stats is None:
+                    field_data = self.process_row(row, i)
+                else:
+                    start = time.perf_counter()
+                    field_data = self.process_row(row, i)
+                    self.stats.record("row_mapping", time.perf_counter() - start)
+                if self.output_namer is not None:
+                    field_data[OUTPUT_NAME_FIELD] = self.output_namer.name_row(row)
+                yield field_data
             except Exception as e:
                 logger.error(f"Failed to process row {i}: {e}")
                 continue
 
-        logger.info(f"Processed {len(processed_data)} rows successfully")
-        return processed_data
+    def _map_rows_batched(
+        self, rows: Iterable[List[str]], skip_header: bool, batch_size: int
+    ) -> Iterator[Dict[str, str]]:
+        """
+        Map raw CSV rows to field data a DataFrame chunk at a time.
+
+        Args:
+            rows: Raw CSV rows
+            skip_header: Whether to skip the first row
+            batch_size: Number of rows per DataFrame chunk
+
+        Yields:
+            Dictionaries mapping PDF field names to values
+        """
+        pd = load_pandas()
+        rows = iter(rows)
+        if skip_header:
+            next(rows, None)
+
+        while True:
+            raw_chunk = list(islice(rows, batch_size))
+            if not raw_chunk:
+                return
+
+            # Skip empty rows
+            chunk = [row for row in raw_chunk if row and any(c.strip() for c in row)]
+            if not chunk:
+                continue
+
+            frame = pd.DataFrame.from_records(chunk)
+            start = time.perf_counter()
+            records = self._projection.project_frame(frame).to_dict("records")
+            if self.stats is not None:
+                self.stats.record("row_mapping", time.perf_counter() - start)
+            if self.output_namer is not None:
+                for row, field_data in zip(chunk, records):
+                    field_data[OUTPUT_NAME_FIELD] = self.output_namer.name_row(row)
+            yield from records
+
+    def validate_rows(self, rows: List[List[str]]) -> List[str]:
+        """
+        Check raw CSV rows against the validation rules of the mappings.
+
+        With pandas, the rows are projected and checked as one DataFrame;
+        otherwise each row is projected and checked on its own.
+
+        Args:
+            rows: Raw CSV rows, without the header and empty rows
+
+        Returns:
+            Rejection reason of each row, empty for valid rows
+
+        Raises:
+            ValueError: If field mappings not loaded
+        """
+        if not self._field_mappings:
+            raise ValueError(
+                "Field mappings not loaded. Call load_field_mappings() first."
+            )
+        if self.validator is None or not rows:
+            return [""] * len(rows)
+
+        pd = load_pandas()
+        if pd is None:
+            return [
+                self.validator.validate_record(self.process_row(row, i))
+                for i, row in enumerate(rows)
+            ]
+
+        frame = pd.DataFrame.from_records(rows)
+        return self.validator.validate_frame(
+            self._projection.project_frame(frame)
+        ).tolist()
 
     @property
     def field_mappings(self) -> Dict[str, Any]:
@@ -205,7 +467,7 @@ class DataProcessor:
 
         total_fields = len(self._field_mappings)
         unused_fields = sum(
-            1 for val in self._field_mappings.values() if val == "-1" or val == -1
+            1 for val in self._field_mappings.values() if is_unused_mapping(val)
         )
         active_fields = total_fields - unused_fields
 
@@ -214,6 +476,9 @@ class DataProcessor:
             "active_fields": active_fields,
             "unused_fields": unused_fields,
             "multi_column_fields": sum(
-                1 for val in self._field_mappings.values() if isinstance(val, list)
+                1
+                for val in self._field_mappings.values()
+                if isinstance(get_column_spec(val), list)
             ),
+            "validated_fields": len(self.validator.rules) if self.validator else 0,
         }
@@ -0,0 +1,580 @@
+"""Direct xref fill engine for FormFiller application."""
+
+import logging
+import re
+import struct
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+import fitz
+
+from fill_plan import FillPlan, PlannedField
+from render_cache import LruCache
+from template_cache import CachedTemplate
+from utils.fill_form import FIELD_TYPE_NAMES, set_field_value
+
+logger = logging.getLogger(__name__)
+
+# Line height of multiline text fields, as a multiple of the font size;
+# the same value MuPDF uses for Helvetica
+LINE_HEIGHT = 1.116
+
+# Text field flags (/Ff bits); comb and password fields are filled as widgets
+FF_MULTILINE = 1 << 12
+FF_PASSWORD = 1 << 13
+FF_COMB = 1 << 24
+
+LINE_BREAK = re.compile(r"[\r\n]")
+WRAP_TOKEN = re.compile(rb"[^ ]* ?")
+# Placeholder for the value in prebuilt widget object sources
+VALUE_MARKER = "FormFillerValue"
+
+DA_FONT = re.compile(r"/(\w+)\s+([\d.]+)\s+Tf")
+
+# Helvetica advance widths by WinAnsi byte, loaded on first use
+_helv_widths: Optional[List[float]] = None
+
+
+def f32(value: float) -> float:
+    """Round a value to single precision, as MuPDF computes layout."""
+    return struct.unpack("f", struct.pack("f", value))[0]
+
+
+def format_number(value: float) -> str:
+    """
+    Format a number the way MuPDF writes it into content streams.
+
+    Args:
+        value: Number to format
+
+    Returns:
+        Shortest single-precision representation, without a leading zero
+    """
+    value = f32(value)
+    for precision in range(1, 10):
+        text = f"{value:.{precision}g}"
+        if f32(float(text)) == value:
+            break
+    if text.startswith("0."):
+        return text[1:]
+    if text.startswith("-0."):
+        return "-" + text[2:]
+    return text
+
+
+def get_helv_widths() -> List[float]:
+    """
+    Get Helvetica advance widths for all WinAnsi bytes.
+
+    Returns:
+        List of 256 widths at a font size of 1
+    """
+    global _helv_widths
+    if _helv_widths is None:
+        font = fitz.Font("helv")
+        _helv_widths = [
+            f32(font.glyph_advance(ord(bytes([code]).decode("cp1252", "replace"))))
+            for code in range(256)
+        ]
+    return _helv_widths
+
+
+def escape_pdf_string(text: bytes) -> bytes:
+    """Escape bytes for a literal PDF string."""
+    return text.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def wrap_text(text: bytes, max_width: float, font_size: float) -> List[bytes]:
+    """
+    Break one paragraph into lines the way MuPDF wraps multiline fields.
+
+    A line breaks before a word that would overflow it. Each word keeps one
+    trailing space; further spaces are wrapped like words of no width. A
+    word wider than the field is not split.
+
+    Args:
+        text: Paragraph encoded as WinAnsi bytes
+        max_width: Available line width
+        font_size: Font size
+
+    Returns:
+        Lines of the paragraph, at least one
+    """
+    widths = get_helv_widths()
+    lines = []
+    line_start = 0
+    line_width = 0.0
+    position = 0
+    for token in WRAP_TOKEN.findall(text):
+        if not token:
+            continue
+        word_width = line_width
+        for code in token.rstrip(b" "):
+            word_width = f32(word_width + f32(widths[code] * font_size))
+        if position > line_start and word_width > max_width:
+            lines.append(text[line_start:position])
+            line_start = position
+            line_width = 0.0
+            word_width = 0.0
+            for code in token.rstrip(b" "):
+                word_width = f32(word_width + f32(widths[code] * font_size))
+        line_width = word_width
+        if token.endswith(b" "):
+            line_width = f32(line_width + f32(widths[32] * font_size))
+        position += len(token)
+    lines.append(text[line_start:])
+    return lines
+
+
+@dataclass(frozen=True)
+class FastField:
+    """A mapped widget with everything needed to fill it without loading it."""
+
+    page: int
+    xref: int
+    field_name: str
+    field_type: int
+    # Source of the filled widget object, split where its value goes
+    object_parts: Tuple[str, ...]
+    # Text fields: appearance stream xref and its prebuilt content
+    ap_xref: int = 0
+    stream_prefix: bytes = b""
+    stream_suffix: bytes = b""
+    font_command: bytes = b""
+    font_size: float = 0.0
+    line_height: float = 0.0
+    max_width: float = 0.0
+    multiline: bool = False
+    # Multiline text fields: number of lines shown without clipping
+    max_lines: int = 1
+    # Checkboxes: name of the on state
+    on_state: str = ""
+    # Xref of the template widget the field was prepared from; the same for
+    # every copy of the widget in a batch document
+    template_xref: int = 0
+
+
+@dataclass
+class FastTemplate:
+    """
+    A template prepared for filling through direct xref edits.
+
+    Appearance streams and font resources are created once, when the
+    template is prepared; filling a row only writes each field's value and
+    appearance stream content into a copy of the prepared template.
+    """
+
+    template_path: str
+    data: bytes
+    fields: List[FastField] = field(default_factory=list)
+    # Mapped widgets the fast engine cannot reproduce, filled as widgets
+    widget_fields: List[PlannedField] = field(default_factory=list)
+
+    def open(self) -> fitz.Document:
+        """Open a fresh copy of the prepared template."""
+        return fitz.open(stream=self.data, filetype="pdf")
+
+    def fill(
+        self,
+        doc: fitz.Document,
+        field_data: Dict[str, str],
+        appearance_cache: Optional[LruCache] = None,
+    ) -> Counter:
+        """
+        Fill a copy of the prepared template with one row's data.
+
+        Args:
+            doc: Document opened with open()
+            field_data: Dictionary mapping PDF field names to values
+            appearance_cache: Laid out text values of earlier rows, keyed by
+                template widget xref and value
+
+        Returns:
+            Number of fields filled, by field type name
+        """
+        field_types = Counter()
+        widget_fields = list(self.widget_fields)
+
+        for fast_field in self.fields:
+            value = field_data.get(fast_field.field_name)
+            if value is None:
+                continue
+            if fast_field.field_type == fitz.PDF_WIDGET_TYPE_CHECKBOX:
+                state = fast_field.on_state if value.lower() == "checked" else "Off"
+                doc.update_object(
+                    fast_field.xref, f"/{state}".join(fast_field.object_parts)
+                )
+            else:
+                key = (fast_field.template_xref, value)
+                appearance = None
+                if appearance_cache is not None:
+                    appearance = appearance_cache.get(key)
+                if appearance is None:
+                    try:
+                        appearance = (
+                            build_text_stream(fast_field, value),
+                            fitz.get_pdf_str(value),
+                        )
+                    except UnicodeEncodeError:
+                        # Text outside WinAnsi needs MuPDF's font fallback
+                        widget_fields.append(
+                            PlannedField(
+                                fast_field.page,
+                                fast_field.xref,
+                                fast_field.field_type,
+                                fast_field.field_name,
+                                0,
+                            )
+                        )
+                        continue
+                    if appearance_cache is not None:
+                        appearance_cache.put(key, appearance)
+                content, value_string = appearance
+                doc.update_stream(fast_field.ap_xref, content, compress=False)
+                doc.update_object(
+                    fast_field.xref, value_string.join(fast_field.object_parts)
+                )
+            field_types[FIELD_TYPE_NAMES[fast_field.field_type]] += 1
+
+        # Widgets the fast engine cannot lay out are filled through PyMuPDF
+        pages = {}
+        for planned in widget_fields:
+            if planned.field_name not in field_data:
+                continue
+            page = pages.get(planned.page)
+            if page is None:
+                page = pages[planned.page] = doc.load_page(planned.page)
+            widget = page.load_widget(planned.xref)
+            field_types[set_field_value(widget, field_data[planned.field_name])] += 1
+        return field_types
+
+
+def build_text_stream(fast_field: FastField, value: str) -> bytes:
+    """
+    Build the appearance stream content of a text field.
+
+    Args:
+        fast_field: Prepared text field
+        value: Field value
+
+    Returns:
+        Content stream bytes, laid out like MuPDF's own appearance
+
+    Raises:
+        UnicodeEncodeError: If the value has characters outside WinAnsi
+    """
+    if not value:
+        return fast_field.stream_prefix + fast_field.stream_suffix
+
+    parts = [fast_field.stream_prefix]
+    if fast_field.multiline:
+        line_move = b"0 -%s Td\n" % format_number(fast_field.line_height).encode()
+        paragraphs = LINE_BREAK.split(value)
+        # A trailing line break ends the last line instead of starting one
+        if not paragraphs[-1]:
+            paragraphs.pop()
+        for paragraph in paragraphs:
+            for line in wrap_text(
+                paragraph.encode("cp1252"), fast_field.max_width, fast_field.font_size
+            ):
+                parts.append(line_move)
+                if line:
+                    parts.append(fast_field.font_command)
+                    parts.append(b"(%s) Tj\n" % escape_pdf_string(line))
+    else:
+        parts.append(fast_field.font_command)
+        parts.append(b"(%s) Tj\n" % escape_pdf_string(value.encode("cp1252")))
+    parts.append(fast_field.stream_suffix)
+    return b"".join(parts)
+
+
+def measure_text(text: bytes, font_size: float) -> float:
+    """
+    Measure the width of a line of text.
+
+    The widths are summed in double precision, so the result can differ
+    from MuPDF's single-precision layout in the last digits; that is fine
+    for deciding whether text fits, but not for positioning it.
+
+    Args:
+        text: Line encoded as WinAnsi bytes
+        font_size: Font size
+
+    Returns:
+        Width of the line
+    """
+    return sum(map(get_helv_widths().__getitem__, text)) * font_size
+
+
+def text_fits(fast_field: FastField, value: str) -> bool:
+    """
+    Check that a value is shown in full by a text field.
+
+    Single-line values must fit the field's width. Multiline values must
+    wrap into no more lines than fit the field's height, without a word
+    wider than the field.
+
+    Args:
+        fast_field: Prepared text field
+        value: Field value
+
+    Returns:
+        False if part of the value would be clipped; True for values with
+        characters outside WinAnsi, which are laid out by MuPDF
+    """
+    try:
+        encoded = value.encode("cp1252")
+    except UnicodeEncodeError:
+        return True
+
+    font_size = fast_field.font_size
+    max_width = fast_field.max_width
+    if not fast_field.multiline:
+        return measure_text(encoded, font_size) <= max_width
+
+    paragraphs = LINE_BREAK.split(value)
+    if not paragraphs[-1]:
+        paragraphs.pop()
+    if len(paragraphs) > fast_field.max_lines:
+        return False
+
+    # Paragraphs that fit on one line need no wrapping
+    line_count = 0
+    for paragraph in paragraphs:
+        encoded = paragraph.encode("cp1252")
+        if measure_text(encoded, font_size) <= max_width:
+            line_count += 1
+            continue
+        for line in wrap_text(encoded, max_width, font_size):
+            line_count += 1
+            if measure_text(line.rstrip(b" "), font_size) > max_width:
+                return False
+    return line_count <= fast_field.max_lines
+
+
+def get_widget_checks(fast_template: FastTemplate) -> Dict[str, Callable[[str], bool]]:
+    """
+    Get functions checking that values fit the text fields of a template.
+
+    Args:
+        fast_template: Prepared template
+
+    Returns:
+        Function per text field name, returning False for clipped values
+    """
+    return {
+        fast_field.field_name: partial(text_fits, fast_field)
+        for fast_field in fast_template.fields
+        if fast_field.field_type == fitz.PDF_WIDGET_TYPE_TEXT
+    }
+
+
+def prepare_fast_template(
+    template: CachedTemplate, fill_plan: FillPlan
+) -> FastTemplate:
+    """
+    Prepare a template for the fast fill engine.
+
+    Each mapped text field and checkbox gets its appearance generated once
+    by PyMuPDF, which creates the appearance stream objects, their font
+    resources and the drawing commands around the text. The template then
+    goes back to its original state, so fields a row leaves out look the
+    same as with the widget engine. Fields the fast engine cannot lay out
+    are left to be filled as widgets.
+
+    Args:
+        template: Cached template to prepare
+        fill_plan: Compiled fill plan of the template
+
+    Returns:
+        FastTemplate ready to fill rows
+    """
+    doc = template.open()
+    try:
+        fields = []
+        widget_fields = []
+        for page_num, planned_fields in fill_plan.pages:
+            page = doc.load_page(page_num)
+            for planned in planned_fields:
+                fast_field = _prepare_field(doc, page, planned)
+                if fast_field is None:
+                    widget_fields.append(planned)
+                else:
+                    fields.append(fast_field)
+        data = doc.tobytes()
+    finally:
+        doc.close()
+
+    if widget_fields:
+        logger.info(
+            f"{len(widget_fields)} fields of {template.path} are filled as "
+            f"widgets: {', '.join(p.field_name for p in widget_fields)}"
+        )
+    logger.info(
+        f"Prepared {template.path} for fast filling: {len(fields)} of "
+        f"{len(fill_plan.fields)} mapped fields"
+    )
+    return FastTemplate(
+        template_path=template.path,
+        data=data,
+        fields=fields,
+        widget_fields=widget_fields,
+    )
+
+
+def _prepare_field(
+    doc: fitz.Document, page: fitz.Page, planned: PlannedField
+) -> Optional[FastField]:
+    """
+    Prebuild the appearance of one mapped widget.
+
+    Args:
+        doc: Template document being prepared
+        page: Page holding the widget
+        planned: Planned field to prepare
+
+    Returns:
+        FastField for the widget, or None if it must be filled as a widget
+    """
+    if planned.field_type == fitz.PDF_WIDGET_TYPE_TEXT:
+        text_layout = _get_text_layout(doc, planned.xref)
+        if text_layout is None:
+            return None
+    elif planned.field_type != fitz.PDF_WIDGET_TYPE_CHECKBOX:
+        return None
+
+    original = {
+        key: doc.xref_get_key(planned.xref, key)[1] for key in ("AP", "AS", "V")
+    }
+    widget = page.load_widget(planned.xref)
+    if planned.field_type == fitz.PDF_WIDGET_TYPE_CHECKBOX:
+        on_state = widget.on_state()
+        widget.field_value = False
+    else:
+        widget.field_value = ""
+    widget.update()
+
+    # Rewriting the whole object once is cheaper than setting keys one by one
+    if planned.field_type == fitz.PDF_WIDGET_TYPE_CHECKBOX:
+        value_token = f"/{VALUE_MARKER}"
+        doc.xref_set_key(planned.xref, "AS", value_token)
+    else:
+        value_token = f"({VALUE_MARKER})"
+    doc.xref_set_key(planned.xref, "V", value_token)
+    object_parts = tuple(
+        doc.xref_object(planned.xref, compressed=True).split(value_token)
+    )
+
+    if planned.field_type == fitz.PDF_WIDGET_TYPE_CHECKBOX:
+        fast_field = FastField(
+            page=planned.page,
+            xref=planned.xref,
+            field_name=planned.field_name,
+            field_type=planned.field_type,
+            object_parts=object_parts,
+            on_state=on_state,
+        )
+    else:
+        fast_field = _prepare_text_field(doc, planned, object_parts, *text_layout)
+
+    # Leave the field as it was, so rows that skip it match the widget engine
+    for key, value in original.items():
+        doc.xref_set_key(planned.xref, key, value)
+    return fast_field
+
+
+def _get_text_layout(
+    doc: fitz.Document, xref: int
+) -> Optional[Tuple[str, float, bool]]:
+    """
+    Read the text layout of a widget, if the fast engine can reproduce it.
+
+    Args:
+        doc: Template document
+        xref: Widget xref
+
+    Returns:
+        Tuple of (font name, font size, multiline), or None for fields that
+        use another font, automatic font size, alignment, comb or password
+        layout
+    """
+    da_match = DA_FONT.search(doc.xref_get_key(xref, "DA")[1])
+    if da_match is None or da_match.group(1) != "Helv":
+        return None
+    font_size = float(da_match.group(2))
+
+    flags_type, flags = doc.xref_get_key(xref, "Ff")
+    flags = int(flags) if flags_type == "int" else 0
+    quadding_type, quadding = doc.xref_get_key(xref, "Q")
+    if (
+        font_size <= 0
+        or flags & (FF_COMB | FF_PASSWORD)
+        or (quadding_type == "int" and int(quadding) != 0)
+    ):
+        return None
+    return da_match.group(1), font_size, bool(flags & FF_MULTILINE)
+
+
+def _prepare_text_field(
+    doc: fitz.Document,
+    planned: PlannedField,
+    object_parts: Tuple[str, ...],
+    font_name: str,
+    font_size: float,
+    multiline: bool,
+) -> Optional[FastField]:
+    """
+    Split a text widget's generated empty appearance around its text.
+
+    Args:
+        doc: Template document being prepared
+        planned: Planned text field
+        object_parts: Source of the filled widget object, split at its value
+        font_name: Font resource name from the widget's /DA
+        font_size: Font size from the widget's /DA
+        multiline: Whether the field is multiline
+
+    Returns:
+        FastField for the widget, or None if the appearance has an
+        unexpected layout
+    """
+    ap_type, ap_ref = doc.xref_get_key(planned.xref, "AP/N")
+    if ap_type != "xref":
+        return None
+    ap_xref = int(ap_ref.split()[0])
+
+    stream = doc.xref_stream(ap_xref)
+    suffix = b"ET\nQ\nEMC\n"
+    if not stream.endswith(suffix):
+        return None
+    prefix = stream[: -len(suffix)]
+
+    # The text origin written before the text is the field's padding
+    origin = prefix.rstrip(b"\n").rsplit(b"\n", 1)[-1].split()
+    bbox = doc.xref_get_key(ap_xref, "BBox")[1].strip("[]").split()
+    if len(origin) != 3 or origin[2] != b"Td" or len(bbox) != 4:
+        return None
+    padding = float(origin[0])
+    width = f32(float(bbox[2]) - float(bbox[0]))
+    height = f32(float(bbox[3]) - float(bbox[1]))
+    line_height = f32(font_size * LINE_HEIGHT)
+
+    return FastField(
+        page=planned.page,
+        xref=planned.xref,
+        field_name=planned.field_name,
+        field_type=planned.field_type,
+        object_parts=object_parts,
+        ap_xref=ap_xref,
+        stream_prefix=prefix,
+        stream_suffix=suffix,
+        font_command=f"/{font_name} {format_number(font_size)} Tf\n".encode(),
+        font_size=font_size,
+        line_height=line_height,
+        max_width=f32(width - padding * 2),
+        multiline=multiline,
+        max_lines=max(1, int((height - padding * 2) // line_height)),
+        template_xref=planned.xref,
+    )
@@ -0,0 +1,104 @@
+"""Compiled fill plans mapping CSV columns directly to template widgets."""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple, Union
+
+from projection import get_column_spec, is_unused_mapping
+from template_cache import CachedTemplate
+
+logger = logging.getLogger(__name__)
+
+ColumnSpec = Union[int, List[int]]
+
+
+@dataclass(frozen=True)
+class PlannedField:
+    """A single mapped widget resolved to its page and xref."""
+
+    page: int
+    xref: int
+    field_type: int
+    field_name: str
+    column_spec: ColumnSpec
+
+
+@dataclass
+class FillPlan:
+    """Flat list of mapped widgets for one template, grouped by page."""
+
+    template_path: str
+    fields: List[PlannedField] = field(default_factory=list)
+    unmatched_fields: List[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        """Group planned fields by page so each page is loaded once per row."""
+        pages: Dict[int, List[PlannedField]] = {}
+        for planned in self.fields:
+            pages.setdefault(planned.page, []).append(planned)
+        self.pages: List[Tuple[int, List[PlannedField]]] = sorted(pages.items())
+
+    def get_summary(self) -> Dict[str, Any]:
+        """
+        Get a summary of the compiled plan.
+
+        Returns:
+            Dictionary with planned widget and unmatched field counts
+        """
+        return {
+            "planned_widgets": len(self.fields),
+            "pages": len(self.pages),
+            "unmatched_fields": len(self.unmatched_fields),
+        }
+
+
+def compile_fill_plan(
+    template: CachedTemplate, field_mappings: Dict[str, Any]
+) -> FillPlan:
+    """
+    Match field mappings against a template's widgets.
+
+    Fields marked as unused (-1) are dropped. Mapped fields that have no
+    widget in the template are reported as unmatched.
+
+    Args:
+        template: Cached template providing the widget inventory
+        field_mappings: Field mappings as returned by DataProcessor.load_field_mappings
+
+    Returns:
+        FillPlan listing only the widgets that receive data
+    """
+    active = {
+        name: get_column_spec(value)
+        for name, value in field_mappings.items()
+        if not is_unused_mapping(value)
+    }
+
+    planned = [
+        PlannedField(
+            page=widget.page,
+            xref=widget.xref,
+            field_type=widget.field_type,
+            field_name=widget.field_name,
+            column_spec=active[widget.field_name],
+        )
+        for widget in template.widgets
+        if widget.field_name in active
+    ]
+
+    matched = {p.field_name for p in planned}
+    unmatched = [name for name in active if name not in matched]
+    if unmatched:
+        logger.warning(
+            f"{len(unmatched)} mapped fields have no widget in {template.path}: "
+            f"{', '.join(unmatched)}"
+        )
+
+    plan = FillPlan(
+        template_path=template.path, fields=planned, unmatched_fields=unmatched
+    )
+    logger.info(
+        f"Compiled fill plan for {template.path}: {len(planned)} of "
+        f"{len(template.widgets)} widgets mapped"
+    )
+    return plan
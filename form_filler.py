@@ -1,18 +1,185 @@
 """Core FormFiller application class."""
 
 import logging
+import math
 import os
-from typing import Optional
+import time
+from dataclasses import dataclass, field, replace
+from functools import partial
+from collections import Counter
+from itertools import chain, islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-import fitz
-
-from config import FormFillerConfig, TemplateConfig
+from batch_fill import BatchTemplate, prepare_batch_template
+from bundle import TemplateBundle, load_bundle
+from combined_writer import CombinedPdfWriter
+from config import (
+    DEFAULT_APPEARANCE_CACHE_SIZE,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_FORM_CACHE_SIZE,
+    FILL_ENGINES,
+    FormFillerConfig,
+    TemplateConfig,
+)
+from csv_reader import CsvFormat
 from data_processor import DataProcessor
 from exceptions import DataProcessingError, FormFillerError, TemplateError
-from utils.fill_form import fill_form
+from fast_fill import FastTemplate, get_widget_checks, prepare_fast_template
+from fill_plan import FillPlan, compile_fill_plan
+from manifest import RunManifest, hash_row
+from output_sink import (
+    DEFAULT_OUTPUT_SINK,
+    OUTPUT_NAME_FIELD,
+    OutputNamer,
+    OutputSink,
+)
+from output_writer import DEFAULT_IO_THREADS, FinishedWrite, WriteBehindWriter
+from render_cache import LruCache, RenderCache, get_cache_stats
+from routing import TemplateRouter
+from parallel_fill import (
+    DEFAULT_CHUNK_SIZE,
+    ChunkTask,
+    RowTask,
+    WorkerPool,
+    WorkerTemplate,
+    chunk_rows_by_template,
+    fill_chunk,
+    imap_ordered,
+    start_pool,
+)
+from stats import ProcessingStats
+from template_cache import CachedTemplate, TemplateCache
+from utils.fill_form import append_filled_form, fill_form, fill_form_batch
+from validation import RejectsWriter
 
 logger = logging.getLogger(__name__)
 
+# Raw rows checked at once by the validation pass
+VALIDATION_CHUNK_SIZE = 10000
+
+
+@dataclass
+class PreparedTemplate:
+    """
+    Fill state derived from a template and its mappings, kept across runs.
+
+    A long-lived FormFiller, such as the job service's, reuses it for every
+    run of the template instead of compiling it again. It is replaced when
+    the template or its mappings change.
+    """
+
+    # Digest of the template the state was built from
+    digest: str
+    mappings: Dict[str, Any]
+    fill_plan: FillPlan
+    # Template prepared for the fast engine, once a run needed it
+    fast_template: Optional[FastTemplate] = None
+    # Text values laid out by the fast engine, shared by the runs
+    appearances: Optional[LruCache] = None
+    # Batch templates by (fast engine, rows per batch), once a batch was
+    # full; None if the template cannot be batched
+    batch_templates: Dict[Tuple[bool, int], Optional[BatchTemplate]] = field(
+        default_factory=dict
+    )
+
+    def get_fast_template(self, template: CachedTemplate) -> FastTemplate:
+        """Get the template prepared for the fast engine, preparing it once."""
+        if self.fast_template is None:
+            self.fast_template = prepare_fast_template(template, self.fill_plan)
+        return self.fast_template
+
+    def get_appearance_cache(self, size: int) -> LruCache:
+        """
+        Get the fast engine's appearance cache for a new run.
+
+        Args:
+            size: Appearances kept
+
+        Returns:
+            The cache of earlier runs, with its counts reset, or a new one
+            if its size changed
+        """
+        if self.appearances is None or self.appearances.max_size != size:
+            self.appearances = LruCache(size)
+        self.appearances.take_counts()
+        return self.appearances
+
+    def get_batch_template(
+        self,
+        template: CachedTemplate,
+        fast_template: Optional[FastTemplate],
+        size: int,
+    ) -> Optional[BatchTemplate]:
+        """
+        Get a batch template of the given size, preparing it once.
+
+        Args:
+            template: Cached template the state was built from
+            fast_template: Fast engine fields, if the run uses the fast engine
+            size: Rows per batch
+
+        Returns:
+            BatchTemplate, or None if the template cannot be batched
+        """
+        key = (fast_template is not None, size)
+        if key not in self.batch_templates:
+            self.batch_templates[key] = prepare_batch_template(
+                template, self.fill_plan, fast_template, size
+            )
+        return self.batch_templates[key]
+
+
+@dataclass
+class FillRun:
+    """
+    State of one template's output, shared by the serial and parallel fill
+    paths during a run. A routed run has one FillRun per template.
+    """
+
+    template_config: TemplateConfig
+    template_cache: TemplateCache
+    fill_plan: Optional[FillPlan]
+    combined_doc: Optional[CombinedPdfWriter]
+    flatten_combined: bool = True
+    manifest: Optional[RunManifest] = None
+    template_hash: str = ""
+    resume: bool = False
+    reused_count: int = 0
+    progress: Optional[Callable[[int], None]] = None
+    # Identifies the template to pool workers (RowTask.template)
+    key: str = ""
+    mappings: Dict[str, Any] = field(default_factory=dict)
+    data_processor: Optional[DataProcessor] = None
+    row_count: int = 0
+    filled_count: int = 0
+    failed_count: int = 0
+    combined_paths: List[str] = field(default_factory=list)
+    fill_engine: str = "widget"
+    # Template prepared for the fast engine, when the run uses it
+    fast_template: Optional[FastTemplate] = None
+    # Rows rejected by the mapping's validation rules
+    rejects: Optional[RejectsWriter] = None
+    # Where individual PDFs are written; None if they are not kept
+    output_sink: Optional[OutputSink] = None
+    # Names individual PDFs from CSV columns instead of the row index
+    output_namer: Optional[OutputNamer] = None
+    # Rows per batch, when combined rows are filled in batches; 0 fills
+    # each row in its own document
+    batch_size: int = 0
+    # Template repeated per row of a batch, prepared once a batch is full
+    batch_template: Optional[BatchTemplate] = None
+    # Index and mapped field data of rows waiting for their batch
+    batch_rows: List[Tuple[int, Dict[str, str]]] = field(default_factory=list)
+    # Appearances and filled forms reused by later rows
+    render_cache: Optional[RenderCache] = None
+    # State kept across runs of the template; None on a dry run
+    prepared: Optional[PreparedTemplate] = None
+
+    @property
+    def keep_individual(self) -> bool:
+        """Whether individual PDFs are saved alongside the combined PDF."""
+        return self.output_sink is not None and self.combined_doc is not None
+
 
 class FormFiller:
     """
@@ -30,115 +197,1178 @@ class FormFiller:
         """
         self.config = config or FormFillerConfig()
         self.data_processor = DataProcessor()
+        self.stats = ProcessingStats()
+        self.template_cache = TemplateCache()
+        self._bundles: Dict[str, TemplateBundle] = {}
+        # Fill state of each template, by template and mapping path
+        self._prepared: Dict[Tuple[str, str], PreparedTemplate] = {}
         self._filled_count = 0
 
     def process_forms(
         self,
-        input_csv_path: str,
+        input_csv_path: Optional[str],
         template_config: TemplateConfig,
         skip_header: bool = False,
         dry_run: bool = False,
         generate_combined_pdf: bool = True,
+        workers: int = 1,
+        combined_shard_size: int = 0,
+        merge_combined_shards: bool = True,
+        flatten_combined: bool = True,
+        projection_batch_size: int = 0,
+        csv_format: Optional[CsvFormat] = None,
+        resume: bool = False,
+        force: bool = False,
+        input_rows: Optional[Iterable[List[str]]] = None,
+        template_cache: Optional[TemplateCache] = None,
+        progress: Optional[Callable[[int], None]] = None,
+        router: Optional[TemplateRouter] = None,
+        fill_engine: Optional[str] = None,
+        io_threads: int = DEFAULT_IO_THREADS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        appearance_cache_size: int = DEFAULT_APPEARANCE_CACHE_SIZE,
+        form_cache_size: int = DEFAULT_FORM_CACHE_SIZE,
+        worker_pool: Optional[WorkerPool] = None,
     ) -> dict:
         """
         Process CSV data and fill PDF forms.
 
         Args:
-            input_csv_path: Path to input CSV file
-            template_config: Template configuration
+            input_csv_path: Path to input CSV file; may be None with input_rows
+            template_config: Template configuration; with a router, the template
+                used for rows the router has no route for
             skip_header: Whether to skip the first row of CSV
             dry_run: If True, don't actually create PDF files
             generate_combined_pdf: If True, create a combined PDF with all forms
+            workers: Number of worker processes used to fill rows; 1 fills
+                in-process. Runs with fewer chunks of rows than workers use
+                one worker per chunk, and a single chunk fills in-process.
+            combined_shard_size: Flush the combined PDF to a part file every this
+                many pages to bound memory; 0 keeps it in memory until the end
+            merge_combined_shards: If True, merge part files into the combined PDF;
+                if False, keep them as separate files
+            flatten_combined: If True, flatten form fields into the page content of
+                the combined PDF; if False, keep them as live, editable fields
+            projection_batch_size: If positive, map CSV rows to fields in pandas
+                DataFrame chunks of this size instead of one row at a time
+            csv_format: Encoding and dialect of the input CSV; anything not
+                set is sniffed from the file
+            resume: If True, skip rows whose mapped data and template are unchanged
+                since they were last filled, according to the output manifest
+            force: If True, clear the output manifest and fill every row again
+            input_rows: Raw CSV rows to fill instead of reading input_csv_path
+            template_cache: Cache of parsed templates to reuse across runs; the
+                FormFiller's own cache is used if None
+            progress: Called with the number of rows handled so far as the
+                fill progresses
+            router: Chooses a template per row, so that rows for several
+                templates are filled in one pass with one combined PDF per
+                template
+            fill_engine: Engine used to fill every template, "widget" or
+                "fast"; each template's configured engine is used if None
+            io_threads: Number of threads writing individual PDFs while the
+                next rows are filled; 0 saves each PDF before filling on.
+                Archive sinks are always written by one thread.
+            batch_size: Rows filled into one document, holding the template's
+                pages once per row, before it is added to the combined PDF;
+                0 or 1 fills every row in its own document. Only used for
+                flattened combined output without individual PDFs.
+            appearance_cache_size: Text values whose appearance the fast
+                engine keeps laid out for later rows, per template; 0
+                disables the cache
+            form_cache_size: Filled forms kept per template, so that a row
+                with the same mapped data as a recent one reuses its pages
+                and individual PDF; 0 disables the cache. Not used when the
+                combined PDF keeps live fields.
+            worker_pool: Process pool kept warm across runs, used instead of
+                starting one when rows are filled with several workers; it is
+                restarted if the run's templates differ from the last run's
+
+        Individual PDFs go to the sink configured by config.output_sink and
+        are named by config.output_name_template.
 
         Returns:
-            Dictionary with processing results and statistics
+            Dictionary with processing results and statistics. With a router,
+            "templates" holds the results of each template that received rows,
+            keyed by routed template name or path, or the default template's
+            name.
 
         Raises:
             FormFillerError: If processing fails
         """
+        if resume and force:
+            raise FormFillerError("resume and force cannot be used together")
+        if fill_engine is not None and fill_engine not in FILL_ENGINES:
+            raise FormFillerError(f"Unknown fill engine: {fill_engine}")
+        archive = self.config.output_sink != DEFAULT_OUTPUT_SINK
+        if resume and archive:
+            raise FormFillerError(
+                f"resume reuses individual PDFs, which needs the "
+                f"{DEFAULT_OUTPUT_SINK} output sink"
+            )
+        output_namer = None
+        if self.config.output_name_template:
+            output_namer = OutputNamer(self.config.output_name_template)
+
         try:
-            # Load data and mappings
-            logger.info(f"Loading CSV data from {input_csv_path}")
-            self.data_processor.load_csv_data(input_csv_path)
+            setup_start = time.perf_counter()
+            self.stats = ProcessingStats()
+            self.data_processor.stats = self.stats
+            self.data_processor.csv_format = csv_format or CsvFormat()
 
-            logger.info(f"Loading field mappings from {template_config.mapping_path}")
-            self.data_processor.load_field_mappings(template_config.mapping_path)
+            # Parse the template once and hand each row a fresh in-memory copy
+            if template_cache is None:
+                template_cache = self.template_cache
 
-            # Process all data
-            logger.info("Processing CSV data with field mappings")
-            processed_data = self.data_processor.process_all_data(
-                skip_header=skip_header
+            # With a combined PDF, individual files are only kept on request:
+            # for reruns, or by choosing an archive to collect them in
+            output_sink = None
+            manifest = None
+            if not dry_run and (
+                not generate_combined_pdf or resume or force or archive
+            ):
+                output_sink = self.config.open_output_sink()
+                # Track individual files so later runs can skip unchanged rows
+                if not archive:
+                    manifest = RunManifest(self.config.get_manifest_path())
+                    if force:
+                        manifest.clear()
+            if output_sink is None:
+                output_namer = None
+
+            def open_run(
+                key: str, config: TemplateConfig, data_processor: DataProcessor
+            ) -> FillRun:
+                # Load mappings, from the compiled bundle when there is a current one
+                mappings = self._load_template_sources(
+                    config, template_cache, data_processor
+                )
+
+                run = FillRun(
+                    template_config=config,
+                    template_cache=template_cache,
+                    fill_plan=None,
+                    combined_doc=None,
+                    flatten_combined=flatten_combined,
+                    manifest=manifest,
+                    resume=resume,
+                    progress=progress,
+                    key=key,
+                    mappings=mappings,
+                    data_processor=data_processor,
+                    fill_engine=fill_engine or config.fill_engine,
+                    output_sink=output_sink,
+                    output_namer=output_namer,
+                )
+                data_processor.output_namer = output_namer
+                validator = data_processor.validator
+                if validator is not None:
+                    # A dry run only reports how many rows would be rejected
+                    run.rejects = RejectsWriter(
+                        None
+                        if dry_run
+                        else self.config.get_rejects_path(config.output_prefix)
+                    )
+                measure_widgets = validator is not None and bool(
+                    validator.widget_fields
+                )
+                if dry_run and not measure_widgets:
+                    return run
+
+                # Resolve mapped widgets once so rows skip the widget scan
+                template = template_cache.get(config.template_path)
+                prepared = self._prepare_template(config, template, mappings)
+                fill_plan = prepared.fill_plan
+                fast_template = None
+                if run.fill_engine == "fast" or measure_widgets:
+                    fast_template = prepared.get_fast_template(template)
+                if measure_widgets:
+                    # Values are measured the way the fast engine lays them out
+                    validator.set_widget_checks(get_widget_checks(fast_template))
+                if dry_run:
+                    return run
+
+                run.prepared = prepared
+                run.fill_plan = fill_plan
+                if run.fill_engine == "fast":
+                    run.fast_template = fast_template
+                # Pages of a combined PDF with live fields cannot be reused,
+                # as their widgets would be shared between pages; filled
+                # forms are only kept for the run, laid out values for as
+                # long as the prepared template
+                run.render_cache = RenderCache(
+                    0,
+                    (
+                        form_cache_size
+                        if flatten_combined or not generate_combined_pdf
+                        else 0
+                    ),
+                )
+                if run.fill_engine == "fast" and appearance_cache_size > 0:
+                    run.render_cache.appearances = prepared.get_appearance_cache(
+                        appearance_cache_size
+                    )
+                # Batch copies rename their fields, so combined PDFs that
+                # keep live fields are filled a row at a time
+                if (
+                    generate_combined_pdf
+                    and flatten_combined
+                    and output_sink is None
+                    and batch_size > 1
+                ):
+                    run.batch_size = batch_size
+                    # A batch template prepared by an earlier run is used
+                    # even for runs shorter than a batch
+                    run.batch_template = prepared.batch_templates.get(
+                        (run.fast_template is not None, batch_size)
+                    )
+                if manifest is not None:
+                    run.template_hash = template.digest
+
+                # Initialize combined PDF writer if requested
+                if generate_combined_pdf:
+                    run.combined_doc = CombinedPdfWriter(
+                        self.config.get_big_output_path(config.output_prefix),
+                        shard_size=combined_shard_size,
+                        merge_shards=merge_combined_shards,
+                    )
+                return run
+
+            # Stream CSV rows: each row is read and mapped only when it is filled
+            if input_rows is None:
+                logger.info(f"Streaming CSV data from {input_csv_path}")
+
+            default_run = open_run(
+                template_config.name, template_config, self.data_processor
             )
+            runs = [default_run]
+            routes = {}
+            if router is not None:
+                output_prefixes = {template_config.output_prefix}
+                # Load and compile every routed template once, up front
+                for template_name in router.templates:
+                    config = self.config.get_template_config(template_name)
+                    if (config.template_path, config.mapping_path) == (
+                        template_config.template_path,
+                        template_config.mapping_path,
+                    ):
+                        routes[template_name] = default_run
+                        continue
+                    # Custom templates sharing a file name get numbered outputs
+                    name, prefix = config.name, config.output_prefix
+                    number = 2
+                    while config.output_prefix in output_prefixes:
+                        config = replace(
+                            config,
+                            name=f"{name}_{number}",
+                            output_prefix=f"{prefix}_{number}",
+                        )
+                        number += 1
+                    output_prefixes.add(config.output_prefix)
+                    data_processor = DataProcessor()
+                    data_processor.stats = self.stats
+                    routes[template_name] = open_run(
+                        template_name, config, data_processor
+                    )
+                    runs.append(routes[template_name])
 
-            if not processed_data:
-                raise DataProcessingError("No valid data rows found to process")
+            # Check every row against the mappings' validation rules before
+            # any PDF work, and leave rejected rows out of the fill
+            if any(run.rejects is not None for run in runs):
+                if input_rows is not None:
+                    # Inline rows are read twice
+                    input_rows = list(input_rows)
+                rejected_rows = self._validate_rows(
+                    (
+                        input_rows
+                        if input_rows is not None
+                        else self.data_processor.iter_csv_rows(input_csv_path)
+                    ),
+                    router,
+                    routes,
+                    default_run,
+                    skip_header,
+                )
+                if rejected_rows:
+                    if input_rows is None:
+                        input_rows = self.data_processor.iter_csv_rows(input_csv_path)
+                    input_rows = (
+                        row
+                        for i, row in enumerate(input_rows)
+                        if i not in rejected_rows
+                    )
 
-            # Initialize combined PDF document if requested
-            combined_doc = None
-            if generate_combined_pdf and not dry_run:
-                combined_doc = fitz.open()
+            if router is None:
+                processed_rows = self.data_processor.iter_processed_rows(
+                    input_csv_path,
+                    skip_header=skip_header,
+                    batch_size=projection_batch_size,
+                    rows=input_rows,
+                )
+                routed_rows = ((default_run, row) for row in processed_rows)
+            else:
+                if projection_batch_size > 0:
+                    logger.warning("Routed rows are projected one at a time")
+                if input_rows is None:
+                    input_rows = self.data_processor.iter_csv_rows(input_csv_path)
+                routed_rows = self._route_rows(
+                    input_rows, router, routes, default_run, skip_header
+                )
+
+            first_row = next(routed_rows, None)
+            if first_row is None:
+                raise DataProcessingError("No valid data rows found to process")
+            routed_rows = chain([first_row], routed_rows)
 
             # Process each row and generate PDFs
             self._filled_count = 0
-            failed_count = 0
+            fill_start = time.perf_counter()
+
+            # Only individual PDFs are written behind the fill; archives are
+            # appended to in order by a single thread
+            if output_sink is None:
+                io_threads = 0
+            elif not output_sink.concurrent:
+                io_threads = 1
+
+            if not dry_run and workers > 1:
+                # A small run fills in fewer processes, or in this one
+                routed_rows, workers = self._limit_workers(routed_rows, runs, workers)
+
+            try:
+                if not dry_run and workers > 1:
+                    total_rows, failed_count = self._fill_rows_parallel(
+                        routed_rows,
+                        runs,
+                        workers,
+                        io_threads,
+                        output_sink,
+                        worker_pool,
+                    )
+                else:
+                    total_rows, failed_count = self._fill_rows_serial(
+                        routed_rows, dry_run, io_threads, output_sink
+                    )
+            finally:
+                # Keep progress recorded so far, even if the run is interrupted
+                if manifest is not None:
+                    manifest.close()
+                if output_sink is not None:
+                    output_sink.close()
+
+            # Save combined PDFs if created
+            save_start = time.perf_counter()
+            for run in runs:
+                if run.combined_doc is None:
+                    continue
+                if run.row_count:
+                    logger.info(
+                        f"Saving combined PDF to {run.combined_doc.output_path}"
+                    )
+                with self.stats.time("final_save"):
+                    run.combined_paths = run.combined_doc.close()
+                self.stats.increment(
+                    "bytes_written",
+                    sum(os.path.getsize(p) for p in run.combined_paths),
+                )
+            save_end = time.perf_counter()
+
+            reused_count = sum(run.reused_count for run in runs)
+            rejected_count = sum(run.rejects.count for run in runs if run.rejects)
+
+            # Return processing results
+            results = {
+                "total_rows": total_rows,
+                "successful_fills": self._filled_count,
+                "failed_fills": failed_count,
+                "reused_rows": reused_count,
+                "rejected_rows": rejected_count,
+                "dry_run": dry_run,
+                "template_cache": template_cache.get_stats(),
+                # Hit rates of the appearance and filled form caches
+                "render_cache": get_cache_stats(
+                    run.render_cache for run in runs if run.render_cache is not None
+                ),
+                # Seconds per stage; "fill" includes streaming CSV read and mapping
+                "timings": {
+                    "setup": fill_start - setup_start,
+                    "fill": save_start - fill_start,
+                    "combined_save": save_end - save_start,
+                },
+                "stats": self.stats.summary(),
+            }
+
+            if output_sink is not None:
+                results["individual_output"] = output_sink.location
+            if manifest is not None:
+                results["manifest_path"] = manifest.db_path
+
+            if router is None:
+                results.update(self._get_run_results(default_run))
+            else:
+                # Keyed by routed template name or path, as several custom
+                # templates can share a configured name
+                used_runs = [
+                    run
+                    for run in runs
+                    if run.row_count or (run.rejects and run.rejects.count)
+                ]
+                results["templates"] = {
+                    run.key: self._get_run_results(run) for run in used_runs
+                }
+                results["template_used"] = ", ".join(
+                    run.template_config.name for run in used_runs
+                )
+                results["mapping_summary"] = self.data_processor.get_mapping_summary()
+
+            logger.info(
+                f"Processing completed: {self._filled_count} successful, "
+                f"{failed_count} failed, {reused_count} reused, "
+                f"{rejected_count} rejected"
+            )
+            if self.stats.field_types:
+                logger.info(
+                    "Fields filled by type: "
+                    + ", ".join(
+                        f"{name}={count}"
+                        for name, count in sorted(self.stats.field_types.items())
+                    )
+                )
+            return results
+
+        except Exception as e:
+            if isinstance(e, FormFillerError):
+                raise
+            raise FormFillerError(f"Form processing failed: {e}")
+
+    def _get_run_results(self, run: FillRun) -> dict:
+        """
+        Get the results of one template's output.
+
+        Args:
+            run: State of the template's output after filling
+
+        Returns:
+            Dictionary with the template's fill counts and output paths
+        """
+        results = {
+            "template_used": run.template_config.name,
+            "fill_engine": run.fill_engine,
+            "rows": run.row_count,
+            "successful_fills": run.filled_count,
+            "failed_fills": run.failed_count,
+            "reused_rows": run.reused_count,
+            "mapping_summary": run.data_processor.get_mapping_summary(),
+        }
+
+        if run.rejects is not None:
+            results["rejected_rows"] = run.rejects.count
+            if run.rejects.count and run.rejects.path is not None:
+                results["rejects_path"] = run.rejects.path
+
+        if run.fill_plan is not None:
+            results["fill_plan"] = run.fill_plan.get_summary()
+
+        if run.combined_doc is not None and run.combined_paths:
+            if run.combined_paths != [run.combined_doc.output_path]:
+                results["combined_pdf_parts"] = run.combined_paths
+            else:
+                results["combined_pdf_path"] = run.combined_doc.output_path
+        return results
+
+    def _validate_rows(
+        self,
+        rows: Iterable[List[str]],
+        router: Optional[TemplateRouter],
+        routes: Dict[str, FillRun],
+        default_run: FillRun,
+        skip_header: bool,
+    ) -> Set[int]:
+        """
+        Check raw CSV rows against each template's validation rules.
+
+        Rows are routed like the fill routes them and checked a chunk at a
+        time; rejected rows are written to their template's rejects CSV.
+
+        Args:
+            rows: Raw CSV rows
+            router: Router choosing the template of each row, or None to
+                check every row against the default template
+            routes: Template outputs keyed by routed template name
+            default_run: Output used for rows without a route
+            skip_header: Whether to skip the first row
+
+        Returns:
+            Indices of the rejected rows, counting the header
+        """
+        rows = enumerate(rows)
+        header = None
+        if skip_header:
+            header = next(rows, (0, None))[1]
+
+        runs = {id(run): run for run in chain([default_run], routes.values())}
+        for run in runs.values():
+            if run.rejects is not None:
+                run.rejects.header = list(header or [])
+
+        rejected_rows: Set[int] = set()
+        try:
+            while True:
+                chunk = list(islice(rows, VALIDATION_CHUNK_SIZE))
+                if not chunk:
+                    break
+
+                start = time.perf_counter()
+                run_rows: Dict[int, List[Tuple[int, List[str]]]] = {}
+                for i, row in chunk:
+                    # Skip empty rows
+                    if not row or all(not cell.strip() for cell in row):
+                        continue
+                    run = default_run
+                    if router is not None:
+                        run = routes.get(router.route(row), default_run)
+                    if run.rejects is not None:
+                        run_rows.setdefault(id(run), []).append((i, row))
+
+                for run_id, indexed_rows in run_rows.items():
+                    run = runs[run_id]
+                    reasons = run.data_processor.validate_rows(
+                        [row for _, row in indexed_rows]
+                    )
+                    for (i, row), reason in zip(indexed_rows, reasons):
+                        if reason:
+                            rejected_rows.add(i)
+                            run.rejects.write(i, reason, row)
+                self.stats.record("validation", time.perf_counter() - start)
+        finally:
+            for run in runs.values():
+                if run.rejects is not None:
+                    run.rejects.close()
+
+        for run in runs.values():
+            if run.rejects is not None and run.rejects.count:
+                saved = f"; see {run.rejects.path}" if run.rejects.path else ""
+                logger.warning(
+                    f"Rejected {run.rejects.count} rows for "
+                    f"{run.template_config.name}{saved}"
+                )
+        return rejected_rows
+
+    def _route_rows(
+        self,
+        rows: Iterable[List[str]],
+        router: TemplateRouter,
+        routes: Dict[str, FillRun],
+        default_run: FillRun,
+        skip_header: bool,
+    ) -> Iterator[Tuple[FillRun, Dict[str, str]]]:
+        """
+        Route raw CSV rows to templates and map them with that template's mapping.
+
+        Args:
+            rows: Raw CSV rows
+            router: Router choosing the template of each row
+            routes: Template outputs keyed by routed template name
+            default_run: Output used for rows without a route
+            skip_header: Whether to skip the first row
+
+        Yields:
+            Tuples of (template output, mapped field data)
+        """
+        for i, row in enumerate(rows):
+            if i == 0 and skip_header:
+                continue
+
+            # Skip empty rows
+            if not row or all(not cell.strip() for cell in row):
+                logger.debug(f"Skipping empty row {i}")
+                continue
+
+            run = routes.get(router.route(row), default_run)
+            try:
+                with self.stats.time("row_mapping"):
+                    field_data = run.data_processor.process_row(row, i)
+                if run.output_namer is not None:
+                    field_data[OUTPUT_NAME_FIELD] = run.output_namer.name_row(row)
+            except Exception as e:
+                logger.error(f"Failed to process row {i}: {e}")
+                continue
+            yield run, field_data
+
+    def _load_template_sources(
+        self,
+        template_config: TemplateConfig,
+        template_cache: TemplateCache,
+        data_processor: Optional[DataProcessor] = None,
+    ) -> Dict[str, Any]:
+        """
+        Load a template's field mappings and prime the template cache.
+
+        If the template config points at a compiled bundle, the mappings and
+        the parsed template come from the bundle and neither the YAML nor the
+        template's widgets are parsed. Otherwise the mappings are loaded from
+        YAML and the template is parsed when first requested from the cache.
 
-            for i, field_data in enumerate(processed_data):
+        Args:
+            template_config: Template configuration
+            template_cache: Cache to add the bundled template to
+            data_processor: Processor to load the mappings into; the
+                FormFiller's own processor if None
+
+        Returns:
+            Dictionary containing field mappings
+        """
+        if data_processor is None:
+            data_processor = self.data_processor
+
+        bundle_path = template_config.bundle_path
+        if not bundle_path:
+            # Logged as loaded by the data processor unless already current
+            logger.debug(f"Loading field mappings from {template_config.mapping_path}")
+            return data_processor.load_field_mappings(template_config.mapping_path)
+
+        bundle = self._bundles.get(bundle_path)
+        if bundle is None:
+            logger.info(f"Loading template bundle {bundle_path}")
+            bundle = load_bundle(bundle_path)
+            self._bundles[bundle_path] = bundle
+        template_cache.add(bundle.to_cached_template())
+        return data_processor.set_field_mappings(bundle.field_mappings)
+
+    def _prepare_template(
+        self,
+        template_config: TemplateConfig,
+        template: CachedTemplate,
+        mappings: Dict[str, Any],
+    ) -> PreparedTemplate:
+        """
+        Get a template's fill state, compiling its fill plan if needed.
+
+        Args:
+            template_config: Template configuration
+            template: Current parsed template
+            mappings: Field mappings loaded for the template
+
+        Returns:
+            PreparedTemplate of an earlier run if the template and mappings
+            are unchanged, else a new one
+        """
+        key = (template_config.template_path, template_config.mapping_path)
+        prepared = self._prepared.get(key)
+        if (
+            prepared is None
+            or prepared.digest != template.digest
+            or prepared.mappings is not mappings
+        ):
+            prepared = PreparedTemplate(
+                digest=template.digest,
+                mappings=mappings,
+                fill_plan=compile_fill_plan(template, mappings),
+            )
+            self._prepared[key] = prepared
+        return prepared
+
+    def prepare_template(
+        self,
+        template_config: TemplateConfig,
+        template_cache: Optional[TemplateCache] = None,
+        fill_engine: Optional[str] = None,
+    ) -> None:
+        """
+        Load a template's mappings and compile its fill plan ahead of a run.
+
+        Args:
+            template_config: Template configuration
+            template_cache: Cache to parse the template into; the
+                FormFiller's own cache if None
+            fill_engine: Engine the runs will use; the template's
+                configured engine if None
+        """
+        if template_cache is None:
+            template_cache = self.template_cache
+        mappings = self._load_template_sources(template_config, template_cache)
+        template = template_cache.get(template_config.template_path)
+        prepared = self._prepare_template(template_config, template, mappings)
+        if (fill_engine or template_config.fill_engine) == "fast":
+            prepared.get_fast_template(template)
+
+    def _prepare_row(
+        self, run: FillRun, row_index: int, field_data: Dict[str, str]
+    ) -> Tuple[RowTask, Optional[str]]:
+        """
+        Resolve a row's output path and decide whether it can be reused.
+
+        Args:
+            run: State of the current run
+            row_index: Index of the row among processed rows
+            field_data: Mapped field data for the row; its output name, if
+                any, is removed
+
+        Returns:
+            Tuple of (row task, row hash or None when no manifest is kept)
+        """
+        name = f"{row_index}.pdf"
+        if run.output_namer is not None:
+            name = run.output_namer.name_output(
+                field_data.pop(OUTPUT_NAME_FIELD, None), row_index
+            )
+        output_path = name
+        if run.output_sink is not None:
+            output_path = run.output_sink.path_for(name)
+        if run.manifest is None:
+            return RowTask(row_index, field_data, output_path, template=run.key), None
+
+        row_hash = hash_row(field_data)
+        reuse = run.resume and run.manifest.is_current(
+            output_path, row_hash, run.template_hash
+        )
+        return RowTask(row_index, field_data, output_path, reuse, run.key), row_hash
+
+    def _fill_rows_serial(
+        self,
+        routed_rows: Iterable[Tuple[FillRun, Dict[str, str]]],
+        dry_run: bool,
+        io_threads: int = 0,
+        output_sink: Optional[OutputSink] = None,
+    ) -> Tuple[int, int]:
+        """
+        Fill rows one after another in the current process.
+
+        Args:
+            routed_rows: Template output and mapped field data for each row,
+                in order
+            dry_run: If True, only log what would be filled
+            io_threads: Number of threads writing individual PDFs while the
+                next rows are filled; 0 saves each PDF before moving on
+            output_sink: Sink the I/O threads write individual PDFs to
+
+        Returns:
+            Tuple of (rows processed, rows that failed to fill)
+        """
+        total_rows = 0
+        failed_count = 0
+
+        writer = None
+        if output_sink is not None and io_threads > 0 and not dry_run:
+            writer = WriteBehindWriter(io_threads, write=output_sink.write)
+        # Rows whose individual PDF is still being written, by output path
+        writing: Dict[str, Tuple[FillRun, int, Optional[str]]] = {}
+        # Templates whose rows are filled in batches
+        batched_runs: Dict[int, FillRun] = {}
+
+        try:
+            for i, (run, field_data) in enumerate(routed_rows):
+                total_rows += 1
+                run.row_count += 1
                 try:
                     if dry_run:
                         logger.info(
-                            f"[DRY RUN] Would process row {i + 1} with {len(field_data)} fields"
+                            f"[DRY RUN] Would process row {i + 1} with "
+                            f"{len(field_data)} fields"
                         )
                         self._filled_count += 1
+                        run.filled_count += 1
+                        continue
+
+                    if run.batch_size > 1:
+                        # Filled once the batch is full; no individual PDF
+                        run.batch_rows.append((i, field_data))
+                        batched_runs[id(run)] = run
+                        if len(run.batch_rows) >= run.batch_size:
+                            failed_count += self._fill_batch(run)
                         continue
 
                     # Generate individual PDF
-                    output_path = self.config.get_output_path(f"{i}.pdf")
+                    task, row_hash = self._prepare_row(run, i, field_data)
+
+                    if task.reuse:
+                        logger.debug(
+                            f"Reusing unchanged row {i + 1}: {task.output_path}"
+                        )
+                        if run.combined_doc is not None:
+                            append_filled_form(
+                                task.output_path,
+                                run.combined_doc,
+                                flatten=run.flatten_combined,
+                                stats=self.stats,
+                            )
+                        run.reused_count += 1
+                        continue
 
-                    logger.debug(f"Filling form for row {i + 1}, output: {output_path}")
+                    logger.debug(
+                        f"Filling form for row {i + 1}, output: {task.output_path}"
+                    )
                     fill_form(
-                        pdf_path=template_config.template_path,
+                        pdf_path=run.template_config.template_path,
                         field_data=field_data,
-                        output_pdf_path=output_path,
-                        new_doc=combined_doc,
+                        output_pdf_path=task.output_path,
+                        new_doc=run.combined_doc,
+                        template_cache=run.template_cache,
+                        fill_plan=run.fill_plan,
+                        flatten=run.flatten_combined,
+                        keep_individual=run.keep_individual,
+                        stats=self.stats,
+                        fast_template=run.fast_template,
+                        writer=writer,
+                        render_cache=run.render_cache,
                     )
                     self._filled_count += 1
+                    run.filled_count += 1
+
+                    if writer is not None:
+                        # Recorded once the write-behind threads have saved it
+                        writing[task.output_path] = (run, i, row_hash)
+                        failed_count += self._record_writes(writer.completed(), writing)
+                    elif run.manifest is not None:
+                        run.manifest.record(
+                            task.output_path, row_hash, run.template_hash
+                        )
 
                 except Exception as e:
                     logger.error(f"Failed to process row {i + 1}: {e}")
                     failed_count += 1
+                    run.failed_count += 1
                     continue
 
-            # Save combined PDF if created
-            if combined_doc and not dry_run:
-                combined_output_path = self.config.get_big_output_path(
-                    template_config.output_prefix
+                finally:
+                    if run.progress is not None:
+                        run.progress(total_rows)
+
+            # Fill the rows left in each template's last batch
+            for run in batched_runs.values():
+                failed_count += self._fill_batch(run)
+        finally:
+            # Record the rows written so far, even if the run is interrupted
+            if writer is not None:
+                failed_count += self._record_writes(writer.close(), writing)
+
+        return total_rows, failed_count
+
+    def _fill_batch(self, run: FillRun) -> int:
+        """
+        Fill the rows waiting for a template's batch into its combined PDF.
+
+        Args:
+            run: State of the template's output
+
+        Returns:
+            Number of rows that failed to fill
+        """
+        rows, run.batch_rows = run.batch_rows, []
+        if not rows:
+            return 0
+
+        if run.batch_template is None and len(rows) >= run.batch_size:
+            # Copies are made once a batch is full, so runs shorter than a
+            # batch never pay for them
+            run.batch_template = run.prepared.get_batch_template(
+                run.template_cache.get(run.template_config.template_path),
+                run.fast_template,
+                run.batch_size,
+            )
+            if run.batch_template is None:
+                run.batch_size = 0
+        if run.batch_template is None:
+            # Too few rows to be worth copying the pages for, or a template
+            # that cannot be batched
+            return self._fill_rows_singly(run, rows)
+
+        logger.debug(
+            f"Filling rows {rows[0][0] + 1} to {rows[-1][0] + 1} in one document"
+        )
+        errors = fill_form_batch(
+            run.batch_template,
+            [field_data for _, field_data in rows],
+            run.combined_doc,
+            flatten=run.flatten_combined,
+            stats=self.stats,
+            render_cache=run.render_cache,
+        )
+        failed_count = 0
+        for (row_index, _), error in zip(rows, errors):
+            if error is None:
+                self._filled_count += 1
+                run.filled_count += 1
+                continue
+            logger.error(f"Failed to process row {row_index + 1}: {error}")
+            failed_count += 1
+            run.failed_count += 1
+        return failed_count
+
+    def _fill_rows_singly(
+        self, run: FillRun, rows: List[Tuple[int, Dict[str, str]]]
+    ) -> int:
+        """
+        Fill rows held for a batch into the combined PDF one at a time.
+
+        Args:
+            run: State of the template's output
+            rows: Index and mapped field data of each row
+
+        Returns:
+            Number of rows that failed to fill
+        """
+        failed_count = 0
+        for row_index, field_data in rows:
+            try:
+                fill_form(
+                    pdf_path=run.template_config.template_path,
+                    field_data=field_data,
+                    output_pdf_path=None,
+                    new_doc=run.combined_doc,
+                    template_cache=run.template_cache,
+                    fill_plan=run.fill_plan,
+                    flatten=run.flatten_combined,
+                    stats=self.stats,
+                    fast_template=run.fast_template,
+                    render_cache=run.render_cache,
                 )
-                logger.info(f"Saving combined PDF to {combined_output_path}")
-                combined_doc.save(combined_output_path)
-                combined_doc.close()
+                self._filled_count += 1
+                run.filled_count += 1
+            except Exception as e:
+                logger.error(f"Failed to process row {row_index + 1}: {e}")
+                failed_count += 1
+                run.failed_count += 1
+        return failed_count
 
-            # Return processing results
-            results = {
-                "total_rows": len(processed_data),
-                "successful_fills": self._filled_count,
-                "failed_fills": failed_count,
-                "template_used": template_config.name,
-                "dry_run": dry_run,
-                "mapping_summary": self.data_processor.get_mapping_summary(),
-            }
+    def _record_writes(
+        self,
+        finished: List[FinishedWrite],
+        writing: Dict[str, Tuple[FillRun, int, Optional[str]]],
+    ) -> int:
+        """
+        Record individual PDFs the write-behind threads finished writing.
 
-            if generate_combined_pdf and not dry_run:
-                results["combined_pdf_path"] = combined_output_path
+        Written rows are recorded in the manifest. Rows whose write failed
+        no longer count as filled.
 
-            logger.info(
-                f"Processing completed: {self._filled_count} successful, {failed_count} failed"
+        Args:
+            finished: (output path, error or None) of each finished write
+            writing: Template output, row index and row hash of each row
+                being written, by output path; finished rows are removed
+
+        Returns:
+            Number of rows whose write failed
+        """
+        failed_count = 0
+        for output_path, error in finished:
+            if output_path not in writing:
+                # The row failed after its PDF was queued; it is already counted
+                continue
+            run, row_index, row_hash = writing.pop(output_path)
+            if error is None:
+                if run.manifest is not None:
+                    run.manifest.record(output_path, row_hash, run.template_hash)
+                continue
+
+            logger.error(f"Failed to write row {row_index + 1}: {error}")
+            failed_count += 1
+            self._filled_count -= 1
+            run.filled_count -= 1
+            run.failed_count += 1
+        return failed_count
+
+    def _get_chunk_size(self, runs: List[FillRun]) -> int:
+        """
+        Get the number of rows sent to a worker at once.
+
+        Args:
+            runs: Every template output rows can be routed to
+
+        Returns:
+            DEFAULT_CHUNK_SIZE, or fewer rows if a chunk's pages would
+            exceed a part file of the combined PDF
+        """
+        combined_doc = runs[0].combined_doc
+        if combined_doc is None or not combined_doc.shard_size:
+            return DEFAULT_CHUNK_SIZE
+        pages_per_row = max(
+            run.template_cache.get(run.template_config.template_path).page_count
+            for run in runs
+        )
+        return max(1, combined_doc.shard_size // pages_per_row)
+
+    def _limit_workers(
+        self,
+        routed_rows: Iterator[Tuple[FillRun, Dict[str, str]]],
+        runs: List[FillRun],
+        workers: int,
+    ) -> Tuple[Iterator[Tuple[FillRun, Dict[str, str]]], int]:
+        """
+        Cap the number of workers at the number of chunks a run fills.
+
+        Starting a worker and sending it the templates costs more than
+        filling a few rows, so only the rows needed to give every worker a
+        chunk are read ahead; a run with fewer rows gets fewer workers.
+
+        Args:
+            routed_rows: Template output and mapped field data for each row,
+                in order
+            runs: Every template output rows can be routed to
+            workers: Number of worker processes requested
+
+        Returns:
+            Tuple of (the same rows, number of workers to fill them with);
+            1 if the rows fit in a single chunk
+        """
+        chunk_size = self._get_chunk_size(runs)
+        head = list(islice(routed_rows, workers * chunk_size))
+        if len(head) < workers * chunk_size:
+            # Rows are chunked per template
+            rows_per_run = Counter(run.key for run, _ in head)
+            chunks = sum(math.ceil(rows / chunk_size) for rows in rows_per_run.values())
+            if chunks < workers:
+                logger.debug(f"{len(head)} rows fill {chunks} chunks")
+                workers = chunks
+        return chain(head, routed_rows), workers
+
+    def _fill_rows_parallel(
+        self,
+        routed_rows: Iterable[Tuple[FillRun, Dict[str, str]]],
+        runs: List[FillRun],
+        workers: int,
+        io_threads: int = 0,
+        output_sink: Optional[OutputSink] = None,
+        worker_pool: Optional[WorkerPool] = None,
+    ) -> Tuple[int, int]:
+        """
+        Fill rows across a process pool, preserving row order per template.
+
+        Each worker is set up once with every template and the fill plans
+        compiled here, then fills chunks of rows that share a template. With combined
+        output, each worker also writes the pages of its chunk to a part
+        file, and the parts are added to their template's combined PDF in
+        row order; with a shard size, a chunk has at most that many pages.
+        Individual PDFs bound for an archive are sent back with the chunk's
+        results and written in row order by the parent.
+
+        Args:
+            routed_rows: Template output and mapped field data for each row,
+                in order
+            runs: Every template output rows can be routed to
+            workers: Number of worker processes; with a warm pool, the
+                number of its workers given chunks at once
+            io_threads: Number of threads each worker writes individual PDFs
+                with while it fills the next rows of its chunk
+            output_sink: Sink of the individual PDFs; archive sinks are
+                written by the parent
+            worker_pool: Pool kept warm across runs to fill the rows with;
+                if None, a pool is started for the run and stopped after it
+
+        Returns:
+            Tuple of (rows processed, rows that failed to fill)
+        """
+        runs_by_key = {run.key: run for run in runs}
+        first_run = runs[0]
+
+        chunk_size = self._get_chunk_size(runs)
+        logger.info(f"Filling rows with {workers} workers in chunks of {chunk_size}")
+
+        # Output path and hash of rows in flight, recorded once they are filled
+        in_flight: Dict[int, Tuple[str, Optional[str]]] = {}
+
+        def tasks():
+            for i, (run, field_data) in enumerate(routed_rows):
+                task, row_hash = self._prepare_row(run, i, field_data)
+                in_flight[i] = (task.output_path, row_hash)
+                yield task
+
+        def chunk_tasks():
+            for rows in chunk_rows_by_template(tasks(), chunk_size):
+                combined_doc = runs_by_key[rows[0].template].combined_doc
+                part_path = combined_doc.new_part_path() if combined_doc else None
+                yield ChunkTask(rows, part_path)
+
+        # Workers write straight to a directory; archives are written here
+        writer = None
+        if output_sink is not None and not output_sink.concurrent:
+            writer = WriteBehindWriter(io_threads, write=output_sink.write)
+            io_threads = 0
+        # Rows whose individual PDF is still being written, by output path
+        writing: Dict[str, Tuple[FillRun, int, Optional[str]]] = {}
+
+        worker_templates = {
+            run.key: WorkerTemplate(
+                run.template_config.template_path,
+                run.fill_plan,
+                run.template_cache.get(run.template_config.template_path),
+                run.fast_template,
+                min(run.batch_size, chunk_size),
+                run.render_cache.empty_copy(),
             )
-            return results
+            for run in runs
+        }
 
-        except Exception as e:
-            if isinstance(e, FormFillerError):
-                raise
-            raise FormFillerError(f"Form processing failed: {e}")
+        # A warm pool is kept for later runs; a pool of its own is stopped
+        if worker_pool is not None:
+            executor, run_id = worker_pool.start_run(worker_templates, io_threads)
+        else:
+            executor, run_id = start_pool(workers, worker_templates, io_threads), 0
+        fill = partial(
+            fill_chunk,
+            flatten=first_run.flatten_combined,
+            keep_individual=first_run.keep_individual,
+            return_individual=writer is not None,
+            run_id=run_id,
+        )
+
+        total_rows = 0
+        failed_count = 0
+        try:
+            for result in imap_ordered(executor, fill, chunk_tasks(), workers * 2):
+                run = runs_by_key[result.template]
+                handled = (
+                    len(result.filled_rows)
+                    + len(result.reused_rows)
+                    + len(result.errors)
+                )
+                total_rows += handled
+                run.row_count += handled
+                self._filled_count += len(result.filled_rows)
+                run.filled_count += len(result.filled_rows)
+                run.reused_count += len(result.reused_rows)
+                run.template_cache.merge_stats(result.cache_hits, result.cache_misses)
+                if run.render_cache is not None:
+                    run.render_cache.merge_counts(result.render_counts)
+                self.stats.merge(result.stats)
+
+                individual_pdfs = dict(result.individual_pdfs)
+                for row_index in result.filled_rows:
+                    output_path, row_hash = in_flight.pop(row_index)
+                    if writer is not None:
+                        writer.submit(output_path, individual_pdfs[output_path])
+                        writing[output_path] = (run, row_index, row_hash)
+                    elif run.manifest is not None:
+                        run.manifest.record(output_path, row_hash, run.template_hash)
+                if writer is not None:
+                    failed_count += self._record_writes(writer.completed(), writing)
+
+                for row_index in result.reused_rows:
+                    in_flight.pop(row_index)
+
+                for row_index, error in result.errors:
+                    in_flight.pop(row_index)
+                    logger.error(f"Failed to process row {row_index + 1}: {error}")
+                    failed_count += 1
+                    run.failed_count += 1
+
+                if result.part_path is not None:
+                    run.combined_doc.add_part(result.part_path, result.page_count)
+
+                if run.progress is not None:
+                    run.progress(total_rows)
+        except BaseException:
+            # Do not leave this run's tasks queued in a warm pool
+            if worker_pool is not None:
+                worker_pool.shutdown()
+            raise
+        finally:
+            if worker_pool is None:
+                executor.shutdown()
+            if writer is not None:
+                failed_count += self._record_writes(writer.close(), writing)
+
+        return total_rows, failed_count
 
     def validate_template(self, template_config: TemplateConfig) -> dict:
         """
@@ -171,10 +1401,14 @@ class FormFiller:
                     f"Mapping file not found: {template_config.mapping_path}"
                 )
 
-            # Try to load and validate mapping file
+            # Try to load and validate mapping file; process_forms() reuses
+            # the loaded mappings and parsed template instead of loading them
+            # again
+            if template_config.bundle_path:
+                results["bundle_path"] = template_config.bundle_path
             try:
-                mappings = self.data_processor.load_field_mappings(
-                    template_config.mapping_path
+                mappings = self._load_template_sources(
+                    template_config, self.template_cache
                 )
                 results["mapping_fields_count"] = len(mappings)
                 results["mapping_valid"] = True
@@ -183,10 +1417,9 @@ class FormFiller:
 
             # Try to open and validate template PDF
             try:
-                doc = fitz.open(template_config.template_path)
-                results["template_pages"] = len(doc)
+                template = self.template_cache.get(template_config.template_path)
+                results["template_pages"] = template.page_count
                 results["template_valid"] = True
-                doc.close()
             except Exception as e:
                 raise TemplateError(f"Invalid template PDF: {e}")
 
@@ -207,10 +1440,15 @@ class FormFiller:
         return {
             "filled_count": self._filled_count,
             "data_processor_stats": self.data_processor.get_mapping_summary(),
+            "processing_stats": self.stats.summary(),
         }
 
     def reset(self) -> None:
         """Reset processing statistics and clear loaded data."""
         self._filled_count = 0
         self.data_processor = DataProcessor()
+        self.stats = ProcessingStats()
+        self.template_cache.clear()
+        self._bundles.clear()
+        self._prepared.clear()
         logger.info("FormFiller reset completed")
@@ -4,33 +4,188 @@ FormFiller - Fill PDF forms with data from CSV files.
 Refactored main module using modular architecture with proper separation of concerns.
 """
 
+import time
+
+_STARTUP_START = time.perf_counter()
+
+import argparse
 import logging
+import multiprocessing
 import sys
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
+from typing import Iterator, List, Tuple
 
+# Only lightweight modules are imported here; fitz, yaml and asyncio are
+# imported when a command actually needs them so that --help, argument
+# errors and missing input files return quickly
 from cli import CLI
 from config import FormFillerConfig
 from exceptions import FormFillerError
-from form_filler import FormFiller
+
+# (phase, seconds) pairs reported by --profile-startup
+_startup_phases: List[Tuple[str, float]] = [
+    ("main imports", time.perf_counter() - _STARTUP_START)
+]
+
+
+@contextmanager
+def startup_phase(name: str) -> Iterator[None]:
+    """
+    Time a startup phase for --profile-startup.
+
+    Args:
+        name: Phase name
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _startup_phases.append((name, time.perf_counter() - start))
 
 
-def setup_logging(verbose: bool = False) -> None:
+def format_startup_profile() -> str:
+    """
+    Format the recorded startup phases.
+
+    Returns:
+        Multi-line string with one line per phase and the total
+    """
+    lines = ["Startup profile:"]
+    for name, seconds in _startup_phases:
+        lines.append(f"  {name:<28}{seconds * 1000:>9.1f} ms")
+    total = sum(seconds for _, seconds in _startup_phases)
+    lines.append(f"  {'total':<28}{total * 1000:>9.1f} ms")
+    lines.append("Run with python -X importtime for a per-module breakdown.")
+    return "\n".join(lines)
+
+
+def setup_logging(verbose: bool = False) -> QueueListener:
     """
     Set up logging configuration.
 
+    Records are put on a queue and written to stdout by a listener thread,
+    so the fill loop never blocks on console I/O. Worker processes forward
+    their records to the same queue.
+
     Args:
         verbose: Whether to enable verbose logging
+
+    Returns:
+        The started listener; stop it before exiting to flush pending records
     """
     level = logging.DEBUG if verbose else logging.INFO
     format_str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(format_str))
+
+    log_queue = multiprocessing.Queue()
+    listener = QueueListener(log_queue, stream_handler)
+    listener.start()
+
+    # The queue handler only merges args into the message; the listener's
+    # handler applies the full format
     logging.basicConfig(
         level=level,
-        format=format_str,
+        format="%(message)s",
         handlers=[
-            logging.StreamHandler(sys.stdout),
+            QueueHandler(log_queue),
         ],
     )
+    return listener
+
+
+def serve(args: argparse.Namespace, config: FormFillerConfig) -> int:
+    """
+    Run the job service until interrupted.
+
+    Args:
+        args: Parsed arguments of the serve command
+        config: Configuration with the default output directory applied
+
+    Returns:
+        Exit code
+    """
+    import asyncio
+
+    from service import FillService
+
+    service = FillService(config=config)
+    asyncio.run(service.serve(socket_path=args.socket, host=args.host, port=args.port))
+    return 0
+
+
+def compile_templates(args: argparse.Namespace, config: FormFillerConfig) -> int:
+    """
+    Compile template bundles.
+
+    Args:
+        args: Parsed arguments of the compile command
+        config: Configuration providing template and bundle paths
+
+    Returns:
+        Exit code
+    """
+    from bundle import compile_bundle
+
+    for template_name in args.templates:
+        template_config = config.get_template_config(template_name)
+        bundle_path = compile_bundle(
+            template_config, config.get_bundle_path(template_name)
+        )
+        print(f"Compiled {template_config.name}: {bundle_path}")
+    return 0
+
+
+def proof_forms(args: argparse.Namespace, config: FormFillerConfig) -> int:
+    """
+    Render filled forms to PNG files for review.
+
+    Args:
+        args: Parsed arguments of the proof command
+        config: Configuration the arguments were validated against
+
+    Returns:
+        Exit code; 1 if any form could not be rendered
+    """
+    from proof import ProofSettings, generate_proofs
+    from template_cache import TemplateCache
+
+    pages_per_form = 1
+    template_fields = []
+    if args.template_config is not None:
+        template = TemplateCache().get(args.template_config.template_path)
+        pages_per_form = template.page_count
+        template_fields = [
+            (widget.page, widget.field_name, widget.rect) for widget in template.widgets
+        ]
+
+    settings = ProofSettings(
+        output_dir=args.output_dir,
+        dpi=args.dpi,
+        field_names=args.field_names,
+        template_fields=template_fields,
+        columns=args.columns if args.contact_sheet else 0,
+        rows=args.rows,
+    )
+    results = generate_proofs(
+        args.sources,
+        settings,
+        pages_per_form=pages_per_form,
+        sample=args.sample,
+        workers=args.workers,
+    )
+
+    print(
+        f"Rendered {results['pages']} pages of {results['forms']} forms to "
+        f"{results['outputs']} files in {results['output_dir']} "
+        f"({results['processing_time']:.2f}s)"
+    )
+    for name, error in results["errors"]:
+        print(f"Failed to render {name}: {error}")
+    return 1 if results["errors"] else 0
 
 
 def main() -> int:
@@ -40,23 +195,48 @@ def main() -> int:
     Returns:
         Exit code (0 for success, non-zero for failure)
     """
-    cli = CLI()
+    with startup_phase("CLI setup"):
+        cli = CLI()
+    listener = None
+    profile_startup = False
 
     try:
         # Parse and validate command-line arguments
-        args = cli.parse_args()
+        with startup_phase("argument parsing"):
+            args = cli.parse_args()
+        profile_startup = getattr(args, "profile_startup", False)
 
         # Setup logging
-        setup_logging(verbose=args.verbose)
+        with startup_phase("logging setup"):
+            listener = setup_logging(verbose=args.verbose)
         logger = logging.getLogger(__name__)
 
         logger.info("FormFiller application started")
 
         # Validate arguments
-        cli.validate_args(args)
+        with startup_phase("argument validation"):
+            cli.validate_args(args)
+
+        if args.command == "serve":
+            return serve(args, cli.config)
+
+        if args.command == "compile":
+            return compile_templates(args, cli.config)
+
+        if args.command == "proof":
+            return proof_forms(args, cli.config)
+
+        # Load the fill engine (PyMuPDF, PyYAML) only once a fill will run
+        with startup_phase("fill engine imports"):
+            from form_filler import FormFiller
+
+        if profile_startup:
+            print(format_startup_profile(), file=sys.stderr)
 
         # Initialize FormFiller with configuration
         config = FormFillerConfig(base_path=str(Path.cwd()))
+        config.output_sink = args.output_sink
+        config.output_name_template = args.output_name
         form_filler = FormFiller(config=config)
 
         # Validate template before processing
@@ -72,6 +252,19 @@ def main() -> int:
             skip_header=args.skip_header,
             dry_run=args.dry_run,
             generate_combined_pdf=True,
+            workers=args.workers,
+            io_threads=args.io_threads,
+            combined_shard_size=args.combined_shard_size,
+            merge_combined_shards=not args.keep_shards,
+            flatten_combined=not args.keep_fields,
+            projection_batch_size=args.pandas_chunk_size,
+            csv_format=args.csv_format,
+            resume=args.resume,
+            force=args.force,
+            router=args.router,
+            fill_engine=args.fill_engine,
+            batch_size=args.batch_size,
+            form_cache_size=args.form_cache_size,
         )
 
         # Print results
@@ -83,9 +276,43 @@ def main() -> int:
         if results["failed_fills"] > 0:
             print(f"Failed fills: {results['failed_fills']}")
 
+        if results["reused_rows"] > 0:
+            print(f"Unchanged rows reused: {results['reused_rows']}")
+
+        if results["rejected_rows"] > 0:
+            print(f"Rows rejected by validation: {results['rejected_rows']}")
+
+        if "rejects_path" in results:
+            print(f"Rejected rows saved to: {results['rejects_path']}")
+
         if "combined_pdf_path" in results:
             print(f"Combined PDF saved to: {results['combined_pdf_path']}")
 
+        if "combined_pdf_parts" in results:
+            print(f"Combined PDF saved as {len(results['combined_pdf_parts'])} parts:")
+            for part_path in results["combined_pdf_parts"]:
+                print(f"  {part_path}")
+
+        if "individual_output" in results:
+            print(f"Individual PDFs saved to: {results['individual_output']}")
+
+        for template_name, template_results in results.get("templates", {}).items():
+            print(
+                f"{template_name}: {template_results['successful_fills']} filled, "
+                f"{template_results['failed_fills']} failed"
+            )
+            if "combined_pdf_path" in template_results:
+                print(
+                    f"  Combined PDF saved to: {template_results['combined_pdf_path']}"
+                )
+            for part_path in template_results.get("combined_pdf_parts", []):
+                print(f"  {part_path}")
+            if "rejects_path" in template_results:
+                print(
+                    f"  {template_results['rejected_rows']} rejected rows saved to: "
+                    f"{template_results['rejects_path']}"
+                )
+
         # Print mapping statistics
         mapping_stats = results["mapping_summary"]
         print("\\nMapping statistics:")
@@ -93,6 +320,25 @@ def main() -> int:
         print(f"  Total fields: {mapping_stats['total_fields']}")
         print(f"  Multi-column fields: {mapping_stats['multi_column_fields']}")
 
+        cache_stats = results["template_cache"]
+        print(
+            f"Template cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses"
+        )
+        for name, render_stats in results["render_cache"].items():
+            print(
+                f"Render cache ({name}): {render_stats['hits']} hits, "
+                f"{render_stats['misses']} misses "
+                f"({render_stats['hit_rate']:.0%} hit rate)"
+            )
+
+        if args.stats:
+            print("\\nProcessing statistics:")
+            print(form_filler.stats.format_table())
+
+        if args.metrics_file:
+            form_filler.stats.write_json(args.metrics_file)
+            print(f"Metrics written to: {args.metrics_file}")
+
         if args.dry_run:
             print("\\n[DRY RUN] No actual PDF files were generated.")
 
@@ -109,6 +355,9 @@ def main() -> int:
         print(f"Unexpected error: {e}", file=sys.stderr)
         logging.getLogger(__name__).exception("Unexpected error occurred")
         return 2
+    finally:
+        if listener is not None:
+            listener.stop()
 
 
 if __name__ == "__main__":
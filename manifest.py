@@ -0,0 +1,107 @@
+"""Per-row manifest of generated PDFs for resumable FormFiller runs."""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+def hash_row(field_data: Dict[str, str]) -> str:
+    """
+    Hash the mapped field data of a row.
+
+    Args:
+        field_data: Dictionary mapping PDF field names to values
+
+    Returns:
+        Hex digest that changes whenever any field value changes
+    """
+    payload = json.dumps(field_data, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RunManifest:
+    """
+    SQLite manifest recording which row produced each individual PDF.
+
+    Each entry stores the output path, a hash of the row's mapped field
+    data and a hash of the template it was filled with. A row whose hashes
+    match its entry, and whose output file still exists, does not need to
+    be filled again.
+    """
+
+    COMMIT_INTERVAL = 1000
+
+    def __init__(self, db_path: str):
+        """
+        Open or create the manifest database.
+
+        Args:
+            db_path: Path to the SQLite manifest file
+        """
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rows ("
+            "output_path TEXT PRIMARY KEY, "
+            "row_hash TEXT NOT NULL, "
+            "template_hash TEXT NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+        self._pending = 0
+
+    def is_current(self, output_path: str, row_hash: str, template_hash: str) -> bool:
+        """
+        Check whether an output file is up to date for a row.
+
+        Args:
+            output_path: Path of the individual output PDF
+            row_hash: Hash of the row's mapped field data
+            template_hash: Hash of the template in use
+
+        Returns:
+            True if the recorded hashes match and the output file exists
+        """
+        entry = self._conn.execute(
+            "SELECT row_hash, template_hash FROM rows WHERE output_path = ?",
+            (output_path,),
+        ).fetchone()
+        return entry == (row_hash, template_hash) and os.path.exists(output_path)
+
+    def record(self, output_path: str, row_hash: str, template_hash: str) -> None:
+        """
+        Record that an output file was generated for a row.
+
+        Args:
+            output_path: Path of the individual output PDF
+            row_hash: Hash of the row's mapped field data
+            template_hash: Hash of the template used
+        """
+        self._conn.execute(
+            "INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?)",
+            (output_path, row_hash, template_hash, time.time()),
+        )
+        self._pending += 1
+        if self._pending >= self.COMMIT_INTERVAL:
+            self.commit()
+
+    def clear(self) -> None:
+        """Remove every entry so that all rows are filled again."""
+        self._conn.execute("DELETE FROM rows")
+        self.commit()
+        logger.info(f"Cleared manifest {self.db_path}")
+
+    def commit(self) -> None:
+        """Persist recorded entries."""
+        self._conn.commit()
+        self._pending = 0
+
+    def close(self) -> None:
+        """Commit outstanding entries and close the database."""
+        self.commit()
+        self._conn.close()
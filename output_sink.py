@@ -0,0 +1,321 @@
+"""Destinations for individual output PDFs of FormFiller application."""
+
+import csv
+import io
+import logging
+import os
+import re
+import string
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence, Set
+
+from exceptions import ConfigurationError
+from output_writer import write_file
+
+logger = logging.getLogger(__name__)
+
+# Output sinks individual PDFs can be written to
+OUTPUT_SINKS = ("directory", "zip", "tar", "indexed")
+
+# One file per PDF; the only sink later runs can reuse outputs from
+DEFAULT_OUTPUT_SINK = "directory"
+
+# Name of the individual outputs in the outputs folder, without extension
+INDIVIDUAL_OUTPUT_NAME = "individual"
+
+# Field of mapped row data holding the row's output name; never a PDF field
+OUTPUT_NAME_FIELD = "__output_name__"
+
+# Placeholder of the row index in output names
+ROW_PLACEHOLDER = "{row}"
+
+UNSAFE_NAME_CHARACTERS = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+class OutputSink:
+    """
+    Where individual PDFs are written.
+
+    Each PDF has a name such as "17.pdf"; path_for() turns it into the
+    output path used by the fill, and write() stores the PDF's bytes under
+    that path. Archive sinks are appended to in the order PDFs are written,
+    so they are written from one thread.
+    """
+
+    # Whether several threads and processes may write at the same time
+    concurrent = False
+
+    def __init__(self, location: str):
+        """
+        Initialize the sink.
+
+        Args:
+            location: Directory or file the PDFs are written to
+        """
+        self.location = location
+
+    def path_for(self, name: str) -> str:
+        """
+        Get the output path of a PDF.
+
+        Args:
+            name: File name of the PDF
+
+        Returns:
+            Path passed to write(); the member name for archive sinks
+        """
+        return name
+
+    def write(self, path: str, data: bytes) -> None:
+        """
+        Store one PDF.
+
+        Args:
+            path: Output path from path_for()
+            data: PDF bytes
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Finish the output; archive sinks write their index here."""
+
+
+class DirectorySink(OutputSink):
+    """One file per PDF in a directory, the default."""
+
+    concurrent = True
+
+    def __init__(self, location: str):
+        """
+        Create the directory once, up front.
+
+        Args:
+            location: Directory the PDFs are written to
+        """
+        super().__init__(location)
+        os.makedirs(location, exist_ok=True)
+
+    def path_for(self, name: str) -> str:
+        """Get the file path of a PDF in the directory."""
+        return os.path.join(self.location, name)
+
+    def write(self, path: str, data: bytes) -> None:
+        """Write one PDF file."""
+        write_file(path, data)
+
+
+class ZipSink(OutputSink):
+    """
+    Uncompressed ZIP archive of the PDFs.
+
+    PDF content streams are already deflated, so members are stored as
+    they are; the archive is streamed to disk as PDFs are added.
+    """
+
+    def __init__(self, location: str):
+        """
+        Open the archive for writing.
+
+        Args:
+            location: Path of the ZIP file
+        """
+        import zipfile
+
+        super().__init__(location)
+        self._zip_info = zipfile.ZipInfo
+        self._archive = zipfile.ZipFile(location, "w", zipfile.ZIP_STORED)
+
+    def write(self, path: str, data: bytes) -> None:
+        """Add one PDF to the archive."""
+        info = self._zip_info(path, time.localtime()[:6])
+        self._archive.writestr(info, data)
+
+    def close(self) -> None:
+        """Write the archive's central directory."""
+        self._archive.close()
+
+
+class TarSink(OutputSink):
+    """Uncompressed TAR archive of the PDFs, streamed to disk."""
+
+    def __init__(self, location: str):
+        """
+        Open the archive for writing.
+
+        Args:
+            location: Path of the TAR file
+        """
+        import tarfile
+
+        super().__init__(location)
+        self._tar_info = tarfile.TarInfo
+        self._archive = tarfile.open(location, "w")
+
+    def write(self, path: str, data: bytes) -> None:
+        """Add one PDF to the archive."""
+        info = self._tar_info(path)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self._archive.addfile(info, io.BytesIO(data))
+
+    def close(self) -> None:
+        """Write the end-of-archive blocks."""
+        self._archive.close()
+
+
+class IndexedFileSink(OutputSink):
+    """
+    All PDFs back to back in one file, with an index of their offsets.
+
+    The index is a CSV file next to the data file with the name, byte
+    offset and size of each PDF, so any PDF can be read with one seek.
+    """
+
+    def __init__(self, location: str):
+        """
+        Open the data and index files for writing.
+
+        Args:
+            location: Path of the data file; the index is written to the
+                same path with the extension .index.csv
+        """
+        super().__init__(location)
+        self.index_path = str(Path(location).with_suffix(".index.csv"))
+        self._data = open(location, "wb")
+        self._index_file = open(self.index_path, "w", encoding="utf-8", newline="")
+        self._index = csv.writer(self._index_file)
+        self._index.writerow(["name", "offset", "size"])
+        self._offset = 0
+
+    def write(self, path: str, data: bytes) -> None:
+        """Append one PDF and its index entry."""
+        self._data.write(data)
+        self._index.writerow([path, self._offset, len(data)])
+        self._offset += len(data)
+
+    def close(self) -> None:
+        """Close the data and index files."""
+        self._data.close()
+        self._index_file.close()
+
+
+SINK_CLASSES = {
+    "directory": (DirectorySink, ""),
+    "zip": (ZipSink, ".zip"),
+    "tar": (TarSink, ".tar"),
+    "indexed": (IndexedFileSink, ".pdfs"),
+}
+
+
+def open_output_sink(kind: str, outputs_folder: str) -> OutputSink:
+    """
+    Open the sink for a run's individual PDFs.
+
+    Args:
+        kind: One of OUTPUT_SINKS
+        outputs_folder: Folder holding the run's outputs
+
+    Returns:
+        Sink writing to outputs_folder/individual, with the extension of
+        the sink kind
+
+    Raises:
+        ConfigurationError: If the kind is unknown
+    """
+    if kind not in SINK_CLASSES:
+        raise ConfigurationError(
+            f"Unknown output sink: {kind} (choose from {', '.join(OUTPUT_SINKS)})"
+        )
+    sink_class, extension = SINK_CLASSES[kind]
+    os.makedirs(outputs_folder, exist_ok=True)
+    return sink_class(
+        os.path.join(outputs_folder, f"{INDIVIDUAL_OUTPUT_NAME}{extension}")
+    )
+
+
+class OutputNamer:
+    """
+    Output file names built from CSV columns.
+
+    A name template such as "{9}_{row}" is filled with the row's CSV
+    values by column index, and {row} with the row's index among the
+    filled rows. Values are reduced to letters, digits, dots, dashes and
+    underscores. A name already taken by an earlier row gets the row index
+    appended, so every row keeps its own output.
+    """
+
+    def __init__(self, template: str):
+        """
+        Compile a name template.
+
+        Args:
+            template: Name template, without the .pdf extension
+
+        Raises:
+            ConfigurationError: If the template uses anything but column
+                indices and {row}
+        """
+        self.template = template
+        self._columns: List[int] = []
+        try:
+            fields = [
+                (field, spec, conversion)
+                for _, field, spec, conversion in string.Formatter().parse(template)
+                if field is not None
+            ]
+        except ValueError as e:
+            raise ConfigurationError(f"Invalid output name template {template!r}: {e}")
+        for field, spec, conversion in fields:
+            if spec or conversion:
+                raise ConfigurationError(
+                    f"Output name template {template!r} cannot use format "
+                    "specifications or conversions"
+                )
+            if field == "row":
+                continue
+            if not field.isdigit():
+                raise ConfigurationError(
+                    f"Invalid output name field {{{field}}} in {template!r}; use "
+                    "CSV column indices such as {9}, or {row}"
+                )
+            self._columns.append(int(field))
+        self._taken: Set[str] = set()
+
+    def name_row(self, row: Sequence[str]) -> str:
+        """
+        Fill the column fields of the template for a raw CSV row.
+
+        Args:
+            row: Raw CSV values
+
+        Returns:
+            Name with {row} still in place, for name_output() to fill;
+            columns the row does not have are left blank
+        """
+        values = [""] * (max(self._columns, default=-1) + 1)
+        for column in self._columns:
+            if column < len(row):
+                values[column] = UNSAFE_NAME_CHARACTERS.sub("_", row[column].strip())
+        return self.template.format(*values, row=ROW_PLACEHOLDER)
+
+    def name_output(self, row_name: Optional[str], row_index: int) -> str:
+        """
+        Get the file name of a row's output.
+
+        Args:
+            row_name: Name from name_row(), or None to name the output
+                after the row index
+            row_index: Index of the row among the filled rows
+
+        Returns:
+            Unique file name ending in .pdf
+        """
+        name = (row_name or ROW_PLACEHOLDER).replace(ROW_PLACEHOLDER, str(row_index))
+        if not name.strip("._"):
+            # Every named column was blank
+            name = str(row_index)
+        if name in self._taken:
+            name = f"{name}_{row_index}"
+        self._taken.add(name)
+        return f"{name}.pdf"
@@ -0,0 +1,156 @@
+"""Write-behind output of individual PDFs for FormFiller application."""
+
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Threads writing individual PDFs; writes mostly wait on the disk or network
+# filesystem, so a few threads overlap them with filling
+DEFAULT_IO_THREADS = 4
+
+# Serialized documents allowed to wait for a write, per I/O thread
+PENDING_WRITES_PER_THREAD = 8
+
+# (output path, error or None) of a finished write
+FinishedWrite = Tuple[str, Optional[BaseException]]
+
+
+def write_file(path: str, data: bytes) -> None:
+    """
+    Write a file through a temporary file, so it is never seen half written.
+
+    Args:
+        path: Output path
+        data: File contents
+    """
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class CollectingWriter:
+    """
+    Writer that keeps serialized documents in memory instead of writing them.
+
+    Pool workers use it when individual PDFs go to an archive, which only
+    the parent process writes to.
+    """
+
+    def __init__(self):
+        """Initialize the writer."""
+        self.documents: List[Tuple[str, bytes]] = []
+
+    def submit(self, path: str, data: bytes) -> None:
+        """
+        Keep a document.
+
+        Args:
+            path: Output path
+            data: Serialized document
+        """
+        self.documents.append((path, data))
+
+    def flush(self) -> List[FinishedWrite]:
+        """Nothing is written, so no write can fail."""
+        return []
+
+
+class WriteBehindWriter:
+    """
+    Bounded queue of serialized documents written by a small thread pool.
+
+    submit() returns as soon as a document is queued, so the caller can
+    fill the next row while earlier ones are written. Once max_pending
+    writes are queued or running, submit() blocks until one finishes.
+    The writer is driven from a single thread, which also collects the
+    finished writes, so callers can record them in a manifest that is not
+    thread-safe.
+    """
+
+    def __init__(
+        self,
+        threads: int = DEFAULT_IO_THREADS,
+        max_pending: int = 0,
+        write: Callable[[str, bytes], None] = write_file,
+    ):
+        """
+        Initialize the writer.
+
+        Args:
+            threads: Number of I/O threads
+            max_pending: Largest number of writes queued or running at once;
+                0 allows PENDING_WRITES_PER_THREAD per thread
+            write: Function storing one document; an output sink's write()
+                to write into an archive, with a single thread
+        """
+        self._write = write
+        self._executor = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="pdf-writer"
+        )
+        self.max_pending = max_pending or threads * PENDING_WRITES_PER_THREAD
+        self._pending: Dict[Future, str] = {}
+        self._finished: List[FinishedWrite] = []
+
+    def __enter__(self) -> "WriteBehindWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.close()
+
+    def submit(self, path: str, data: bytes) -> None:
+        """
+        Queue a document to be written, waiting while the queue is full.
+
+        Args:
+            path: Output path passed to the write function
+            data: Serialized document
+        """
+        if len(self._pending) >= self.max_pending:
+            done, _ = wait(self._pending, return_when=FIRST_COMPLETED)
+            self._collect(done)
+        self._pending[self._executor.submit(self._write, path, data)] = path
+
+    def _collect(self, done: Iterable[Future]) -> None:
+        """Move finished writes from the pending to the finished list."""
+        for future in done:
+            self._finished.append((self._pending.pop(future), future.exception()))
+
+    def completed(self) -> List[FinishedWrite]:
+        """
+        Take the writes that finished since the last call.
+
+        Returns:
+            (output path, error or None) of each finished write
+        """
+        self._collect([future for future in self._pending if future.done()])
+        finished, self._finished = self._finished, []
+        return finished
+
+    def flush(self) -> List[FinishedWrite]:
+        """
+        Wait for every queued write to finish.
+
+        Returns:
+            (output path, error or None) of each write that finished since
+            the last call to completed() or flush()
+        """
+        self._collect(wait(self._pending).done)
+        return self.completed()
+
+    def close(self) -> List[FinishedWrite]:
+        """
+        Wait for every queued write and stop the I/O threads.
+
+        Returns:
+            (output path, error or None) of each write that finished since
+            the last call to completed() or flush()
+        """
+        finished = self.flush()
+        self._executor.shutdown()
+        return finished
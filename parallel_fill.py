@@ -0,0 +1,507 @@
+"""Process-pool fill engine for FormFiller application."""
+
+import logging
+import logging.handlers
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from batch_fill import BatchTemplate, prepare_batch_template
+from combined_writer import SharedResourceDocument
+from fast_fill import FastTemplate
+from fill_plan import FillPlan
+from output_writer import CollectingWriter, WriteBehindWriter
+from render_cache import RenderCache
+from stats import ProcessingStats
+from template_cache import CachedTemplate, TemplateCache
+from utils.fill_form import append_filled_form, fill_form, fill_form_batch
+
+logger = logging.getLogger(__name__)
+
+
+class RowTask(NamedTuple):
+    """A single row to fill, as sent to a worker."""
+
+    index: int
+    field_data: Dict[str, str]
+    output_path: str
+    reuse: bool = False
+    # Key of the worker template used to fill the row
+    template: str = ""
+
+
+class ChunkTask(NamedTuple):
+    """A contiguous chunk of rows to fill, as sent to a worker."""
+
+    rows: List[RowTask]
+    # Part file for the chunk's pages in the combined PDF; None if there
+    # is no combined PDF
+    part_path: Optional[str] = None
+
+
+class WorkerTemplate(NamedTuple):
+    """A template to prepare in each worker, as sent by the parent."""
+
+    template_path: str
+    # Fill plan compiled by the parent, so workers do not compile it again
+    fill_plan: FillPlan
+    # Template already parsed by the parent; if None, the worker parses it
+    template: Optional[CachedTemplate] = None
+    # Template prepared for the fast engine, if the template uses it
+    fast_template: Optional[FastTemplate] = None
+    # Rows per batch, if combined rows are filled in batches; the worker
+    # prepares the batch template once a chunk has that many rows
+    batch_size: int = 0
+    # Empty caches of the sizes the worker keeps for the template
+    render_cache: Optional[RenderCache] = None
+
+
+# Rows per task; large enough to amortize IPC, small enough to balance workers
+DEFAULT_CHUNK_SIZE = 64
+
+# Per-process state, populated by init_worker in each pool worker
+_worker_state: Dict[str, Any] = {}
+
+
+@dataclass
+class ChunkResult:
+    """Outcome of filling one contiguous chunk of rows in a worker."""
+
+    template: str = ""
+    filled_rows: List[int] = field(default_factory=list)
+    reused_rows: List[int] = field(default_factory=list)
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+    # Part file written with the chunk's pages, if any were collected
+    part_path: Optional[str] = None
+    page_count: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    stats: ProcessingStats = field(default_factory=ProcessingStats)
+    # (output path, bytes) of individual PDFs for the parent to write
+    individual_pdfs: List[Tuple[str, bytes]] = field(default_factory=list)
+    # Render cache (hits, misses) since the previous chunk, by cache name
+    render_counts: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+
+
+def get_log_queue() -> Optional[Any]:
+    """
+    Find the queue the root logger forwards records to.
+
+    Returns:
+        The queue of the root logger's QueueHandler, or None if logging is
+        not queue-based
+    """
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.handlers.QueueHandler):
+            return handler.queue
+    return None
+
+
+def init_worker(
+    templates: Dict[str, WorkerTemplate],
+    log_queue: Optional[Any] = None,
+    log_level: int = logging.WARNING,
+    io_threads: int = 0,
+) -> None:
+    """
+    Set up the templates and fill plans prepared by the parent in a worker.
+
+    Args:
+        templates: Templates to prepare, keyed by the RowTask.template value
+            of the rows they fill
+        log_queue: Parent's logging queue; worker records are sent there so
+            that only the parent's listener writes to the console
+        log_level: Root log level to use in the worker
+        io_threads: Number of threads writing the worker's individual PDFs;
+            0 saves each PDF before filling the next row
+    """
+    if log_queue is not None:
+        root = logging.getLogger()
+        root.handlers = [logging.handlers.QueueHandler(log_queue)]
+        root.setLevel(log_level)
+
+    template_cache = TemplateCache()
+    fill_plans = {}
+    fast_templates = {}
+    batch_sizes = {}
+    render_caches = {}
+    for key, worker_template in templates.items():
+        if worker_template.template is not None:
+            template_cache.add(worker_template.template)
+        fill_plans[key] = worker_template.fill_plan
+        fast_templates[key] = worker_template.fast_template
+        batch_sizes[key] = worker_template.batch_size
+        render_caches[key] = worker_template.render_cache
+    _worker_state["template_cache"] = template_cache
+    _worker_state["fill_plans"] = fill_plans
+    _worker_state["fast_templates"] = fast_templates
+    _worker_state["batch_sizes"] = batch_sizes
+    _worker_state["batch_templates"] = {}
+    _worker_state["render_caches"] = render_caches
+    _worker_state["reported_hits"] = 0
+    _worker_state["reported_misses"] = 0
+    _worker_state["writer"] = WriteBehindWriter(io_threads) if io_threads else None
+    _worker_state["run_id"] = None
+
+
+def start_pool(
+    workers: int, templates: Dict[str, WorkerTemplate], io_threads: int = 0
+) -> ProcessPoolExecutor:
+    """
+    Start a process pool whose workers are set up by init_worker.
+
+    Args:
+        workers: Number of worker processes
+        templates: Templates to prepare in each worker, keyed by the
+            RowTask.template value of the rows they fill
+        io_threads: Number of threads writing each worker's individual PDFs
+
+    Returns:
+        ProcessPoolExecutor to submit fill_chunk tasks to
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(
+            templates,
+            get_log_queue(),
+            logging.getLogger().getEffectiveLevel(),
+            io_threads,
+        ),
+    )
+
+
+class WorkerPool:
+    """
+    Process pool kept warm across runs, such as the jobs of the service.
+
+    Workers keep the templates they were started with, along with the
+    batch templates and laid out values they prepare, so a run reuses the
+    pool only if it fills the same prepared templates with the same
+    settings; a run with other templates restarts it. Filled forms cached
+    by the workers are only reused within a run.
+    """
+
+    def __init__(self, workers: int):
+        """
+        Initialize the pool; its processes start with the first run.
+
+        Args:
+            workers: Number of worker processes
+        """
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._key: Optional[Tuple] = None
+        # Templates the workers were started with; kept so the ids in the
+        # key are not reused by other objects
+        self._templates: Dict[str, WorkerTemplate] = {}
+        self._run_count = 0
+
+    @staticmethod
+    def _get_key(templates: Dict[str, WorkerTemplate], io_threads: int) -> Tuple:
+        """Get what a run's workers are set up with, by object identity."""
+        return (
+            io_threads,
+            tuple(
+                (
+                    key,
+                    template.template_path,
+                    id(template.fill_plan),
+                    id(template.template),
+                    id(template.fast_template),
+                    template.batch_size,
+                    template.render_cache.sizes if template.render_cache else None,
+                )
+                for key, template in sorted(templates.items())
+            ),
+        )
+
+    def start_run(
+        self, templates: Dict[str, WorkerTemplate], io_threads: int = 0
+    ) -> Tuple[Executor, int]:
+        """
+        Get the pool's executor for a run, starting it if needed.
+
+        Args:
+            templates: Templates the run fills, keyed like init_worker's
+            io_threads: Number of threads writing each worker's individual PDFs
+
+        Returns:
+            Tuple of (executor, run id to pass to fill_chunk)
+        """
+        key = self._get_key(templates, io_threads)
+        if self._executor is None or key != self._key:
+            self.shutdown()
+            logger.debug(f"Starting a pool of {self.workers} workers")
+            self._executor = start_pool(self.workers, templates, io_threads)
+            self._key = key
+            self._templates = templates
+        self._run_count += 1
+        return self._executor, self._run_count
+
+    def shutdown(self) -> None:
+        """Stop the worker processes, cancelling tasks not yet started."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            self._key = None
+            self._templates = {}
+
+
+def fill_chunk(
+    task: ChunkTask,
+    flatten: bool = True,
+    keep_individual: bool = False,
+    return_individual: bool = False,
+    run_id: int = 0,
+) -> ChunkResult:
+    """
+    Fill a chunk of rows using the worker's warm templates.
+
+    Rows flagged for reuse are not filled; their existing output file is
+    added to the combined chunk instead. With combined output, all rows of
+    a chunk must use the same template, and the worker saves the chunk's
+    pages to the task's part file itself. Templates with a batch template
+    fill the chunk's rows a batch at a time, unless individual PDFs are
+    kept, fields are kept live or rows are reused.
+
+    Args:
+        task: Rows to fill, in order, and the part file for their pages
+        flatten: If True, flatten form fields on the collected pages
+        keep_individual: If True, save individual PDFs even when combined
+        return_individual: If True, return individual PDFs in the result
+            instead of writing them, for the parent to add to an archive
+        run_id: Run the chunk belongs to; a worker kept warm across runs
+            drops the filled forms of the previous run
+
+    Returns:
+        ChunkResult with per-row failures and the optional part file
+    """
+    if run_id != _worker_state["run_id"]:
+        for render_cache in _worker_state["render_caches"].values():
+            if render_cache is not None:
+                render_cache.clear_forms()
+        _worker_state["run_id"] = run_id
+
+    template_cache: TemplateCache = _worker_state["template_cache"]
+    writer: Optional[WriteBehindWriter] = _worker_state["writer"]
+    if return_individual:
+        writer = CollectingWriter()
+    rows = task.rows
+    chunk_doc = SharedResourceDocument() if task.part_path else None
+    result = ChunkResult(template=rows[0].template if rows else "")
+
+    batch_template = None
+    if (
+        chunk_doc is not None
+        and flatten
+        and not keep_individual
+        and not any(row.reuse for row in rows)
+    ):
+        batch_template = _get_batch_template(result.template, len(rows))
+    render_cache = _worker_state["render_caches"].get(result.template)
+    if batch_template is not None:
+        for batch in chunk_rows(rows, batch_template.size):
+            errors = fill_form_batch(
+                batch_template,
+                [row.field_data for row in batch],
+                chunk_doc,
+                flatten=flatten,
+                stats=result.stats,
+                render_cache=render_cache,
+            )
+            for row, error in zip(batch, errors):
+                if error is None:
+                    result.filled_rows.append(row.index)
+                else:
+                    result.errors.append((row.index, str(error)))
+    else:
+        for row in rows:
+            try:
+                if row.reuse:
+                    if chunk_doc is not None:
+                        append_filled_form(
+                            row.output_path,
+                            chunk_doc,
+                            flatten=flatten,
+                            stats=result.stats,
+                        )
+                    result.reused_rows.append(row.index)
+                    continue
+
+                fill_plan = _worker_state["fill_plans"][row.template]
+                fill_form(
+                    pdf_path=fill_plan.template_path,
+                    field_data=row.field_data,
+                    output_pdf_path=row.output_path,
+                    new_doc=chunk_doc,
+                    template_cache=template_cache,
+                    fill_plan=fill_plan,
+                    flatten=flatten,
+                    keep_individual=keep_individual,
+                    stats=result.stats,
+                    fast_template=_worker_state["fast_templates"][row.template],
+                    writer=writer,
+                    render_cache=render_cache,
+                )
+                result.filled_rows.append(row.index)
+            except Exception as e:
+                result.errors.append((row.index, str(e)))
+
+    if writer is not None:
+        # Rows only count as filled once their individual PDF is written
+        write_errors = {
+            output_path: error
+            for output_path, error in writer.flush()
+            if error is not None
+        }
+        if write_errors:
+            failed_rows = {
+                row.index: write_errors[row.output_path]
+                for row in rows
+                if row.output_path in write_errors
+            }
+            result.filled_rows = [
+                index for index in result.filled_rows if index not in failed_rows
+            ]
+            result.errors.extend(
+                (index, str(error)) for index, error in failed_rows.items()
+            )
+
+    if return_individual:
+        result.individual_pdfs = writer.documents
+
+    if chunk_doc is not None:
+        if len(chunk_doc):
+            with result.stats.time("part_save"):
+                chunk_doc.save(task.part_path)
+            result.part_path = task.part_path
+            result.page_count = len(chunk_doc)
+        chunk_doc.close()
+
+    # Report cache activity since the previous chunk handled by this worker
+    if render_cache is not None:
+        result.render_counts = render_cache.take_counts()
+    result.cache_hits = template_cache.hits - _worker_state["reported_hits"]
+    result.cache_misses = template_cache.misses - _worker_state["reported_misses"]
+    _worker_state["reported_hits"] = template_cache.hits
+    _worker_state["reported_misses"] = template_cache.misses
+    return result
+
+
+def _get_batch_template(key: str, row_count: int) -> Optional[BatchTemplate]:
+    """
+    Get the worker's batch template for a template, preparing it on demand.
+
+    Args:
+        key: Key of the worker template
+        row_count: Rows about to be filled; the batch template is only
+            prepared for at least a full batch, so small runs do not pay
+            for copies they would not use
+
+    Returns:
+        BatchTemplate, or None if the rows are to be filled one at a time
+    """
+    batch_templates = _worker_state["batch_templates"]
+    batch_template = batch_templates.get(key)
+    batch_size = _worker_state["batch_sizes"].get(key, 0)
+    if batch_template is None and batch_size > 1 and row_count >= batch_size:
+        fill_plan = _worker_state["fill_plans"][key]
+        batch_template = prepare_batch_template(
+            _worker_state["template_cache"].get(fill_plan.template_path),
+            fill_plan,
+            _worker_state["fast_templates"][key],
+            batch_size,
+        )
+        batch_templates[key] = batch_template
+        if batch_template is None:
+            # Not batchable; do not try again
+            _worker_state["batch_sizes"][key] = 0
+    return batch_template
+
+
+def chunk_rows(rows: Iterable[RowTask], chunk_size: int) -> Iterator[List[RowTask]]:
+    """
+    Split row tasks into contiguous chunks.
+
+    Args:
+        rows: Row tasks in order
+        chunk_size: Maximum number of rows per chunk
+
+    Yields:
+        Lists of at most chunk_size row tasks, preserving order
+    """
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def chunk_rows_by_template(
+    rows: Iterable[RowTask], chunk_size: int
+) -> Iterator[List[RowTask]]:
+    """
+    Split row tasks into chunks that each use a single template.
+
+    Rows are buffered per template and a chunk is yielded when its buffer
+    is full, so rows of one template stay in order relative to each other
+    while rows of different templates may be interleaved differently.
+
+    Args:
+        rows: Row tasks in order
+        chunk_size: Maximum number of rows per chunk
+
+    Yields:
+        Lists of at most chunk_size row tasks sharing a template
+    """
+    buffers: Dict[str, List[RowTask]] = {}
+    for row in rows:
+        buffer = buffers.setdefault(row.template, [])
+        buffer.append(row)
+        if len(buffer) >= chunk_size:
+            yield buffer
+            buffers[row.template] = []
+    for buffer in buffers.values():
+        if buffer:
+            yield buffer
+
+
+def imap_ordered(
+    executor: Executor, fn, iterable: Iterable, max_pending: int
+) -> Iterator:
+    """
+    Map fn over iterable in an executor, yielding results in input order.
+
+    At most max_pending tasks are in flight at once, so the input can be a
+    lazy iterator without being fully materialized.
+
+    Args:
+        executor: Executor to submit tasks to
+        fn: Callable applied to each item
+        iterable: Items to process
+        max_pending: Maximum number of submitted but unconsumed tasks
+
+    Yields:
+        fn(item) for each item, in the order the items were produced
+    """
+    pending: Deque[Future] = deque()
+    for item in iterable:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
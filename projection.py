@@ -0,0 +1,178 @@
+"""Compiled projection of CSV rows onto PDF field names."""
+
+import logging
+from operator import itemgetter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+MULTI_COLUMN_SEPARATOR = " \n"
+
+
+def load_pandas():
+    """
+    Import pandas on demand.
+
+    pandas is optional and slow to import, so it is only loaded when the
+    batch projection path is used.
+
+    Returns:
+        The pandas module, or None if it is not installed
+    """
+    try:
+        import pandas
+    except ImportError:
+        return None
+    return pandas
+
+
+def get_column_spec(mapping_value: Any) -> Any:
+    """
+    Get the CSV column part of a mapping value.
+
+    A field maps either directly to its column spec, or to a dictionary with
+    the spec under "column" and optional validation rules under "validate".
+
+    Args:
+        mapping_value: Value of a field in the mapping YAML
+
+    Returns:
+        Column index, list of column indices, or -1 for unused fields
+    """
+    if isinstance(mapping_value, dict):
+        return mapping_value.get("column", -1)
+    return mapping_value
+
+
+def is_unused_mapping(mapping_value: Any) -> bool:
+    """Return True if a mapping value marks the field as unused."""
+    csv_index = get_column_spec(mapping_value)
+    return csv_index == "-1" or csv_index == -1
+
+
+class ProjectionPlan:
+    """
+    Field mappings compiled once into a fast row projection.
+
+    Unused fields are dropped up front, single-column fields are extracted
+    with one operator.itemgetter call and multi-column fields are joined
+    with precomputed getters. Rows too short for the plan return None from
+    project() so the caller can fall back to a per-field checked path.
+    """
+
+    def __init__(self, field_mappings: Dict[str, Any]):
+        """
+        Compile field mappings into a projection.
+
+        Args:
+            field_mappings: Mapping of PDF field name to a CSV column index,
+                a list of column indices, or -1 for unused fields, either
+                directly or under the "column" key of a dictionary
+        """
+        self.single_fields: List[str] = []
+        self.single_indices: List[int] = []
+        self.multi_fields: List[Tuple[str, List[int]]] = []
+        self.invalid_fields: List[str] = []
+
+        for field_name, mapping_value in field_mappings.items():
+            if is_unused_mapping(mapping_value):
+                continue
+            csv_index = get_column_spec(mapping_value)
+            if isinstance(csv_index, list) and all(
+                isinstance(idx, int) for idx in csv_index
+            ):
+                self.multi_fields.append((field_name, csv_index))
+            elif isinstance(csv_index, int) and not isinstance(csv_index, bool):
+                self.single_fields.append(field_name)
+                self.single_indices.append(csv_index)
+            else:
+                logger.error(
+                    f"Invalid column mapping for field '{field_name}': {csv_index!r}"
+                )
+                self.invalid_fields.append(field_name)
+
+        all_indices = self.single_indices + [
+            idx for _, indices in self.multi_fields for idx in indices
+        ]
+        self.min_row_length = max(all_indices, default=-1) + 1
+
+        self._single_getter = self._make_getter(self.single_indices)
+        self._multi_getters: List[Tuple[str, Callable]] = [
+            (field_name, self._make_getter(indices))
+            for field_name, indices in self.multi_fields
+        ]
+
+    @staticmethod
+    def _make_getter(indices: List[int]) -> Callable[[Sequence[str]], Tuple]:
+        """Build a getter that always returns a tuple, even for one index."""
+        if not indices:
+            return lambda row: ()
+        if len(indices) == 1:
+            index = indices[0]
+            return lambda row: (row[index],)
+        return itemgetter(*indices)
+
+    def project(self, row: Sequence[str]) -> Optional[Dict[str, str]]:
+        """
+        Project a CSV row onto field names.
+
+        Args:
+            row: List of string values from a CSV row
+
+        Returns:
+            Dictionary mapping PDF field names to values, or None if the row
+            is shorter than the highest mapped column
+        """
+        if len(row) < self.min_row_length:
+            return None
+
+        field_data = dict(zip(self.single_fields, self._single_getter(row)))
+        for field_name, getter in self._multi_getters:
+            field_data[field_name] = MULTI_COLUMN_SEPARATOR.join(getter(row))
+        for field_name in self.invalid_fields:
+            field_data[field_name] = ""
+        return field_data
+
+    def project_frame(self, frame: "pd.DataFrame") -> "pd.DataFrame":
+        """
+        Project a whole DataFrame chunk at once.
+
+        The frame must have integer column labels matching CSV column
+        positions and string values. Columns missing from the frame, and
+        missing values in ragged rows, are treated as empty strings.
+
+        Args:
+            frame: DataFrame of raw CSV values
+
+        Returns:
+            DataFrame with one column per mapped PDF field
+
+        Raises:
+            ImportError: If pandas is not installed
+        """
+        pd = load_pandas()
+        if pd is None:
+            raise ImportError("pandas is required for batch projection")
+
+        frame = frame.fillna("")
+        width = frame.shape[1]
+
+        def column(idx: int) -> "pd.Series":
+            if idx < width:
+                return frame[idx]
+            return pd.Series("", index=frame.index, dtype=object)
+
+        projected = {
+            field_name: column(idx)
+            for field_name, idx in zip(self.single_fields, self.single_indices)
+        }
+        for field_name, indices in self.multi_fields:
+            first, *rest = [column(idx) for idx in indices] or [column(width)]
+            if rest:
+                projected[field_name] = first.str.cat(rest, sep=MULTI_COLUMN_SEPARATOR)
+            else:
+                projected[field_name] = first
+        for field_name in self.invalid_fields:
+            projected[field_name] = column(width)
+
+        return pd.DataFrame(projected, index=frame.index)
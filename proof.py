@@ -0,0 +1,427 @@
+"""Rasterized proofs of filled forms for FormFiller application."""
+
+import logging
+import logging.handlers
+import math
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import chain, islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import fitz
+
+from config import DEFAULT_PROOF_DPI
+from exceptions import FormFillerError
+from parallel_fill import get_log_queue, imap_ordered
+from utils.overlay_form_names import draw_field_names
+
+logger = logging.getLogger(__name__)
+
+# Forms per task when each page is written to its own PNG
+PROOF_CHUNK_SIZE = 16
+
+# Height in pixels of the label under each form of a contact sheet
+SHEET_LABEL_HEIGHT = 14
+
+# Per-process state, populated by init_proof_worker in each pool worker
+_worker_state: Dict[str, Any] = {}
+
+
+class ProofForm(NamedTuple):
+    """One filled form to render: a range of pages of a PDF."""
+
+    path: str
+    first_page: int = 0
+    # Pages of the form; 0 for every page of the file
+    page_count: int = 0
+    # Index of the form in a combined PDF; -1 if the form is the whole file
+    number: int = -1
+
+    @property
+    def name(self) -> str:
+        """Name of the form's proofs, without extension."""
+        stem = Path(self.path).stem
+        return stem if self.number < 0 else f"{stem}_{self.number + 1:06d}"
+
+
+class ProofTask(NamedTuple):
+    """Forms to render, as sent to a worker."""
+
+    forms: List[ProofForm]
+    # Index of the contact sheet the forms go on; -1 writes a PNG per page
+    sheet: int = -1
+
+
+@dataclass
+class ProofSettings:
+    """How forms are rendered, shared by every worker."""
+
+    output_dir: str
+    dpi: int = DEFAULT_PROOF_DPI
+    # Draw each field's name above it
+    field_names: bool = False
+    # (template page, field name, rect) of each template widget; names are
+    # drawn from these on pages that have no widgets, such as flattened ones
+    template_fields: List[Tuple[int, str, Tuple[float, ...]]] = field(
+        default_factory=list
+    )
+    # Grid of a contact sheet; 0 columns writes a PNG per page instead
+    columns: int = 0
+    rows: int = 0
+
+
+@dataclass
+class ProofResult:
+    """Outcome of rendering one task in a worker."""
+
+    forms: int = 0
+    pages: int = 0
+    outputs: List[str] = field(default_factory=list)
+    # (form name, error) of each form that could not be rendered
+    errors: List[Tuple[str, str]] = field(default_factory=list)
+
+
+def _natural_key(path: Path) -> Tuple:
+    """Sort key putting "2.pdf" before "10.pdf"."""
+    return tuple(
+        (0, int(part), "") if part.isdigit() else (1, 0, part)
+        for part in re.split(r"(\d+)", path.name)
+    )
+
+
+def iter_proof_forms(
+    sources: Iterable[str], pages_per_form: int = 1
+) -> Iterator[ProofForm]:
+    """
+    List the forms held by PDF files and directories.
+
+    Each PDF in a directory, such as the individual outputs, is one form and
+    is only opened by the worker rendering it. A PDF given by path, such as a
+    combined PDF, is split into forms of pages_per_form pages.
+
+    Args:
+        sources: Paths of PDF files and directories of PDF files
+        pages_per_form: Pages of each form in the PDFs given by path
+
+    Yields:
+        ProofForm for each form, in file and page order
+
+    Raises:
+        FormFillerError: If a source does not exist or cannot be opened
+    """
+    for source in sources:
+        path = Path(source)
+        if path.is_dir():
+            for pdf_path in sorted(path.glob("*.pdf"), key=_natural_key):
+                yield ProofForm(str(pdf_path))
+            continue
+        if not path.is_file():
+            raise FormFillerError(f"Proof source not found: {source}")
+
+        try:
+            with fitz.open(str(path)) as doc:
+                page_count = len(doc)
+        except Exception as e:
+            raise FormFillerError(f"Cannot open {source}: {e}")
+        for number, first_page in enumerate(range(0, page_count, pages_per_form)):
+            yield ProofForm(str(path), first_page, pages_per_form, number)
+
+
+def sample_forms(forms: List[ProofForm], count: int) -> List[ProofForm]:
+    """
+    Pick forms evenly spread over a list.
+
+    Args:
+        forms: Forms to pick from
+        count: Number of forms to pick
+
+    Returns:
+        count forms, including the first, in order; every form if there
+        are no more than count
+    """
+    if count >= len(forms):
+        return forms
+    step = len(forms) / count
+    return [forms[int(index * step)] for index in range(count)]
+
+
+def init_proof_worker(
+    settings: ProofSettings,
+    log_queue: Optional[Any] = None,
+    log_level: int = logging.WARNING,
+) -> None:
+    """
+    Set up a process rendering proofs.
+
+    Args:
+        settings: How forms are rendered
+        log_queue: Parent's logging queue; worker records are sent there so
+            that only the parent's listener writes to the console
+        log_level: Root log level to use in the worker
+    """
+    if log_queue is not None:
+        root = logging.getLogger()
+        root.handlers = [logging.handlers.QueueHandler(log_queue)]
+        root.setLevel(log_level)
+
+    _worker_state["settings"] = settings
+    # Path and document of the PDF rendered last; the forms of a combined
+    # PDF come in page order, so it is opened once per task
+    _worker_state["document"] = None
+
+
+def _open_document(path: str) -> fitz.Document:
+    """Open a PDF, reusing the document rendered last if it is the same."""
+    cached = _worker_state["document"]
+    if cached is not None:
+        if cached[0] == path:
+            return cached[1]
+        cached[1].close()
+    doc = fitz.open(path)
+    _worker_state["document"] = (path, doc)
+    return doc
+
+
+def close_proof_worker() -> None:
+    """Close the document kept open by the current process."""
+    cached = _worker_state.get("document")
+    if cached is not None:
+        cached[1].close()
+        _worker_state["document"] = None
+
+
+def _render_page(
+    doc: fitz.Document, page_num: int, form_page: int, settings: ProofSettings
+) -> fitz.Pixmap:
+    """
+    Render one page of a form.
+
+    Args:
+        doc: Document holding the form
+        page_num: Page to render
+        form_page: Index of the page within its form
+        settings: How forms are rendered
+
+    Returns:
+        RGB pixmap of the page
+    """
+    page = doc.load_page(page_num)
+    if settings.field_names:
+        fields = [(widget.field_name, widget.rect) for widget in page.widgets()]
+        if not fields:
+            fields = [
+                (name, rect)
+                for template_page, name, rect in settings.template_fields
+                if template_page == form_page
+            ]
+        draw_field_names(page, fields)
+    return page.get_pixmap(dpi=settings.dpi)
+
+
+def _load_pillow():
+    """
+    Import the Pillow modules used to lay out contact sheets.
+
+    Raises:
+        FormFillerError: If Pillow is not installed
+    """
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        raise FormFillerError(
+            "Contact sheets need Pillow; install it with 'pip install pillow'"
+        )
+    return Image, ImageDraw
+
+
+def _write_contact_sheet(
+    sheet: int, cells: List[Tuple[str, fitz.Pixmap]], settings: ProofSettings
+) -> str:
+    """
+    Lay out rendered forms on a grid with their names and save it.
+
+    Args:
+        sheet: Index of the contact sheet
+        cells: (form name, render) of each form on the sheet, in order
+        settings: How forms are rendered
+
+    Returns:
+        Path of the PNG written
+    """
+    Image, ImageDraw = _load_pillow()
+    cell_width = max(pix.width for _, pix in cells)
+    cell_height = max(pix.height for _, pix in cells) + SHEET_LABEL_HEIGHT
+    rows = math.ceil(len(cells) / settings.columns)
+    image = Image.new(
+        "RGB", (settings.columns * cell_width, rows * cell_height), "white"
+    )
+    draw = ImageDraw.Draw(image)
+    for index, (name, pix) in enumerate(cells):
+        x = (index % settings.columns) * cell_width
+        y = (index // settings.columns) * cell_height
+        image.paste(
+            Image.frombytes("RGB", (pix.width, pix.height), pix.samples), (x, y)
+        )
+        draw.text((x + 4, y + pix.height + 1), name, fill="black")
+
+    path = os.path.join(settings.output_dir, f"contact_sheet_{sheet + 1:05d}.png")
+    image.save(path)
+    return path
+
+
+def render_proofs(task: ProofTask) -> ProofResult:
+    """
+    Render the forms of one task in a worker.
+
+    Args:
+        task: Forms to render, on a contact sheet or to a PNG per page
+
+    Returns:
+        ProofResult with the paths written and the forms that failed
+    """
+    settings: ProofSettings = _worker_state["settings"]
+    result = ProofResult()
+    cells: List[Tuple[str, fitz.Pixmap]] = []
+    for form in task.forms:
+        try:
+            doc = _open_document(form.path)
+            last_page = len(doc)
+            if form.page_count:
+                last_page = min(last_page, form.first_page + form.page_count)
+            if task.sheet >= 0:
+                # A contact sheet shows the first page of each form
+                last_page = min(last_page, form.first_page + 1)
+
+            for page_num in range(form.first_page, last_page):
+                form_page = page_num - form.first_page
+                pix = _render_page(doc, page_num, form_page, settings)
+                result.pages += 1
+                if task.sheet >= 0:
+                    cells.append((form.name, pix))
+                    continue
+                name = form.name
+                if last_page - form.first_page > 1:
+                    name = f"{name}_p{form_page + 1}"
+                path = os.path.join(settings.output_dir, f"{name}.png")
+                pix.save(path)
+                result.outputs.append(path)
+            result.forms += 1
+        except Exception as e:
+            logger.error(f"Failed to render {form.name}: {e}")
+            result.errors.append((form.name, str(e)))
+
+    if cells:
+        result.outputs.append(_write_contact_sheet(task.sheet, cells, settings))
+    return result
+
+
+def _make_tasks(
+    forms: Iterable[ProofForm], forms_per_task: int, contact_sheets: bool
+) -> Iterator[ProofTask]:
+    """Group forms into tasks, one per contact sheet if sheets are made."""
+    iterator = iter(forms)
+    sheet = 0
+    while True:
+        chunk = list(islice(iterator, forms_per_task))
+        if not chunk:
+            return
+        yield ProofTask(chunk, sheet if contact_sheets else -1)
+        sheet += 1
+
+
+def generate_proofs(
+    sources: List[str],
+    settings: ProofSettings,
+    pages_per_form: int = 1,
+    sample: int = 0,
+    workers: int = 1,
+) -> dict:
+    """
+    Render filled forms to PNG files for review.
+
+    Forms are listed lazily and rendered across a process pool as they are
+    listed, so proofs of a large run start appearing right away; sampling
+    lists every form first to spread the sample over them.
+
+    Args:
+        sources: PDF files and directories holding the filled forms
+        settings: How forms are rendered; contact sheets are made if it has
+            columns
+        pages_per_form: Pages of each form in the PDFs given by path
+        sample: Number of forms to render, evenly spread; 0 renders all
+        workers: Number of worker processes, at most one per task of
+            PROOF_CHUNK_SIZE forms or contact sheet; 1 renders in this process
+
+    Returns:
+        Dictionary with the counts of forms, pages and files written, the
+        forms that failed, and the output directory
+
+    Raises:
+        FormFillerError: If a source cannot be read, or contact sheets are
+            requested without Pillow
+    """
+    contact_sheets = settings.columns > 0
+    if contact_sheets:
+        _load_pillow()
+    os.makedirs(settings.output_dir, exist_ok=True)
+
+    forms: Iterable[ProofForm] = iter_proof_forms(sources, pages_per_form)
+    if sample:
+        forms = sample_forms(list(forms), sample)
+    forms_per_task = (
+        settings.columns * settings.rows if contact_sheets else PROOF_CHUNK_SIZE
+    )
+    tasks = _make_tasks(forms, forms_per_task, contact_sheets)
+
+    results = {
+        "forms": 0,
+        "pages": 0,
+        "outputs": 0,
+        "errors": [],
+        "output_dir": settings.output_dir,
+    }
+    start_time = time.time()
+
+    def collect(task_results: Iterable[ProofResult]) -> None:
+        for result in task_results:
+            results["forms"] += result.forms
+            results["pages"] += result.pages
+            results["outputs"] += len(result.outputs)
+            results["errors"].extend(result.errors)
+            logger.debug(
+                f"Rendered {results['forms']} forms ({results['outputs']} files)"
+            )
+
+    if workers > 1:
+        # Only start a process per task of a small run, and none for one task
+        head = list(islice(tasks, workers))
+        workers = min(workers, len(head))
+        tasks = chain(head, tasks)
+    if workers > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_proof_worker,
+            initargs=(
+                settings,
+                get_log_queue(),
+                logging.getLogger().getEffectiveLevel(),
+            ),
+        ) as executor:
+            collect(imap_ordered(executor, render_proofs, tasks, workers * 2))
+    else:
+        init_proof_worker(settings)
+        try:
+            collect(map(render_proofs, tasks))
+        finally:
+            close_proof_worker()
+
+    results["processing_time"] = time.time() - start_time
+    logger.info(
+        f"Rendered {results['pages']} pages of {results['forms']} forms to "
+        f"{settings.output_dir} in {results['processing_time']:.2f}s"
+    )
+    return results
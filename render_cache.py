@@ -0,0 +1,219 @@
+"""Memoized appearances and filled forms for FormFiller application."""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, Optional, Tuple
+
+import fitz
+
+
+class LruCache:
+    """
+    Dictionary bounded to its most recently used entries.
+
+    Looking an entry up moves it to the back; adding an entry beyond the
+    maximum size drops the entry used least recently.
+    """
+
+    def __init__(self, max_size: int):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_size: Largest number of entries kept
+        """
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        """Number of entries in the cache."""
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Look an entry up, counting a hit or a miss.
+
+        Args:
+            key: Entry key
+
+        Returns:
+            The cached value, or None
+        """
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Add or replace an entry, dropping the least recently used if full.
+
+        Args:
+            key: Entry key
+            value: Value to cache; never None
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: Hashable) -> None:
+        """Remove an entry, if present."""
+        self._entries.pop(key, None)
+
+    def take_counts(self) -> Tuple[int, int]:
+        """
+        Take the hit and miss counts recorded since the last call.
+
+        Returns:
+            Tuple of (hits, misses); the counters are reset
+        """
+        counts = (self.hits, self.misses)
+        self.hits = self.misses = 0
+        return counts
+
+
+@dataclass
+class RenderedForm:
+    """
+    Output of a filled row, reused by later rows with the same data.
+
+    The pages are kept in the document they were filled in, after baking;
+    for a batch, that is the batch document, shared by its rows.
+    """
+
+    # Document holding the row's baked pages, if it went to a combined PDF
+    doc: Optional[fitz.Document]
+    first_page: int
+    page_count: int
+    # Individual PDF bytes, if the row was saved on its own
+    data: Optional[bytes] = None
+
+
+def form_key(field_data: Dict[str, str]) -> FrozenSet[Tuple[str, str]]:
+    """
+    Get the key of a row's filled form.
+
+    Args:
+        field_data: Dictionary mapping PDF field names to values
+
+    Returns:
+        Key equal for rows with the same mapped data
+    """
+    return frozenset(field_data.items())
+
+
+class RenderCache:
+    """
+    Memoized work of one template's fill.
+
+    Appearances are the laid out appearance stream content and PDF string
+    of a text value, keyed by the template widget and value, so a value
+    shared by many rows (a payer block, the tax year) is laid out once.
+    Forms are whole filled rows keyed by their mapped data, so a duplicate
+    row reuses the pages, or the individual PDF, of the first one.
+    """
+
+    def __init__(self, appearance_size: int = 0, form_size: int = 0):
+        """
+        Initialize the caches.
+
+        Args:
+            appearance_size: Appearances kept; 0 disables the cache
+            form_size: Filled forms kept; 0 disables the cache
+        """
+        self.appearances = LruCache(appearance_size) if appearance_size > 0 else None
+        self.forms = LruCache(form_size) if form_size > 0 else None
+        # Counts merged from caches in other processes
+        self._merged: Dict[str, Tuple[int, int]] = {}
+
+    @property
+    def sizes(self) -> Tuple[int, int]:
+        """Entries kept by the appearance and form caches; 0 if disabled."""
+        return (
+            self.appearances.max_size if self.appearances is not None else 0,
+            self.forms.max_size if self.forms is not None else 0,
+        )
+
+    def empty_copy(self) -> "RenderCache":
+        """Get empty caches of the same sizes, e.g. for a pool worker."""
+        return RenderCache(*self.sizes)
+
+    def clear_forms(self) -> None:
+        """Drop the filled forms, which are only reused within a run."""
+        if self.forms is not None:
+            self.forms = LruCache(self.forms.max_size)
+
+    def _caches(self) -> Dict[str, Optional[LruCache]]:
+        """Get each cache by name, None if disabled."""
+        return {"appearances": self.appearances, "forms": self.forms}
+
+    def take_counts(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Take the hit and miss counts recorded since the last call.
+
+        Returns:
+            (hits, misses) of each enabled cache, by cache name
+        """
+        return {
+            name: cache.take_counts()
+            for name, cache in self._caches().items()
+            if cache is not None
+        }
+
+    def merge_counts(self, counts: Dict[str, Tuple[int, int]]) -> None:
+        """
+        Add hit and miss counts recorded by caches in another process.
+
+        Args:
+            counts: Counts as returned by take_counts()
+        """
+        for name, (hits, misses) in counts.items():
+            merged_hits, merged_misses = self._merged.get(name, (0, 0))
+            self._merged[name] = (merged_hits + hits, merged_misses + misses)
+
+    def counts(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Get the hits and misses of each enabled cache.
+
+        Returns:
+            (hits, misses) by cache name, including merged counts
+        """
+        counts = {}
+        for name, cache in self._caches().items():
+            if cache is None:
+                continue
+            hits, misses = self._merged.get(name, (0, 0))
+            counts[name] = (hits + cache.hits, misses + cache.misses)
+        return counts
+
+
+def get_cache_stats(caches: Iterable[RenderCache]) -> dict:
+    """
+    Summarize the render caches of a run's templates.
+
+    Args:
+        caches: Render cache of each template
+
+    Returns:
+        Hits, misses and hit rate of each enabled cache, summed over the
+        templates
+    """
+    totals: Dict[str, Tuple[int, int]] = {}
+    for cache in caches:
+        for name, (hits, misses) in cache.counts().items():
+            total_hits, total_misses = totals.get(name, (0, 0))
+            totals[name] = (total_hits + hits, total_misses + misses)
+    return {
+        name: {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+        for name, (hits, misses) in totals.items()
+    }
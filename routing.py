@@ -0,0 +1,107 @@
+"""Per-row template routing for FormFiller application."""
+
+import logging
+from typing import Callable, Dict, List, Optional, Sequence
+
+from exceptions import ConfigurationError
+
+logger = logging.getLogger(__name__)
+
+RouteRule = Callable[[Sequence[str]], Optional[str]]
+
+
+def normalize_route_value(value: str) -> str:
+    """Normalize a routing value so matching ignores case and padding."""
+    return value.strip().casefold()
+
+
+class TemplateRouter:
+    """
+    Chooses the template used to fill each CSV row.
+
+    A row's routing value is either the value of one CSV column or the
+    result of a rule called with the raw row. The value is looked up in
+    the routes, ignoring case and surrounding whitespace, to get a template
+    name. Rows whose value has no route return None so the caller can use
+    its default template.
+    """
+
+    def __init__(
+        self,
+        routes: Dict[str, str],
+        column: Optional[int] = None,
+        rule: Optional[RouteRule] = None,
+    ):
+        """
+        Initialize the router.
+
+        Args:
+            routes: Mapping of routing value to template name or path
+            column: CSV column index holding the routing value
+            rule: Callable returning the routing value for a raw row; used
+                instead of column
+
+        Raises:
+            ConfigurationError: If neither or both of column and rule are given
+        """
+        if (column is None) == (rule is None):
+            raise ConfigurationError("Routing needs exactly one of column or rule")
+        if column is not None and column < 0:
+            raise ConfigurationError(f"Invalid routing column: {column}")
+
+        self.column = column
+        self.rule = rule
+        self.routes = {
+            normalize_route_value(value): template for value, template in routes.items()
+        }
+
+    @classmethod
+    def from_specs(cls, column: int, specs: List[str]) -> "TemplateRouter":
+        """
+        Build a column router from VALUE=TEMPLATE strings.
+
+        Args:
+            column: CSV column index holding the routing value
+            specs: Route specifications, e.g. ["MISC=misc", "NEC=nec"]
+
+        Returns:
+            TemplateRouter for the given routes
+
+        Raises:
+            ConfigurationError: If a specification is malformed
+        """
+        routes = {}
+        for spec in specs:
+            value, separator, template = spec.partition("=")
+            if not separator or not template.strip():
+                raise ConfigurationError(
+                    f"Invalid route '{spec}', expected VALUE=TEMPLATE"
+                )
+            routes[value] = template.strip()
+        return cls(routes, column=column)
+
+    @property
+    def templates(self) -> List[str]:
+        """Distinct template names the router can choose, in route order."""
+        return list(dict.fromkeys(self.routes.values()))
+
+    def route(self, row: Sequence[str]) -> Optional[str]:
+        """
+        Choose the template for a row.
+
+        Args:
+            row: Raw CSV row
+
+        Returns:
+            Template name, or None if the row has no matching route
+        """
+        if self.rule is not None:
+            value = self.rule(row)
+        elif self.column < len(row):
+            value = row[self.column]
+        else:
+            value = None
+
+        if value is None:
+            return None
+        return self.routes.get(normalize_route_value(value))
@@ -0,0 +1,196 @@
+"""
+Check of routed runs that fill several custom templates.
+
+Copies the misc template to custom template paths, two of them sharing a
+file name, and routes synthetic rows between them on an extra CSV column.
+Fills the rows serially and with a process pool, and checks that every
+template gets its own entry in the results and its own combined PDF with a
+page set per row. Exits with 1 if any check fails. Example:
+    python -m sanity.check_custom_routes --rows 300 --workers 3
+"""
+
+import argparse
+import csv
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Custom template paths, relative to the work directory, by routing value
+CUSTOM_TEMPLATES = {
+    "A": "one/form.pdf",
+    "B": "two/form.pdf",
+    "C": "letter.pdf",
+}
+
+
+def write_routed_csv(csv_path: str, rows: int) -> int:
+    """
+    Write synthetic misc rows with a routing value appended to each.
+
+    Args:
+        csv_path: Path of the CSV to write
+        rows: Number of rows
+
+    Returns:
+        Index of the routing column
+    """
+    from bench.synthetic import write_synthetic_csv
+    from data_processor import DataProcessor
+
+    mappings = DataProcessor().load_field_mappings(
+        str(REPO_ROOT / "misc_field_number_mapping.yml")
+    )
+    write_synthetic_csv(csv_path, mappings, rows)
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        lines = list(csv.reader(f))
+    route_values = list(CUSTOM_TEMPLATES)
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        for index, line in enumerate(lines):
+            writer.writerow(line + [route_values[index % len(route_values)]])
+    return len(lines[0])
+
+
+def check_run(
+    work_dir: str, csv_path: str, route_column: int, workers: int
+) -> List[str]:
+    """
+    Fill the routed rows and check each template's output.
+
+    Args:
+        work_dir: Directory holding the custom templates and their mapping
+        csv_path: Path of the routed CSV
+        route_column: Index of the routing column
+        workers: Number of worker processes
+
+    Returns:
+        One message per failed check
+    """
+    import fitz
+
+    from config import FormFillerConfig
+    from exceptions import FormFillerError
+    from form_filler import FormFiller
+    from routing import TemplateRouter
+
+    config = FormFillerConfig(base_path=work_dir)
+    config.outputs_folder = Path(work_dir) / f"outputs_{workers}"
+    templates = {
+        value: str(Path(work_dir) / path) for value, path in CUSTOM_TEMPLATES.items()
+    }
+    router = TemplateRouter(templates, column=route_column)
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        expected_rows: Dict[str, int] = {value: 0 for value in templates}
+        for line in csv.reader(f):
+            expected_rows[line[route_column]] += 1
+
+    try:
+        results = FormFiller(config=config).process_forms(
+            input_csv_path=csv_path,
+            template_config=config.get_template_config(templates["A"]),
+            router=router,
+            workers=workers,
+        )
+    except FormFillerError as e:
+        return [f"fill failed: {e}"]
+
+    problems = []
+    with fitz.open(templates["A"]) as template:
+        pages_per_row = len(template)
+    combined_paths = set()
+    for value, template_path in templates.items():
+        # Routed templates are keyed by route, the default one by its name
+        key = template_path
+        if value == "A":
+            key = config.get_template_config(template_path).name
+        template_results = results["templates"].get(key)
+        if template_results is None:
+            problems.append(f"{template_path}: no results")
+            continue
+        if template_results["successful_fills"] != expected_rows[value]:
+            problems.append(
+                f"{template_path}: {template_results['successful_fills']} rows "
+                f"filled, expected {expected_rows[value]}"
+            )
+        combined_path = template_results.get("combined_pdf_path")
+        if combined_path is None:
+            problems.append(f"{template_path}: no combined PDF")
+            continue
+        combined_paths.add(combined_path)
+        with fitz.open(combined_path) as doc:
+            if len(doc) != expected_rows[value] * pages_per_row:
+                problems.append(
+                    f"{template_path}: {len(doc)} pages in {combined_path}, "
+                    f"expected {expected_rows[value] * pages_per_row}"
+                )
+    if len(combined_paths) != len(templates):
+        problems.append(f"templates share combined PDFs: {sorted(combined_paths)}")
+
+    leftovers = sorted(
+        path.name
+        for path in (config.outputs_folder / "big").iterdir()
+        if str(path) not in combined_paths
+    )
+    if leftovers:
+        problems.append(f"files left next to the combined PDFs: {leftovers}")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Route synthetic rows to several custom templates and check the outputs.
+
+    Args:
+        argv: Optional list of arguments to parse (for testing)
+
+    Returns:
+        Exit code; 1 if any check fails
+    """
+    parser = argparse.ArgumentParser(
+        description="Check that routed custom templates keep separate outputs."
+    )
+    parser.add_argument("--rows", type=int, default=300)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=3,
+        help="Worker processes of the parallel run. (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(REPO_ROOT))
+
+    failed = False
+    with tempfile.TemporaryDirectory(prefix="formfiller_routes_") as work_dir:
+        for path in CUSTOM_TEMPLATES.values():
+            template_path = Path(work_dir) / path
+            template_path.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy(REPO_ROOT / "templates" / "misc_template.pdf", template_path)
+        # Custom templates share the custom mapping of the base path
+        shutil.copy(
+            REPO_ROOT / "misc_field_number_mapping.yml",
+            os.path.join(work_dir, "field_number_mapping_custom.yml"),
+        )
+        csv_path = os.path.join(work_dir, "routed.csv")
+        route_column = write_routed_csv(csv_path, args.rows)
+
+        for workers in (1, args.workers):
+            problems = check_run(work_dir, csv_path, route_column, workers)
+            label = "serial" if workers == 1 else f"{workers} workers"
+            if problems:
+                failed = True
+                print(f"{label}: {len(problems)} checks failed")
+                for problem in problems:
+                    print(f"  {problem}")
+            else:
+                print(f"{label}: {len(CUSTOM_TEMPLATES)} templates kept apart")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
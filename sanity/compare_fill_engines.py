@@ -0,0 +1,152 @@
+"""
+Raster comparison of the widget and fast fill engines.
+
+Fills the same synthetic rows with both engines, renders every page of the
+two combined PDFs and reports the pages whose pixels differ. Exits with 1
+if any page differs by more than the tolerance. Example:
+    python -m sanity.compare_fill_engines --rows 200 --templates misc nec
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def fill_with_engine(
+    template_name: str, csv_path: str, engine: str, work_dir: str, flatten: bool
+) -> str:
+    """
+    Fill a CSV with one engine.
+
+    Args:
+        template_name: Built-in template key
+        csv_path: Path to the input CSV
+        engine: Fill engine, "widget" or "fast"
+        work_dir: Directory for the outputs
+        flatten: Whether to flatten the combined PDF
+
+    Returns:
+        Path to the combined PDF
+    """
+    from config import FormFillerConfig
+    from form_filler import FormFiller
+
+    config = FormFillerConfig(base_path=str(REPO_ROOT))
+    config.outputs_folder = Path(work_dir) / engine
+    results = FormFiller(config=config).process_forms(
+        input_csv_path=csv_path,
+        template_config=config.get_template_config(template_name),
+        flatten_combined=flatten,
+        fill_engine=engine,
+    )
+    return results["combined_pdf_path"]
+
+
+def compare_pdfs(
+    expected_path: str, actual_path: str, dpi: int, tolerance: int
+) -> List[str]:
+    """
+    Compare two PDFs page by page after rendering them.
+
+    Args:
+        expected_path: PDF filled by the widget engine
+        actual_path: PDF filled by the fast engine
+        dpi: Rendering resolution
+        tolerance: Largest allowed difference of any color channel
+
+    Returns:
+        One message per page that differs
+    """
+    import fitz
+
+    problems = []
+    with fitz.open(expected_path) as expected, fitz.open(actual_path) as actual:
+        if len(expected) != len(actual):
+            return [f"page count {len(actual)} != {len(expected)}"]
+
+        for page_num in range(len(expected)):
+            expected_pixels = expected[page_num].get_pixmap(dpi=dpi).samples
+            actual_pixels = actual[page_num].get_pixmap(dpi=dpi).samples
+            if expected_pixels == actual_pixels:
+                continue
+            differences = [
+                abs(a - b) for a, b in zip(expected_pixels, actual_pixels) if a != b
+            ]
+            if max(differences) > tolerance:
+                problems.append(
+                    f"page {page_num + 1}: {len(differences)} channels differ, "
+                    f"by up to {max(differences)}"
+                )
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Compare the fill engines on synthetic rows.
+
+    Args:
+        argv: Optional list of arguments to parse (for testing)
+
+    Returns:
+        Exit code; 1 if any page differs
+    """
+    parser = argparse.ArgumentParser(
+        description="Check that the fast fill engine renders like the widget engine."
+    )
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--templates", nargs="+", default=["misc", "nec"])
+    parser.add_argument("--dpi", type=int, default=100)
+    parser.add_argument(
+        "--tolerance",
+        type=int,
+        default=0,
+        help="Largest allowed difference of a color channel. (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--keep-fields",
+        action="store_true",
+        help="Compare live fields instead of flattened pages.",
+    )
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(REPO_ROOT))
+    from bench.synthetic import write_synthetic_csv
+    from config import FormFillerConfig
+    from data_processor import DataProcessor
+
+    failed = False
+    for template_name in args.templates:
+        with tempfile.TemporaryDirectory(prefix="formfiller_engines_") as work_dir:
+            template_config = FormFillerConfig(
+                base_path=str(REPO_ROOT)
+            ).get_template_config(template_name)
+            mappings = DataProcessor().load_field_mappings(template_config.mapping_path)
+            csv_path = write_synthetic_csv(
+                os.path.join(work_dir, f"{template_name}.csv"), mappings, args.rows
+            )
+
+            widget_pdf, fast_pdf = (
+                fill_with_engine(
+                    template_name, csv_path, engine, work_dir, not args.keep_fields
+                )
+                for engine in ("widget", "fast")
+            )
+            problems = compare_pdfs(widget_pdf, fast_pdf, args.dpi, args.tolerance)
+
+        if problems:
+            failed = True
+            print(f"{template_name}: {len(problems)} pages differ")
+            for problem in problems:
+                print(f"  {problem}")
+        else:
+            print(f"{template_name}: {args.rows} rows render identically")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,390 @@
+"""Long-running asyncio job service for FormFiller application."""
+
+import asyncio
+import json
+import logging
+import os
+import signal
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import SERVICE_HOST, SERVICE_PORT, FormFillerConfig, TemplateConfig
+from csv_reader import CsvFormat
+from exceptions import FormFillerError
+from form_filler import FormFiller
+from output_sink import DEFAULT_OUTPUT_SINK
+from parallel_fill import WorkerPool
+from template_cache import TemplateCache
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between progress events sent for one job
+PROGRESS_INTERVAL = 0.2
+
+
+def encode_event(event: Dict[str, Any]) -> bytes:
+    """Encode an event as one JSON line."""
+    return (json.dumps(event, default=str) + "\n").encode("utf-8")
+
+
+class FillService:
+    """
+    Asyncio server that fills forms for jobs sent over a socket.
+
+    Clients send one JSON object per line, each describing a job:
+
+        {"id": "batch-7", "template": "misc", "csv_path": "payroll.csv"}
+        {"template": "nec", "rows": [["...", "..."]], "output_dir": "/tmp/out"}
+        {"template": "misc", "csv_path": "big.csv", "fill_engine": "fast"}
+        {"template": "misc", "csv_path": "bank.csv", "csv_encoding": "cp1252"}
+        {"template": "nec", "csv_path": "nec.csv", "output_sink": "zip"}
+
+    and receive JSON lines back for each job, in order: a "queued" event,
+    "progress" events with the number of rows handled so far, then a "done"
+    event with the processing results (including output paths) or an
+    "error" event.
+
+    Built-in templates are parsed once at startup and stay warm in a shared
+    template cache. Each template is filled by its own long-lived
+    FormFiller, so its mappings, fill plan, fast engine and batch templates
+    are prepared by the first job, or at startup, and reused by every later
+    job. Jobs are filled one at a time on a dedicated thread,
+    since PyMuPDF documents must not be used from several threads at once;
+    a job can still fan out to a process pool with "workers". Such pools
+    are kept per template and worker count, so later jobs find the
+    workers started and their templates prepared.
+    """
+
+    def __init__(self, config: Optional[FormFillerConfig] = None):
+        """
+        Initialize the service.
+
+        Args:
+            config: Optional configuration object. If None, creates default config.
+        """
+        self.config = config or FormFillerConfig()
+        self.template_cache = TemplateCache()
+        # FormFiller of each template, by template and mapping path
+        self._form_fillers: Dict[Tuple[str, str], FormFiller] = {}
+        # Warm worker pool of each template, by template path, mapping path
+        # and worker count
+        self._worker_pools: Dict[Tuple[str, str, int], WorkerPool] = {}
+        self._fill_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="formfiller-fill"
+        )
+        self._job_count = 0
+
+    def get_form_filler(self, template_config: TemplateConfig) -> FormFiller:
+        """
+        Get the long-lived FormFiller of a template.
+
+        Args:
+            template_config: Template configuration
+
+        Returns:
+            FormFiller kept for the template's jobs; its config is set per job
+        """
+        key = (template_config.template_path, template_config.mapping_path)
+        form_filler = self._form_fillers.get(key)
+        if form_filler is None:
+            form_filler = FormFiller(config=self.config)
+            self._form_fillers[key] = form_filler
+        return form_filler
+
+    def get_worker_pool(
+        self, template_config: TemplateConfig, workers: int
+    ) -> WorkerPool:
+        """
+        Get the warm worker pool of a template.
+
+        Args:
+            template_config: Template configuration
+            workers: Number of worker processes
+
+        Returns:
+            WorkerPool kept for the template's jobs with that many workers;
+            its processes start with the first job that needs them
+        """
+        key = (template_config.template_path, template_config.mapping_path, workers)
+        worker_pool = self._worker_pools.get(key)
+        if worker_pool is None:
+            worker_pool = WorkerPool(workers)
+            self._worker_pools[key] = worker_pool
+        return worker_pool
+
+    def close_worker_pools(self) -> None:
+        """Stop the processes of every warm worker pool."""
+        for worker_pool in self._worker_pools.values():
+            worker_pool.shutdown()
+        self._worker_pools.clear()
+
+    def warm_templates(self) -> List[str]:
+        """
+        Parse every built-in template and prepare its fill plan.
+
+        Returns:
+            Names of the templates that were loaded
+        """
+        loaded = []
+        for name in self.config.list_available_templates():
+            template_config = self.config.get_template_config(name)
+            if not template_config.validate():
+                logger.warning(f"Skipping template '{name}': missing files")
+                continue
+            self.get_form_filler(template_config).prepare_template(
+                template_config, self.template_cache
+            )
+            loaded.append(name)
+        logger.info(f"Warmed templates: {', '.join(loaded) or 'none'}")
+        return loaded
+
+    def resolve_csv_path(self, csv_path: str) -> str:
+        """
+        Resolve a job's CSV path.
+
+        Relative paths are looked up in the inputs folder, like the
+        command-line input file.
+
+        Args:
+            csv_path: Path sent by the client
+
+        Returns:
+            Absolute path to the CSV file
+
+        Raises:
+            FileNotFoundError: If the file does not exist
+        """
+        path = Path(csv_path)
+        if not path.is_absolute():
+            path = self.config.inputs_folder / path
+        if not path.is_file():
+            raise FileNotFoundError(f"Input file '{path}' does not exist")
+        return str(path)
+
+    def run_job(self, job: Dict[str, Any], progress: Callable[[int], None]) -> dict:
+        """
+        Fill one job. Runs on the fill thread.
+
+        Args:
+            job: Decoded job request
+            progress: Called with the number of rows handled so far
+
+        Returns:
+            Processing results from FormFiller.process_forms()
+
+        Raises:
+            FormFillerError: If the job is invalid or processing fails
+            FileNotFoundError: If the job's CSV file does not exist
+        """
+        csv_path = job.get("csv_path")
+        rows = job.get("rows")
+        if (csv_path is None) == (rows is None):
+            raise FormFillerError("Job needs exactly one of 'csv_path' or 'rows'")
+        if rows is not None and not isinstance(rows, list):
+            raise FormFillerError("'rows' must be a list of rows")
+
+        template_config = self.config.get_template_config(job.get("template", "misc"))
+        if not template_config.validate():
+            raise FormFillerError(
+                f"Missing template or mapping for '{job.get('template', 'misc')}'"
+            )
+
+        config = FormFillerConfig(base_path=str(self.config.base_path))
+        config.outputs_folder = Path(
+            job.get("output_dir") or self.config.outputs_folder
+        )
+        config.output_sink = job.get("output_sink", DEFAULT_OUTPUT_SINK)
+        config.output_name_template = job.get("output_name")
+
+        # Jobs run one at a time, so the template's FormFiller takes the
+        # job's outputs configuration
+        form_filler = self.get_form_filler(template_config)
+        form_filler.config = config
+        workers = int(job.get("workers", 1))
+        results = form_filler.process_forms(
+            input_csv_path=self.resolve_csv_path(csv_path) if csv_path else None,
+            input_rows=(
+                [[str(cell) for cell in row] for row in rows]
+                if rows is not None
+                else None
+            ),
+            template_config=template_config,
+            skip_header=bool(job.get("skip_header", False)),
+            dry_run=bool(job.get("dry_run", False)),
+            generate_combined_pdf=bool(job.get("combined", True)),
+            workers=workers,
+            worker_pool=(
+                self.get_worker_pool(template_config, workers) if workers > 1 else None
+            ),
+            flatten_combined=not job.get("keep_fields", False),
+            resume=bool(job.get("resume", False)),
+            force=bool(job.get("force", False)),
+            template_cache=self.template_cache,
+            progress=progress,
+            fill_engine=job.get("fill_engine"),
+            csv_format=CsvFormat(
+                encoding=job.get("csv_encoding"), delimiter=job.get("csv_delimiter")
+            ),
+        )
+        if config.output_sink == DEFAULT_OUTPUT_SINK and "individual_output" in results:
+            results["individual_dir"] = results["individual_output"]
+        return results
+
+    async def handle_job(
+        self, job: Dict[str, Any], writer: asyncio.StreamWriter
+    ) -> None:
+        """
+        Run one job and stream its events to the client.
+
+        Args:
+            job: Decoded job request
+            writer: Stream to send events to
+        """
+        self._job_count += 1
+        job_id = job.get("id", self._job_count)
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+        last_sent = 0.0
+
+        def progress(rows: int) -> None:
+            nonlocal last_sent
+            now = time.monotonic()
+            if now - last_sent >= PROGRESS_INTERVAL:
+                last_sent = now
+                loop.call_soon_threadsafe(
+                    events.put_nowait, {"id": job_id, "event": "progress", "rows": rows}
+                )
+
+        writer.write(encode_event({"id": job_id, "event": "queued"}))
+        await writer.drain()
+
+        start = time.perf_counter()
+        future = loop.run_in_executor(self._fill_executor, self.run_job, job, progress)
+        while True:
+            get_event = asyncio.ensure_future(events.get())
+            done, _ = await asyncio.wait(
+                {get_event, future}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if get_event in done:
+                writer.write(encode_event(get_event.result()))
+                await writer.drain()
+                continue
+            get_event.cancel()
+            break
+
+        try:
+            results = future.result()
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            writer.write(
+                encode_event({"id": job_id, "event": "error", "message": str(e)})
+            )
+        else:
+            elapsed = time.perf_counter() - start
+            logger.info(
+                f"Job {job_id} completed: {results['successful_fills']} filled "
+                f"in {elapsed:.3f}s"
+            )
+            writer.write(
+                encode_event(
+                    {
+                        "id": job_id,
+                        "event": "done",
+                        "seconds": elapsed,
+                        "results": results,
+                    }
+                )
+            )
+        await writer.drain()
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """
+        Serve the jobs sent over one client connection, in order.
+
+        Args:
+            reader: Stream of JSON job lines from the client
+            writer: Stream to send events to
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    job = json.loads(line)
+                    if not isinstance(job, dict):
+                        raise ValueError("job must be a JSON object")
+                except ValueError as e:
+                    writer.write(
+                        encode_event({"event": "error", "message": f"Invalid job: {e}"})
+                    )
+                    await writer.drain()
+                    continue
+                await self.handle_job(job, writer)
+        except ConnectionError as e:
+            logger.warning(f"Client disconnected: {e}")
+        finally:
+            writer.close()
+
+    async def serve(
+        self,
+        socket_path: Optional[str] = None,
+        host: str = SERVICE_HOST,
+        port: int = SERVICE_PORT,
+    ) -> None:
+        """
+        Warm the templates and serve jobs until stopped by a signal.
+
+        Args:
+            socket_path: Listen on this Unix socket instead of TCP
+            host: TCP host to listen on
+            port: TCP port to listen on
+
+        Raises:
+            FormFillerError: If socket_path exists and is not a socket
+        """
+        # A socket left by an earlier run is replaced, any other file kept
+        if socket_path and os.path.lexists(socket_path):
+            if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+                raise FormFillerError(
+                    f"Cannot listen on {socket_path}: the file exists and is "
+                    "not a socket"
+                )
+            os.unlink(socket_path)
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._fill_executor, self.warm_templates)
+
+        if socket_path:
+            server = await asyncio.start_unix_server(
+                self.handle_connection, path=socket_path
+            )
+            logger.info(f"Serving fill jobs on unix socket {socket_path}")
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+            logger.info(f"Serving fill jobs on {host}:{port}")
+
+        # Stop cleanly on SIGTERM/SIGINT, finishing the job in progress
+        stop = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        try:
+            async with server:
+                await stop.wait()
+            logger.info("Fill service stopped")
+        finally:
+            self._fill_executor.shutdown(wait=True)
+            self.close_worker_pools()
+            if socket_path and os.path.exists(socket_path):
+                os.unlink(socket_path)
@@ -0,0 +1,188 @@
+"""Hot-path timing and counter instrumentation for FormFiller application."""
+
+import json
+import math
+import time
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+# Stages timed on the fill path, in pipeline order
+STAGES = (
+    "csv_parse",
+    "validation",
+    "row_mapping",
+    "template_open",
+    "widget_fill",
+    "individual_save",
+    "page_insert",
+    "part_save",
+    "final_save",
+)
+
+COUNTERS = ("rows", "widgets_touched", "bytes_written")
+
+
+def percentile(sorted_samples: List[float], pct: float) -> float:
+    """
+    Get a nearest-rank percentile from sorted samples.
+
+    Args:
+        sorted_samples: Samples in ascending order
+        pct: Percentile between 0 and 100
+
+    Returns:
+        The sample at the requested percentile, or 0.0 if there are none
+    """
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+class ProcessingStats:
+    """
+    Per-stage timings and counters collected while filling forms.
+
+    Each timed stage keeps every sample (as a compact array of doubles) so
+    that percentiles can be reported. Stats collected in worker processes
+    are merged into the parent's with merge().
+    """
+
+    def __init__(self):
+        """Initialize empty stats."""
+        self._samples: Dict[str, array] = {stage: array("d") for stage in STAGES}
+        self.counters: Dict[str, int] = {name: 0 for name in COUNTERS}
+        self._widgets_per_row = array("l")
+        self.field_types: Counter = Counter()
+
+    def record(self, stage: str, seconds: float) -> None:
+        """
+        Record one timing sample for a stage.
+
+        Args:
+            stage: Stage name
+            seconds: Duration of the sample
+        """
+        self._samples.setdefault(stage, array("d")).append(seconds)
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """
+        Time the enclosed block as one sample of a stage.
+
+        Args:
+            stage: Stage name
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def increment(self, counter: str, amount: int = 1) -> None:
+        """
+        Increase a counter.
+
+        Args:
+            counter: Counter name
+            amount: Amount to add
+        """
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def record_row(self, field_types: Dict[str, int]) -> None:
+        """
+        Record that a row was filled.
+
+        Args:
+            field_types: Number of widgets filled for the row, by field type
+        """
+        widgets_touched = sum(field_types.values())
+        self.field_types.update(field_types)
+        self.counters["rows"] += 1
+        self.counters["widgets_touched"] += widgets_touched
+        self._widgets_per_row.append(widgets_touched)
+
+    def merge(self, other: "ProcessingStats") -> None:
+        """
+        Add another stats object's samples and counters to this one.
+
+        Args:
+            other: Stats collected elsewhere, e.g. in a worker process
+        """
+        for stage, samples in other._samples.items():
+            self._samples.setdefault(stage, array("d")).extend(samples)
+        for name, value in other.counters.items():
+            self.increment(name, value)
+        self._widgets_per_row.extend(other._widgets_per_row)
+        self.field_types.update(other.field_types)
+
+    def summary(self) -> dict:
+        """
+        Summarize the collected stats.
+
+        Returns:
+            Dictionary with cumulative and percentile timings per stage (in
+            seconds) and the counters
+        """
+        stages = {}
+        for stage, samples in self._samples.items():
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            total = sum(ordered)
+            stages[stage] = {
+                "count": len(ordered),
+                "total": total,
+                "mean": total / len(ordered),
+                "p50": percentile(ordered, 50),
+                "p95": percentile(ordered, 95),
+                "p99": percentile(ordered, 99),
+                "max": ordered[-1],
+            }
+
+        rows = len(self._widgets_per_row)
+        return {
+            "stages": stages,
+            "counters": dict(self.counters),
+            "field_types": dict(self.field_types),
+            "widgets_per_row": (
+                self.counters["widgets_touched"] / rows if rows else 0.0
+            ),
+        }
+
+    def write_json(self, path: str) -> None:
+        """
+        Write the summary to a JSON file.
+
+        Args:
+            path: Output file path
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.summary(), file, indent=2)
+
+    def format_table(self) -> str:
+        """
+        Format the summary as a human-readable table.
+
+        Returns:
+            Multi-line string with one line per stage followed by the counters
+        """
+        summary = self.summary()
+        lines = [
+            f"{'stage':<16}{'count':>9}{'total s':>11}{'mean ms':>10}"
+            f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        ]
+        for stage, values in summary["stages"].items():
+            lines.append(
+                f"{stage:<16}{values['count']:>9}{values['total']:>11.3f}"
+                f"{values['mean'] * 1000:>10.3f}{values['p50'] * 1000:>10.3f}"
+                f"{values['p95'] * 1000:>10.3f}{values['p99'] * 1000:>10.3f}"
+            )
+        for name, value in summary["counters"].items():
+            lines.append(f"{name}: {value}")
+        lines.append(f"widgets_per_row: {summary['widgets_per_row']:.1f}")
+        for name, count in summary["field_types"].items():
+            lines.append(f"{name} fields: {count}")
+        return "\n".join(lines)
@@ -0,0 +1,177 @@
+"""In-memory cache of parsed PDF templates for FormFiller application."""
+
+import hashlib
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import fitz
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class WidgetInfo:
+    """Static description of a single form widget in a template."""
+
+    page: int
+    xref: int
+    field_name: str
+    field_type: int
+    rect: tuple
+
+
+@dataclass
+class CachedTemplate:
+    """Parsed template bytes and widget inventory for one template file."""
+
+    path: str
+    mtime: float
+    data: bytes
+    page_count: int
+    widgets: List[WidgetInfo] = field(default_factory=list)
+    _digest: Optional[str] = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def load(cls, path: str, mtime: float) -> "CachedTemplate":
+        """
+        Read and parse a template PDF from disk.
+
+        Args:
+            path: Path to the template PDF
+            mtime: Modification time of the file when it was read
+
+        Returns:
+            CachedTemplate holding the raw bytes and widget inventory
+        """
+        with open(path, "rb") as file:
+            data = file.read()
+
+        doc = fitz.open(stream=data, filetype="pdf")
+        try:
+            widgets = [
+                WidgetInfo(
+                    page=page_num,
+                    xref=widget.xref,
+                    field_name=widget.field_name,
+                    field_type=widget.field_type,
+                    rect=tuple(widget.rect),
+                )
+                for page_num in range(len(doc))
+                for widget in doc.load_page(page_num).widgets()
+            ]
+            page_count = len(doc)
+        finally:
+            doc.close()
+
+        logger.debug(
+            f"Parsed template {path}: {page_count} pages, {len(widgets)} widgets"
+        )
+        return cls(
+            path=path, mtime=mtime, data=data, page_count=page_count, widgets=widgets
+        )
+
+    @property
+    def digest(self) -> str:
+        """SHA-256 hex digest of the template bytes."""
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.data).hexdigest()
+        return self._digest
+
+    def open(self) -> fitz.Document:
+        """Open a fresh, independent document from the cached template bytes."""
+        return fitz.open(stream=self.data, filetype="pdf")
+
+
+class TemplateCache:
+    """
+    Cache of parsed templates keyed by absolute path and modification time.
+
+    A template is read from disk once; every subsequent request returns a
+    fresh document opened from the in-memory bytes. If the file changes on
+    disk, its modification time no longer matches and it is reloaded.
+    """
+
+    def __init__(self):
+        """Initialize an empty template cache."""
+        self._entries: Dict[str, CachedTemplate] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, template_path: str) -> CachedTemplate:
+        """
+        Get the cached template for a path, loading it if needed.
+
+        Args:
+            template_path: Path to the template PDF
+
+        Returns:
+            CachedTemplate for the current version of the file
+        """
+        path = os.path.abspath(template_path)
+        mtime = os.path.getmtime(path)
+
+        entry = self._entries.get(path)
+        if entry is not None and entry.mtime == mtime:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        entry = CachedTemplate.load(path, mtime)
+        self._entries[path] = entry
+        return entry
+
+    def add(self, entry: CachedTemplate) -> None:
+        """
+        Add an already parsed template, e.g. from a bundle or another process.
+
+        The entry is used for as long as the file's modification time still
+        matches the entry's.
+
+        Args:
+            entry: Parsed template to cache
+        """
+        self._entries[entry.path] = entry
+
+    def open(self, template_path: str) -> fitz.Document:
+        """
+        Open a fresh copy of a template document.
+
+        Args:
+            template_path: Path to the template PDF
+
+        Returns:
+            New document opened from the cached template bytes
+        """
+        return self.get(template_path).open()
+
+    def merge_stats(self, hits: int, misses: int) -> None:
+        """
+        Add hit and miss counts recorded by another cache, e.g. in a worker.
+
+        Args:
+            hits: Number of cache hits to add
+            misses: Number of cache misses to add
+        """
+        self.hits += hits
+        self.misses += misses
+
+    def clear(self) -> None:
+        """Drop all cached templates and reset counters."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get_stats(self) -> dict:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dictionary with hit, miss and entry counts
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+        }
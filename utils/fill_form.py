@@ -1,73 +1,339 @@
+import logging
 import os
+from collections import Counter
+from contextlib import nullcontext
+
 import fitz
 
-from utils.extract_page import extract_and_preserve_pages  # PyMuPDF
+from output_writer import write_file
+from render_cache import RenderedForm, form_key
+
+logger = logging.getLogger(__name__)
+
+
+# Names used for per-type fill counters, keyed by PDF_WIDGET_TYPE_* constant
+FIELD_TYPE_NAMES = {
+    1: "button",
+    2: "checkbox",
+    3: "combobox",
+    4: "listbox",
+    5: "radiobutton",
+    6: "signature",
+    7: "text",
+}
+
+
+def set_field_value(field: fitz.Widget, field_value) -> str:
+    # Handle different field types using constants
+    if field.field_type == 7:  # PDF_WIDGET_TYPE_TEXT (7)
+        field.field_value = field_value
+
+    elif field.field_type == 2:  # PDF_WIDGET_TYPE_CHECKBOX (2)
+        field.field_value = True if field_value.lower() == "checked" else False
+
+    # Radio buttons (5), buttons (1), comboboxes (3), listboxes (4) and
+    # signatures (6) are not filled yet; they are only counted
+    field.update()
+
+    # Return the type name so callers can aggregate per-type counts
+    return FIELD_TYPE_NAMES.get(field.field_type, "unknown")
+
+
+def document_bytes(doc: fitz.Document) -> bytes:
+    # Document.tobytes() hands every small write back to Python, which makes
+    # it several times slower than save(); MuPDF's own buffer output is not
+    try:
+        pdf = fitz.mupdf.pdf_document_from_fz_document(doc.this)
+        buffer = fitz.mupdf.fz_new_buffer(64 * 1024)
+        output = fitz.mupdf.FzOutput(buffer)
+    except AttributeError:
+        # PyMuPDF without the low-level MuPDF bindings
+        return doc.tobytes()
+    fitz.mupdf.pdf_write_document(pdf, output, fitz.mupdf.PdfWriteOptions())
+    output.fz_close_output()
+    return buffer.fz_buffer_extract()
+
+
+def _no_timer(stage):
+    return nullcontext()
 
 
 def fill_form(
-    pdf_path, output_pdf_path, field_data, new_doc: fitz.Document | None = None
+    pdf_path,
+    output_pdf_path,
+    field_data,
+    new_doc: fitz.Document | None = None,
+    template_cache=None,
+    fill_plan=None,
+    flatten: bool = True,
+    keep_individual: bool = False,
+    stats=None,
+    fast_template=None,
+    writer=None,
+    render_cache=None,
+):
+    # Time each stage when a ProcessingStats object is provided
+    timer = stats.time if stats is not None else _no_timer
+    save_individual = new_doc is None or keep_individual
+
+    # A row with the same data as a recent one reuses its output
+    key = None
+    form_cache = render_cache.forms if render_cache is not None else None
+    if form_cache is not None:
+        key = form_key(field_data)
+        rendered = form_cache.get(key)
+        if (
+            rendered is not None
+            and (rendered.data is not None or not save_individual)
+            and (rendered.doc is not None or new_doc is None)
+        ):
+            _reuse_rendered_form(
+                rendered, output_pdf_path, new_doc, save_individual, writer, stats
+            )
+            return
+
+    # The output directory is created once per run by the caller
+    with timer("template_open"):
+        # Reuse the parsed template when a cache is provided
+        if fast_template is not None:
+            doc = fast_template.open()
+        elif template_cache is not None:
+            doc = template_cache.open(pdf_path)
+        else:
+            doc = fitz.open(pdf_path)
+
+    field_types = Counter()
+    with timer("widget_fill"):
+        if fast_template is not None:
+            # Write values and prebuilt appearances straight into the objects
+            field_types = fast_template.fill(
+                doc,
+                field_data,
+                render_cache.appearances if render_cache is not None else None,
+            )
+        elif fill_plan is not None:
+            field_types = fill_planned_fields(doc, fill_plan, field_data)
+        else:
+            # Loop through each page to find form fields
+            for page_num in range(len(doc)):
+                page = doc.load_page(page_num)
+
+                # Get all form fields (widgets) on the page
+                form_fields = page.widgets()
+
+                for field in form_fields:
+                    # Check if the field name matches the ones in the field_data dictionary
+                    if field.field_name in field_data:
+                        field_types[
+                            set_field_value(field, field_data[field.field_name])
+                        ] += 1
+
+    # Save the modified PDF
+    data = None
+    if save_individual:
+        if fast_template is not None and new_doc is None:
+            # Standalone forms keep live fields; let viewers rebuild their
+            # appearances with their own fonts
+            doc.xref_set_key(doc.pdf_catalog(), "AcroForm/NeedAppearances", "true")
+        with timer("individual_save"):
+            if writer is not None:
+                # Serialize now and leave the write to the writer's threads
+                data = document_bytes(doc)
+                writer.submit(output_pdf_path, data)
+            elif key is not None:
+                # Keep the bytes for duplicate rows
+                data = document_bytes(doc)
+                write_file(output_pdf_path, data)
+            else:
+                doc.save(output_pdf_path)
+        if stats is not None:
+            stats.increment(
+                "bytes_written",
+                len(data) if data is not None else os.path.getsize(output_pdf_path),
+            )
+    if new_doc is not None:
+        with timer("page_insert"):
+            if flatten:
+                # Burn the field appearances into the page content in place
+                doc.bake()
+            new_doc.insert_pdf(doc)
+    if key is not None:
+        # The cache keeps the baked pages open for duplicate rows
+        form_cache.put(
+            key,
+            RenderedForm(doc if new_doc is not None else None, 0, len(doc), data=data),
+        )
+    if key is None or new_doc is None:
+        doc.close()
+
+    # One summary line per row instead of one line per field
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            f"Filled {field_types.total()} fields for {output_pdf_path}: "
+            + ", ".join(f"{name}={count}" for name, count in field_types.items())
+        )
+
+    if stats is not None:
+        stats.record_row(field_types)
+
+
+def _reuse_rendered_form(
+    rendered, output_pdf_path, new_doc, save_individual, writer=None, stats=None
 ):
-    # Ensure the output directory exists
-    output_dir = os.path.dirname(output_pdf_path)
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)  # Create the output directory if it doesn't exist
-    doc = fitz.open(pdf_path)
-
-    # Loop through each page to find form fields
-    for page_num in range(len(doc)):
+    # Write the saved bytes and add the baked pages of an identical row
+    timer = stats.time if stats is not None else _no_timer
+    if save_individual:
+        with timer("individual_save"):
+            if writer is not None:
+                writer.submit(output_pdf_path, rendered.data)
+            else:
+                write_file(output_pdf_path, rendered.data)
+        if stats is not None:
+            stats.increment("bytes_written", len(rendered.data))
+    if new_doc is not None:
+        with timer("page_insert"):
+            new_doc.insert_pdf(
+                rendered.doc,
+                from_page=rendered.first_page,
+                to_page=rendered.first_page + rendered.page_count - 1,
+            )
+    logger.debug(f"Reused the output of an identical row for {output_pdf_path}")
+
+
+def fill_planned_fields(doc: fitz.Document, fill_plan, field_data) -> Counter:
+    # Visit only the widgets the plan resolved for this template
+    field_types = Counter()
+    for page_num, planned_fields in fill_plan.pages:
         page = doc.load_page(page_num)
+        for planned in planned_fields:
+            if planned.field_name not in field_data:
+                continue
+            field = page.load_widget(planned.xref)
+            field_types[set_field_value(field, field_data[planned.field_name])] += 1
+    return field_types
 
-        # Get all form fields (widgets) on the page
-        form_fields = page.widgets()
 
-        for field in form_fields:
-            # Check if the field name matches the ones in the field_data dictionary
-            if field.field_name in field_data:
-                field_value = field_data[field.field_name]
+def fill_form_batch(
+    batch_template,
+    rows,
+    new_doc,
+    flatten: bool = True,
+    stats=None,
+    render_cache=None,
+):
+    # Fill several rows into copies of the template's pages in one document,
+    # then bake it once and add the rows' pages; rows beyond the batch size
+    # are not accepted. Returns the error of each row, or None if it was
+    # filled or reused the pages of an identical row.
+    timer = stats.time if stats is not None else _no_timer
+    page_count = batch_template.page_count
+    form_cache = render_cache.forms if render_cache is not None else None
+    appearance_cache = render_cache.appearances if render_cache is not None else None
 
-                # Handle different field types using constants
-                if field.field_type == 7:  # PDF_WIDGET_TYPE_TEXT (7)
-                    field.field_value = field_value
-                    print(
-                        f"Filled text field '{field.field_name}' on page {page_num + 1}"
-                    )
+    with timer("template_open"):
+        doc = batch_template.open()
 
-                elif field.field_type == 2:  # PDF_WIDGET_TYPE_CHECKBOX (2)
-                    field.field_value = (
-                        True if field_value.lower() == "checked" else False
+    errors = []
+    # Pages of each row, from this batch or an earlier one; None if it failed
+    sources = []
+    # Rows filled in this batch, cached until the batch is added
+    cached_keys = []
+    for batch_copy, field_data in zip(batch_template.copies, rows):
+        key = None
+        if form_cache is not None:
+            key = form_key(field_data)
+            rendered = form_cache.get(key)
+            if rendered is not None and rendered.doc is not None:
+                errors.append(None)
+                sources.append(rendered)
+                continue
+        try:
+            with timer("widget_fill"):
+                if batch_copy.fast_template is not None:
+                    field_types = batch_copy.fast_template.fill(
+                        doc, field_data, appearance_cache
                     )
-                    print(
-                        f"Checked checkbox '{field.field_name}' on page {page_num + 1}"
+                else:
+                    field_types = fill_planned_fields(
+                        doc, batch_copy.fill_plan, field_data
                     )
+        except Exception as e:
+            errors.append(e)
+            sources.append(None)
+            continue
+        rendered = RenderedForm(doc, batch_copy.first_page, page_count)
+        errors.append(None)
+        sources.append(rendered)
+        if key is not None:
+            # Later rows of this batch can already reuse the pages
+            form_cache.put(key, rendered)
+            cached_keys.append(key)
 
-                elif field.field_type == 5:  # PDF_WIDGET_TYPE_RADIOBUTTON (5)
-                    # Handle radio button field (implement based on field_value)
-                    print(f"Radio button '{field.field_name}' on page {page_num + 1}")
-
-                # Other widget types can be handled similarly
-                elif field.field_type == 1:  # PDF_WIDGET_TYPE_BUTTON (1)
-                    print(f"Button field '{field.field_name}' on page {page_num + 1}")
-                elif field.field_type == 3:  # PDF_WIDGET_TYPE_COMBOBOX (3)
-                    print(f"Combobox field '{field.field_name}' on page {page_num + 1}")
-                elif field.field_type == 4:  # PDF_WIDGET_TYPE_LISTBOX (4)
-                    print(f"Listbox field '{field.field_name}' on page {page_num + 1}")
-                elif field.field_type == 6:  # PDF_WIDGET_TYPE_SIGNATURE (6)
-                    print(
-                        f"Signature field '{field.field_name}' on page {page_num + 1}"
-                    )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"Filled {field_types.total()} fields on page "
+                f"{batch_copy.first_page + 1} of a batch: "
+                + ", ".join(f"{name}={count}" for name, count in field_types.items())
+            )
+        if stats is not None:
+            stats.record_row(field_types)
+
+    try:
+        with timer("page_insert"):
+            used_pages = max(
+                (
+                    rendered.first_page + page_count
+                    for rendered in sources
+                    if rendered is not None and rendered.doc is doc
+                ),
+                default=0,
+            )
+            if used_pages and flatten:
+                # Drop unused copies before baking; select() also drops the
+                # widgets of the pages it keeps, so only flattened batches
+                # are trimmed, and the ranges below skip unused copies
+                if used_pages < len(doc):
+                    doc.select(range(used_pages))
+                doc.bake()
+
+            # Add the rows' pages, a run of consecutive pages at a time
+            page_ranges = []
+            for rendered in sources:
+                if rendered is None:
+                    continue
+                last_page = rendered.first_page + page_count - 1
+                if (
+                    page_ranges
+                    and page_ranges[-1][0] is rendered.doc
+                    and page_ranges[-1][2] + 1 == rendered.first_page
+                ):
+                    page_ranges[-1][2] = last_page
                 else:
-                    print(
-                        f"Unknown field type '{field.field_name}' on page {page_num + 1}"
-                    )
-                field.update()
+                    page_ranges.append([rendered.doc, rendered.first_page, last_page])
+            for src_doc, from_page, to_page in page_ranges:
+                new_doc.insert_pdf(src_doc, from_page=from_page, to_page=to_page)
+    except Exception as e:
+        # None of the batch's rows made it into the combined PDF
+        errors = [error or e for error in errors]
+        for key in cached_keys:
+            form_cache.discard(key)
+        cached_keys = []
+    finally:
+        # The form cache keeps the batch open for duplicate rows
+        if not cached_keys:
+            doc.close()
+    return errors
 
-    # Save the modified PDF
-    if new_doc is None:
-        doc.save(output_pdf_path)
-    else:
-        pdfbytes = doc.convert_to_pdf()
-        temp = fitz.open("pdf", pdfbytes)
-        new_doc.insert_pdf(temp)
+
+def append_filled_form(filled_pdf_path, new_doc, flatten: bool = True, stats=None):
+    # Reuse a previously filled form instead of filling it again
+    timer = stats.time if stats is not None else _no_timer
+    with timer("page_insert"):
+        doc = fitz.open(filled_pdf_path)
+        if flatten:
+            doc.bake()
+        new_doc.insert_pdf(doc)
+        doc.close()
 
 
 if __name__ == "__main__":
@@ -81,4 +347,5 @@ if __name__ == "__main__":
         "Check Box1": "checked",  # Set to 'checked' or 'unchecked'
     }
 
+    os.makedirs(os.path.dirname(output_pdf_path), exist_ok=True)
     fill_form(pdf_path, output_pdf_path, field_data)
@@ -3,6 +3,30 @@ import fitz  # PyMuPDF
 import json
 
 
+def draw_field_names(page, fields):
+    # Draw each field's name just above its top-left corner; fields are
+    # (field name, rect) pairs, so names can come from the page's own widgets
+    # or from a template's, e.g. on flattened pages that have no widgets left
+    field_data = []
+    # One text writer per page: inserting each name on its own adds a font
+    # and a content stream per field
+    writer = fitz.TextWriter(page.rect)
+    for field_name, rect in fields:
+        if field_name:  # Skip fields with no name
+            x, y = rect[0], rect[1]  # Top-left coordinates of the widget
+
+            # Draw the field name as text on top of the widget
+            writer.append((x, y - 12), field_name, fontsize=8)
+
+            # Store the field name and its position
+            field_data.append(
+                {"field_name": field_name, "page": page.number, "coordinates": (x, y)}
+            )
+    if field_data:
+        writer.write_text(page, color=(0, 0, 0))  # You can adjust the color
+    return field_data
+
+
 def overlay_field_names(input_pdf, output_pdf=None):
     if output_pdf is None:
         input_dir = os.path.dirname(input_pdf)  # Get the directory of the input PDF
@@ -19,25 +43,12 @@ def overlay_field_names(input_pdf, output_pdf=None):
     for page_num in range(len(doc)):
         page = doc.load_page(page_num)
 
-        # Find all widgets (form fields) on the page
-        widgets = page.widgets()
-
-        # For each widget, overlay the field name and save its details
-        for widget in widgets:
-            field_name = widget.field_name
-            if field_name:  # Skip fields with no name
-                rect = widget.rect  # Get the rectangle area of the widget
-                x, y = rect.tl.x, rect.tl.y  # Top-left coordinates of the widget
-
-                # Draw the field name as text on top of the widget
-                page.insert_text(
-                    (x, y - 12), field_name, fontsize=8, color=(0, 0, 0)
-                )  # You can adjust the position and color
-
-                # Store the field name and its position
-                field_data.append(
-                    {"field_name": field_name, "page": page_num, "coordinates": (x, y)}
-                )
+        # Overlay the name of each widget (form field) on the page
+        field_data.extend(
+            draw_field_names(
+                page, [(widget.field_name, widget.rect) for widget in page.widgets()]
+            )
+        )
 
     # Save the updated PDF
     doc.save(output_pdf)
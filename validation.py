@@ -0,0 +1,308 @@
+"""Declarative row validation for FormFiller application."""
+
+import csv
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from exceptions import ConfigurationError
+from projection import load_pandas
+
+logger = logging.getLogger(__name__)
+
+# Value formats a field can be checked against; values must match in full
+VALUE_FORMATS = {
+    # SSN, EIN or plain nine digits; recipient copies may mask all but the
+    # last four digits of an SSN
+    "tin": r"(?:\d{3}|[*Xx]{3})-(?:\d{2}|[*Xx]{2})-\d{4}|\d{2}-\d{7}|\d{9}",
+    # Dollar amounts, with optional sign, dollar sign, thousands separators
+    # and cents
+    "amount": r"-?\$?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d{1,2})?|-?\$?\.\d{1,2}",
+}
+
+# max_length value that limits a field to the text its widget can show
+WIDGET_LENGTH = "widget"
+
+RULE_NAMES = ("required", "format", "max_length")
+
+
+@dataclass(frozen=True)
+class FieldRules:
+    """Validation rules of one mapped field."""
+
+    field_name: str
+    required: bool = False
+    # Key of VALUE_FORMATS that non-blank values must match
+    value_format: Optional[str] = None
+    # Largest number of characters, or None
+    max_length: Optional[int] = None
+    # Whether values must fit the widget's rectangle
+    fit_widget: bool = False
+
+    @classmethod
+    def parse(cls, field_name: str, rules: Any) -> "FieldRules":
+        """
+        Parse the validate entry of a field mapping.
+
+        Args:
+            field_name: PDF field name
+            rules: Dictionary of rule names to settings, e.g.
+                {"required": True, "format": "tin", "max_length": "widget"}
+
+        Returns:
+            FieldRules for the field
+
+        Raises:
+            ConfigurationError: If a rule is unknown or has an invalid setting
+        """
+        if not isinstance(rules, dict):
+            raise ConfigurationError(
+                f"Validation rules of field '{field_name}' must be a mapping"
+            )
+        unknown = set(rules) - set(RULE_NAMES)
+        if unknown:
+            raise ConfigurationError(
+                f"Unknown validation rules for field '{field_name}': "
+                f"{', '.join(sorted(unknown))}"
+            )
+
+        value_format = rules.get("format")
+        if value_format is not None and value_format not in VALUE_FORMATS:
+            raise ConfigurationError(
+                f"Unknown format for field '{field_name}': {value_format!r} "
+                f"(choose from {', '.join(VALUE_FORMATS)})"
+            )
+
+        max_length = rules.get("max_length")
+        fit_widget = max_length == WIDGET_LENGTH
+        if fit_widget:
+            max_length = None
+        elif max_length is not None and (
+            not isinstance(max_length, int)
+            or isinstance(max_length, bool)
+            or max_length < 1
+        ):
+            raise ConfigurationError(
+                f"max_length of field '{field_name}' must be a positive number "
+                f"or '{WIDGET_LENGTH}', not {max_length!r}"
+            )
+
+        return cls(
+            field_name=field_name,
+            required=bool(rules.get("required", False)),
+            value_format=value_format,
+            max_length=max_length,
+            fit_widget=fit_widget,
+        )
+
+
+class RowValidator:
+    """
+    Field rules of one mapping, checked against projected rows.
+
+    Rows are checked a DataFrame chunk at a time with pandas string
+    operations, or one row at a time if pandas is not installed.
+    """
+
+    def __init__(self, rules: List[FieldRules]):
+        """
+        Initialize the validator.
+
+        Args:
+            rules: Rules of each validated field
+        """
+        self.rules = rules
+        self._patterns = {
+            name: re.compile(pattern) for name, pattern in VALUE_FORMATS.items()
+        }
+        # Whether a value fits a field's widget, by field name; set once the
+        # template's widgets are known
+        self.widget_checks: Dict[str, Callable[[str], bool]] = {}
+
+    @property
+    def widget_fields(self) -> List[str]:
+        """Names of the fields whose values must fit their widget."""
+        return [rules.field_name for rules in self.rules if rules.fit_widget]
+
+    def set_widget_checks(self, checks: Dict[str, Callable[[str], bool]]) -> None:
+        """
+        Set the functions checking that values fit their widgets.
+
+        Args:
+            checks: Function per field name, returning False for values that
+                would be clipped
+        """
+        missing = [name for name in self.widget_fields if name not in checks]
+        if missing:
+            logger.warning(
+                f"Cannot measure the widgets of {', '.join(missing)}; "
+                f"their max_length: {WIDGET_LENGTH} rule is not checked"
+            )
+        self.widget_checks = checks
+
+    def validate_frame(self, frame: "pd.DataFrame") -> "pd.Series":
+        """
+        Check a chunk of projected rows.
+
+        Args:
+            frame: DataFrame with one column per mapped PDF field, as
+                returned by ProjectionPlan.project_frame()
+
+        Returns:
+            Series of rejection reasons, empty for valid rows
+
+        Raises:
+            ImportError: If pandas is not installed
+        """
+        pd = load_pandas()
+        if pd is None:
+            raise ImportError("pandas is required for batch validation")
+
+        reasons = pd.Series("", index=frame.index, dtype=object)
+        for rules in self.rules:
+            if rules.field_name not in frame:
+                continue
+            values = frame[rules.field_name]
+            stripped = values.str.strip()
+            blank = stripped.eq("")
+
+            failures = []
+            if rules.required:
+                failures.append((blank, "is required"))
+            if rules.value_format is not None:
+                matches = stripped.str.fullmatch(self._patterns[rules.value_format])
+                failures.append(
+                    (~blank & ~matches, f"is not a valid {rules.value_format}")
+                )
+            if rules.max_length is not None:
+                failures.append(
+                    (
+                        values.str.len() > rules.max_length,
+                        f"is longer than {rules.max_length} characters",
+                    )
+                )
+            fits = self.widget_checks.get(rules.field_name)
+            if rules.fit_widget and fits is not None:
+                overflow = pd.Series(False, index=frame.index)
+                overflow[~blank] = ~values[~blank].map(fits).astype(bool)
+                failures.append((overflow, "does not fit its widget"))
+
+            for failed, message in failures:
+                if failed.any():
+                    reasons[failed] += f"; {rules.field_name} {message}"
+
+        return reasons.str[2:]
+
+    def validate_record(self, field_data: Dict[str, str]) -> str:
+        """
+        Check one projected row.
+
+        Args:
+            field_data: Dictionary mapping PDF field names to values
+
+        Returns:
+            Rejection reason, empty for a valid row
+        """
+        messages = []
+        for rules in self.rules:
+            value = field_data.get(rules.field_name)
+            if value is None:
+                continue
+            stripped = value.strip()
+
+            if rules.required and not stripped:
+                messages.append(f"{rules.field_name} is required")
+            if (
+                rules.value_format is not None
+                and stripped
+                and not self._patterns[rules.value_format].fullmatch(stripped)
+            ):
+                messages.append(
+                    f"{rules.field_name} is not a valid {rules.value_format}"
+                )
+            if rules.max_length is not None and len(value) > rules.max_length:
+                messages.append(
+                    f"{rules.field_name} is longer than "
+                    f"{rules.max_length} characters"
+                )
+            fits = self.widget_checks.get(rules.field_name)
+            if rules.fit_widget and fits is not None and stripped and not fits(value):
+                messages.append(f"{rules.field_name} does not fit its widget")
+        return "; ".join(messages)
+
+
+def parse_validation_rules(field_mappings: Dict[str, Any]) -> Optional[RowValidator]:
+    """
+    Collect the validation rules declared in field mappings.
+
+    Args:
+        field_mappings: Field mappings as loaded from a mapping YAML
+
+    Returns:
+        RowValidator for the mappings, or None if no field declares rules
+
+    Raises:
+        ConfigurationError: If a field declares invalid rules
+    """
+    rules = [
+        FieldRules.parse(field_name, value["validate"])
+        for field_name, value in field_mappings.items()
+        if isinstance(value, dict) and value.get("validate")
+    ]
+    return RowValidator(rules) if rules else None
+
+
+class RejectsWriter:
+    """
+    CSV file of rejected rows and the reasons they were rejected.
+
+    The file is only created once a row is rejected; closing a writer that
+    rejected nothing removes the rejects file of an earlier run. Without a
+    path, as in a dry run, rejected rows are only counted.
+    """
+
+    def __init__(self, path: Optional[str], header: Optional[Sequence[str]] = None):
+        """
+        Initialize the writer.
+
+        Args:
+            path: Path of the rejects CSV; None counts rejected rows without
+                touching the disk
+            header: Header row of the input CSV, repeated after the row
+                number and reason columns
+        """
+        self.path = path
+        self.header = list(header or [])
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def write(self, row_index: int, reason: str, row: Sequence[str]) -> None:
+        """
+        Record a rejected row.
+
+        Args:
+            row_index: Index of the row in the input, counting the header
+            reason: Why the row was rejected
+            row: Raw values of the row
+        """
+        self.count += 1
+        if self.path is None:
+            return
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "w", encoding="utf-8", newline="")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(["row", "reason", *self.header])
+        self._writer.writerow([row_index + 1, reason, *row])
+
+    def close(self) -> None:
+        """Close the file, or remove a stale one if no row was rejected."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+        elif self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)